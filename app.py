@@ -12,28 +12,143 @@ The platform provides a clean API with full CRUD functionality,
 a connected database for test storage, and an AI layer that turns data into actionable recommendations.
 """
 
+import io
+import mimetypes
 import os
-import json
-from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from functools import partial, wraps
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
+
+import click
+import sqlalchemy as sa
+from flask import (Blueprint, Flask, abort, current_app, g, render_template, request, redirect, url_for, flash,
+                   jsonify, session, Response, make_response, send_file, stream_with_context)
+from markupsafe import Markup, escape
+
+from config import CONFIG_PROFILES
+
+from data.analysis import analysis_cache, analysis_payload
+from data.analytics import analytics_snapshots, portfolio_summary
+from data.archive import archive_tests, restore_test, test_archive
+from data.cache import MISSING, shared_cache
+from data.db_manager import db_manager
+from data.exporter import EXPORT_FORMATS, iter_export
+from data.fingerprints import ai_fingerprint, stale_parts, stats_fingerprint
+from data.importer import DEFAULT_CHUNK_SIZE, import_tests, iter_chunks, iter_import
+from data.ingest import PartialFlushError, event_aggregator, parse_events
+from data.live import (HEARTBEAT_INTERVAL, RECONNECT_DELAY, format_comment, format_event, format_retry,
+                       live_hub, state_events)
+from data.models import db, users
+from data.purge import test_purger
+from data.report_export import (REPORT_FORMATS, REPORT_MIMETYPES, REPORT_TEMPLATES, ExportError, report_filename,
+                                report_renderer, report_sections)
+from data.search import HIGHLIGHT_CLOSE, HIGHLIGHT_OPEN
+from data.serialization import FastJSONProvider, dumps
+from data.replica import replica_router
+from data.response_cache import response_cache, response_etag
+from data.shard_tools import move_company, rebalance, split_database
+from data.sharding import shard_router
+from routes.ai import (PROMPT_VERSION, RECOMMENDATION_ERROR, SUMMARY_ERROR, generate_ai_recommendation,
+                       generate_ai_summary, generate_test_description, get_user_model_id)
+from routes.llm_config import reset_llm_clients
+from utils.assets import BUNDLES, TEXT_TYPES, assets, build_assets, bundle_source
+from utils.instrumentation import request_profiler
+from utils.metrics import metrics
+from utils.utils import two_proportion_z_test, calculate_increase_percent, build_time_series
+
+bp = Blueprint('main', __name__, cli_group=None)
+
+# Number of tests per page on the tests page and the JSON list endpoints
+TESTS_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+TIME_SERIES_POINTS = 60
+MAX_TIME_SERIES_POINTS = 366
+# Number of search results on the tests page and default of the search endpoint
+SEARCH_RESULTS_LIMIT = 50
+# Maximum number of tests deleted by one bulk delete request
+MAX_BULK_DELETE = 1000
+# Maximum number of reports in one batch export archive
+MAX_BATCH_EXPORT = 100
+
+
+def flush_events(app, deltas):
+    """
+    Write aggregated event deltas to the variants table.
+
+    All deltas are written in one transaction, or in sharded mode one per
+    company, since the companies live in different databases. If some of those
+    fail, PartialFlushError tells the aggregator which deltas were committed.
+    """
+    with app.app_context():
+        if not shard_router.enabled:
+            db_manager.increment_variants({variant_id: delta for (_, _, variant_id), delta in deltas.items()})
+            return
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+        by_company = {}
+        for key, delta in deltas.items():
+            by_company.setdefault(key[0], {})[key] = delta
+
+        written = []
+        failed = None
+        for company_id, company_deltas in by_company.items():
+            try:
+                with shard_router.company(company_id):
+                    db_manager.increment_variants({variant_id: delta
+                                                   for (_, _, variant_id), delta in company_deltas.items()})
+            except Exception as e:
+                db.session.rollback()
+                failed = e
+            else:
+                written.extend(company_deltas)
+
+        if failed is not None:
+            raise PartialFlushError(f"Writing events failed: {failed}", written) from failed
+
+
+@bp.before_app_request
+def start_profile():
+    """Profile a sample of requests: SQL, template and LLM time (utils/instrumentation.py), and time all for the metrics"""
+    request_profiler.start()
 
-from data.db_manager import DBManager
-from data.models import db, users
-from routes.ai import generate_ai_recommendation, generate_ai_summary, generate_test_description
-from utils.utils import two_proportion_z_test, transform_test_data, calculate_increase_percent
 
-app = Flask(__name__)
+@bp.after_app_request
+def finish_profile(response):
+    """Record the request's metrics, add the Server-Timing header and log the profile, after all other hooks ran"""
+    request_profiler.finish(request, response)
+    return response
 
-basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(basedir, 'data/database.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-db.init_app(app)
+@bp.teardown_app_request
+def discard_profile(exception=None):
+    request_profiler.discard()
 
-db_manager = DBManager()
+
+@bp.before_app_request
+def route_reads_to_replica():
+    """Let GET requests read from the replica unless the user wrote after the replica's last sync"""
+    if replica_router.enabled and request.method in ("GET", "HEAD"):
+        g.read_replica = replica_router.should_read(session.get('last_write_at'))
+
+
+@bp.after_app_request
+def remember_last_write(response):
+    """Stamp the user's session after a write, so their next reads see it (read-your-writes)"""
+    if replica_router.enabled and db.session.info.get('wrote'):
+        session['last_write_at'] = time.time()
+    return response
+
+
+@bp.before_app_request
+def route_to_company_shard():
+    """In sharded mode, run the queries of a request on the shard of the logged-in user's company"""
+    if shard_router.enabled and 'user_id' in session:
+        user = db_manager.get_user(session['user_id'])
+        if user:
+            shard_router.use_company(user.company_id)
 
 
 # =================================================================
@@ -46,17 +161,119 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             flash('Please log in to access this page.', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 
+# =================================================================
+# RESPONSE CACHE
+# =================================================================
+
+def user_company(user_id=None, **kwargs):
+    """Company of the user in the URL, or of the logged-in user"""
+    user = db_manager.get_user(user_id or session.get('user_id'))
+    return user.company_id if user else None
+
+
+def url_company(company_id, **kwargs):
+    """Company in the URL"""
+    return company_id
+
+
+def cache_response(company_of):
+    """
+    Decorator to serve GET views from the response cache (data/response_cache.py).
+
+    Successful responses are cached per path, logged-in user and version of the
+    company that company_of(**view_args) returns, so repeat requests skip the
+    view until the company's data changes. Responses carry a strong ETag and
+    requests with a matching If-None-Match get 304 Not Modified.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = None
+            entry = MISSING
+            if response_cache.enabled:
+                company_id = company_of(**kwargs)
+                if company_id is not None:
+                    key = (request.endpoint, request.full_path, session.get('user_id'),
+                           company_id, response_cache.version(company_id))
+                    entry = response_cache.get(key)
+
+            if entry is MISSING:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                if key is None:
+                    entry = (response_etag(body), body, response.mimetype)
+                else:
+                    entry = response_cache.set(key, body, response.mimetype)
+
+            etag, body, mimetype = entry
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+        return decorated_function
+    return decorator
+
+
+# =================================================================
+# STATIC ASSETS
+# =================================================================
+
+@bp.app_template_global('asset_url')
+def asset_url(name):
+    """URL of an asset bundle (utils/assets.py), with its content hash once the assets are built"""
+    return url_for('main.serve_asset', filename=assets.filename(name))
+
+
+@bp.route("/assets/<path:filename>")
+def serve_asset(filename):
+    """
+    Serve a built asset with immutable caching, precompressed if the browser accepts it.
+
+    Without a build, bundles are concatenated from their sources and revalidated on every request.
+    """
+    if not assets.built:
+        if filename not in BUNDLES:
+            abort(404)
+        response = Response(bundle_source(current_app.static_folder, filename),
+                            mimetype=mimetypes.guess_type(filename)[0])
+        response.add_etag()
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+    path = safe_join(assets.build_dir, filename)
+    if path is None or not filename.endswith(TEXT_TYPES + ('.png',)) or not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    if filename.endswith(TEXT_TYPES):
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], max_age=assets.max_age)
+    if encoding:
+        response.content_encoding = encoding
+    if filename.endswith(TEXT_TYPES):
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 # =================================================================
 # HELPER FUNCTIONS
 # Having utils.py or helper.py script that gets imported here would be better
 # =================================================================
 
-@app.template_filter('initials')
+@bp.app_template_filter('initials')
 def get_initials(name):
     """Extract initials from a full name"""
     if not name:
@@ -70,11 +287,185 @@ def get_initials(name):
     return ''
 
 
+@bp.app_template_filter('highlight')
+def highlight_snippet(snippet):
+    """Render a search snippet as HTML with the matches in <mark>"""
+    return Markup(str(escape(snippet or ''))
+                  .replace(HIGHLIGHT_OPEN, '<mark>')
+                  .replace(HIGHLIGHT_CLOSE, '</mark>'))
+
+
+def refresh_report(user_id, test_id, force=False):
+    """
+    Create or update the report of a test from its first two variants.
+
+    The statistics and the AI texts are only recomputed when their inputs
+    changed since the report was saved (see data/fingerprints.py).
+
+    Args:
+        user_id: User whose model generates the AI texts
+        test_id: Test ID
+        force: Recompute the report even if its inputs didn't change
+
+    Returns:
+        Tuple (stats, ai) of booleans, True for the parts that were recomputed
+    """
+    user = db_manager.get_user(user_id)
+    company = db_manager.get_company(user.company_id)
+    test = db_manager.get_test(test_id, company.id)
+    variants = db_manager.get_variants(test_id)
+    counts = (int(variants[0].impressions), int(variants[0].conversions),
+              int(variants[1].impressions), int(variants[1].conversions))
+
+    stats_key = stats_fingerprint(*counts)
+    ai_key = ai_fingerprint(stats_key, test, company, get_user_model_id(user_id), PROMPT_VERSION)
+    report = db_manager.get_report(test_id)
+    stale = stale_parts(report, stats_key, ai_key, force)
+    if not any(stale):
+        return stale
+
+    # Calculate significance, the AI prompt needs it as well
+    report_data = two_proportion_z_test(*counts)
+    increase_percent = calculate_increase_percent(report_data["conv_rate_a"], report_data["conv_rate_b"])
+
+    if stale[1]:
+        company_data = {
+            "name": company.name,
+            "audience": company.audience,
+            "year": company.year
+        }
+        ai_recommendation = generate_ai_recommendation(test, report_data, company_data, user_id)
+        ai_summary = generate_ai_summary(ai_recommendation, user_id)
+        if ai_recommendation.get("decision") == RECOMMENDATION_ERROR or ai_summary == SUMMARY_ERROR:
+            # Without a fingerprint the next save tries again
+            ai_key = None
+    else:
+        ai_recommendation = report.ai_recommendation
+        ai_summary = report.summary
+
+    fields = dict(summary=ai_summary,
+                  p_value=round(report_data["p_value"], 3),
+                  significance=report_data["significant"],
+                  increase_percent=increase_percent,
+                  ai_recommendation=ai_recommendation,
+                  stats_fingerprint=stats_key,
+                  ai_fingerprint=ai_key)
+    if report is None:
+        db_manager.create_report(test_id, **fields)
+    else:
+        db_manager.update_report(report.id, **fields)
+    return True, stale[1]
+
+
+def test_to_dict(test):
+    """Convert a test to a JSON-serializable dict"""
+    return {
+        'id': test.id,
+        'name': test.name,
+        'description': test.description,
+        'metric': test.metric,
+        'created_at': test.created_at.strftime('%B %d, %Y') if test.created_at else 'N/A'
+    }
+
+
+def variant_to_dict(variant):
+    """Convert a variant to a JSON-serializable dict"""
+    return {
+        'id': variant.id,
+        'test_id': variant.test_id,
+        'name': variant.name,
+        'impressions': variant.impressions,
+        'conversions': variant.conversions,
+        'conversion_rate': variant.conversion_rate
+    }
+
+
+def report_document(test):
+    """Test with its variants and report as rendered by the report exports, None if it has fewer than 2 variants"""
+    test_variants = db_manager.get_variants(test.id)
+    if len(test_variants) < 2:
+        return None
+
+    report = db_manager.get_report(test.id)
+    return {
+        "test": test_to_dict(test),
+        "variants": [variant_to_dict(variant) for variant in test_variants],
+        "report": report_to_dict(report) if report else None
+    }
+
+
+def parse_report_export(args):
+    """
+    Read the format, template and sections of a report export.
+
+    sections is the report builder layout: the visible sections in their order,
+    as a list or comma-separated. Without it the template's default order is used.
+
+    Returns:
+        Tuple (report_format, template, sections)
+
+    Raises:
+        ValueError: If an option is unknown
+    """
+    report_format = args.get("format", "pdf")
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(REPORT_FORMATS)}")
+
+    template = args.get("template", "full")
+    if template not in REPORT_TEMPLATES:
+        raise ValueError(f"template must be one of {', '.join(REPORT_TEMPLATES)}")
+
+    layout = args.get("sections")
+    if isinstance(layout, str):
+        layout = [section for section in layout.split(",") if section]
+    return report_format, template, report_sections(template, layout)
+
+
+def report_archive(company_id, test_ids, report_format, template, sections):
+    """
+    Render the reports of tests into one zip archive.
+
+    Tests that don't exist or have fewer than 2 variants are left out.
+
+    Returns:
+        Tuple (zip file content, number of reports)
+    """
+    documents = []
+    for test_id in test_ids:
+        test = db_manager.get_test(test_id, company_id)
+        document = report_document(test) if test else None
+        if document:
+            documents.append(document)
+
+    rendered = report_renderer.render_many([(report_format, document, sections) for document in documents])
+
+    buffer = io.BytesIO()
+    # PDF pages and PowerPoint files are compressed already
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for document, (fingerprint, content) in zip(documents, rendered):
+            filename = report_filename(document, template, report_format)
+            archive.writestr(f"{document['test']['id']}_{filename}", content)
+    return buffer.getvalue(), len(documents)
+
+
+def report_to_dict(report):
+    """Convert a report to a JSON-serializable dict, parsing structured recommendations"""
+    return {
+        'id': report.id,
+        'test_id': report.test_id,
+        'p_value': report.p_value,
+        'summary': report.summary,
+        'significance': report.significance,
+        'increase_percent': report.increase_percent,
+        'ai_recommendation': report.ai_recommendation
+    }
+
+
 # =================================================================
 # LOGIN & REGISTRATION
 # =================================================================
 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     """Handle user login"""
     if request.method == "POST":
@@ -89,14 +480,14 @@ def login():
             session['user_id'] = user.id
             session['user_name'] = user.name
             flash('Login successful!', 'success')
-            return redirect(url_for('home_page'))
+            return redirect(url_for('main.home_page'))
         else:
             flash('Invalid email or password', 'error')
 
     return render_template("login.html")
 
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     """Handle user registration"""
     if request.method == "POST":
@@ -112,7 +503,7 @@ def register():
         existing_user = db.session.query(users).filter_by(email=email).first()
         if existing_user:
             flash('Email already registered', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
 
         # Create company first
         company = db_manager.create_company(
@@ -135,65 +526,79 @@ def register():
         db.session.commit()
 
         flash('Registration successful! Please log in.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     return render_template("register.html")
 
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     """Handle user logout"""
     session.clear()
     flash('You have been logged out successfully.', 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
 # =================================================================
 # INDEX
 # =================================================================
 
-@app.route("/")
+def dashboard_state(company_id):
+    """
+    Data of a company's dashboard as plain values, for the page and its live updates (data/live.py).
+
+    Returns:
+        Dict of the most recent test with its variants and report, the totals over all tests and the test ratios
+    """
+    with shard_router.company(company_id):
+        total_tests = len(db_manager.get_ab_tests(company_id))
+        total_variants = db_manager.get_all_variants(company_id)
+        test = db_manager.get_recent_test(company_id)
+        variants = db_manager.get_variants(test.id) if test is not None else []
+        report = db_manager.get_report(test.id) if test is not None else None
+
+    return {
+        "test": test and {"id": test.id, "name": test.name, "description": test.description, "metric": test.metric},
+        "variants": [{
+            "name": variant.name,
+            "impressions": variant.impressions,
+            "conversions": variant.conversions,
+            # avoid division by zero
+            "conversion_rate": (round(float(variant.conversions) / float(variant.impressions) * 100, 2)
+                                if variant.impressions else 0.0)
+        } for variant in variants],
+        "report": report and {
+            "summary": report.summary,
+            "increase_percent": report.increase_percent,
+            "p_value": report.p_value,
+            "significance": report.significance
+        },
+        "totals": {
+            "tests": total_tests,
+            "impressions": sum(variant.impressions for variant in total_variants),
+            "conversions": sum(variant.conversions for variant in total_variants)
+        },
+        "ratios": test_ratios(company_id)
+    }
+
+
+def after_form_post(endpoint, **values):
+    """Redirect after a form post, or answer 204 to forms the live dashboard submitted in the background"""
+    if request.accept_mimetypes.best == "application/json":
+        return "", 204
+    return redirect(url_for(endpoint, **values))
+
+
+@bp.route("/")
 @login_required
+@cache_response(user_company)
 def home_page():
     user_id = session.get('user_id')
     user = db_manager.get_user(user_id)
+    return render_template("index.html", user=user, live_enabled=live_hub.enabled, **dashboard_state(user.company_id))
 
-    total_tests = len(db_manager.get_ab_tests(user.company_id))
-    total_variants = db_manager.get_all_variants(user.company_id)
-    total_impressions = 0
-    total_conversions = 0
-    for variant in total_variants:
-        total_impressions += variant.impressions
-        total_conversions += variant.conversions
-
-    # Data for the most recent test
-    test = db_manager.get_recent_test(user.company_id)
-    try:
-        variants = db_manager.get_variants(test.id)
-        report = db_manager.get_report(test.id)
-    except AttributeError:
-        variants = []
-        report = None
-
-    for variant in variants:
-        # avoid division by zero
-        if variant.impressions:
-            variant.conversion_rate = round(float(variant.conversions) / float(variant.impressions) * 100, 2)
-        else:
-            variant.conversion_rate = 0.0
 
-    return render_template("index.html",
-                           user=user,
-                           total_tests=total_tests,
-                           total_impressions=total_impressions,
-                           total_conversions=total_conversions,
-                           test=test,
-                           variants=variants,
-                           report=report
-                           )
-
-
-@app.route("/home/<int:user_id>", methods=["POST"])
+@bp.route("/home/<int:user_id>", methods=["POST"])
 @login_required
 def home_page_create_test(user_id):
     user = db_manager.get_user(user_id)
@@ -205,10 +610,10 @@ def home_page_create_test(user_id):
 
     db_manager.create_ab_test(company.id, name, description, metric)
 
-    return redirect(url_for("home_page", user_id=user_id))
+    return after_form_post("main.home_page", user_id=user_id)
 
 
-@app.route("/home/variants/<int:user_id>/<int:test_id>", methods=["POST"])
+@bp.route("/home/variants/<int:user_id>/<int:test_id>", methods=["POST"])
 @login_required
 def home_page_create_variant(user_id, test_id):
 
@@ -226,122 +631,66 @@ def home_page_create_variant(user_id, test_id):
     conversion_rate = round(float(conversions_b) / float(impressions_b) * 100, 2)
     db_manager.create_variant(test_id, name, impressions_b, conversions_b, conversion_rate)
 
-    # Calculate significance
-    report_data = two_proportion_z_test(
-        int(impressions_a),
-        int(conversions_a),
-        int(impressions_b),
-        int(conversions_b)
-    )
-
-
-    # Transform data for AI
-
-    # 1. Company data
-    user = db_manager.get_user(user_id)
-    company = db_manager.get_company(user.company_id)
-    company_data = {
-        "name": company.name,
-        "audience": company.audience,
-        "year": company.year
-    }
-    # 2. Test data
-    test_data = db_manager.get_test(test_id, company.id)
-    transform_test_data(test_data, db_manager.get_variants(test_id), report_data)
-
-    # 3. Report data
-    ai_recommendation = generate_ai_recommendation(test_data, report_data, company_data, user_id)
-    ai_summary = generate_ai_summary(ai_recommendation, user_id)
-
-    # Calculate increase percentage
-    increase_percent = calculate_increase_percent(
-        report_data["conv_rate_a"],
-        report_data["conv_rate_b"]
-    )
+    # Calculate significance and generate the AI report
+    refresh_report(user_id, test_id)
 
-    # Convert ai_recommendation dict to JSON string for database storage
-    ai_recommendation_json = json.dumps(ai_recommendation) if isinstance(ai_recommendation, dict) else ai_recommendation
-
-    # Create report
-    db_manager.create_report(test_id,
-                             summary=ai_summary,
-                             p_value=round(report_data["p_value"], 3),
-                             significance=report_data["significant"],
-                             increase_percent=increase_percent,
-                             ai_recommendation=ai_recommendation_json)
-
-    return redirect(url_for("home_page", user_id=user_id))
+    return after_form_post("main.home_page", user_id=user_id)
 
 
 # =================================================================
 # TESTS & VARIANTS
 # =================================================================
 
-@app.route("/tests/<int:user_id>")
+@bp.route("/tests/<int:user_id>")
 @login_required
 def tests_page(user_id):
     user = db_manager.get_user(user_id)
-    tests = db_manager.get_ab_tests(user.company_id)
-    variants = db_manager.get_all_variants(user.company_id)
-    reports = db_manager.get_all_reports()
+    cursor = request.args.get("cursor")
+    query = request.args.get("q", "").strip()
+
+    if query:
+        results = db_manager.search_tests(user.company_id, query, limit=SEARCH_RESULTS_LIMIT)
+        return render_template("tests.html",
+                               user=user,
+                               tests=[result['test'] for result in results],
+                               snippets={result['test'].id: result['snippet'] for result in results},
+                               query=query,
+                               cursor=None,
+                               next_cursor=None
+                               )
+
+    try:
+        tests, next_cursor = db_manager.get_tests_page(user.company_id, TESTS_PAGE_SIZE,
+                                                       cursor=cursor, with_results=True)
+    except ValueError:
+        return redirect(url_for("main.tests_page", user_id=user_id))
 
     return render_template("tests.html",
                            user=user,
                            tests=tests,
-                           variants=variants,
-                           reports=reports
+                           query="",
+                           cursor=cursor,
+                           next_cursor=next_cursor
                            )
 
 
-@app.route("/reports/<int:user_id>")
+@bp.route("/reports/<int:user_id>")
 @login_required
+@cache_response(user_company)
 def reports_page(user_id):
     """Stakeholder report generation page"""
     user = db_manager.get_user(user_id)
-    tests = db_manager.get_ab_tests(user.company_id)
-    variants = db_manager.get_all_variants(user.company_id)
-    reports = db_manager.get_all_reports()
 
-    # Convert data to JSON for JavaScript
-    tests_json = json.dumps([{
-        'id': test.id,
-        'name': test.name,
-        'description': test.description,
-        'metric': test.metric,
-        'created_at': test.created_at.strftime('%B %d, %Y') if test.created_at else 'N/A'
-    } for test in tests])
-
-    variants_json = json.dumps([{
-        'id': variant.id,
-        'test_id': variant.test_id,
-        'name': variant.name,
-        'impressions': variant.impressions,
-        'conversions': variant.conversions,
-        'conversion_rate': variant.conversion_rate
-    } for variant in variants])
-
-    reports_json = json.dumps([{
-        'id': report.id,
-        'test_id': report.test_id,
-        'p_value': report.p_value,
-        'summary': report.summary,
-        'significance': report.significance,
-        'increase_percent': report.increase_percent,
-        'ai_recommendation': json.loads(report.ai_recommendation) if report.ai_recommendation and report.ai_recommendation.startswith('{') else report.ai_recommendation
-    } for report in reports])
+    # Tests, variants and reports are fetched by report_generator.js on demand
+    has_tests = db_manager.get_recent_test(user.company_id) is not None
 
     return render_template("reports.html",
                            user=user,
-                           tests=tests,
-                           variants=variants,
-                           reports=reports,
-                           tests_json=tests_json,
-                           variants_json=variants_json,
-                           reports_json=reports_json
+                           has_tests=has_tests
                            )
 
 
-@app.route("/tests/<int:user_id>", methods=["POST"])
+@bp.route("/tests/<int:user_id>", methods=["POST"])
 @login_required
 def tests_page_create_test(user_id):
     user = db_manager.get_user(user_id)
@@ -353,18 +702,18 @@ def tests_page_create_test(user_id):
 
     db_manager.create_ab_test(company.id, name, description, metric)
 
-    return redirect(url_for("tests_page", user_id=user_id))
+    return redirect(url_for("main.tests_page", user_id=user_id))
 
 
-@app.route("/tests/<int:user_id>/<int:test_id>", methods=["POST"])
+@bp.route("/tests/<int:user_id>/<int:test_id>", methods=["POST"])
 @login_required
 def tests_page_delete_test(user_id, test_id):
     db_manager.delete_ab_test(test_id)
 
-    return redirect(url_for("tests_page", user_id=user_id))
+    return redirect(url_for("main.tests_page", user_id=user_id))
 
 
-@app.route("/tests/variants/<int:user_id>/<int:test_id>", methods=["POST"])
+@bp.route("/tests/variants/<int:user_id>/<int:test_id>", methods=["POST"])
 @login_required
 def tests_page_create_variant(user_id, test_id):
 
@@ -382,109 +731,41 @@ def tests_page_create_variant(user_id, test_id):
     conversion_rate = round(float(conversions_b) / float(impressions_b) * 100, 2)
     db_manager.create_variant(test_id, name, impressions_b, conversions_b, conversion_rate)
 
-    return redirect(url_for("tests_page", user_id=user_id))
+    return redirect(url_for("main.tests_page", user_id=user_id))
 
 
 # =================================================================
 # ANALYSIS PAGE
 # =================================================================
 
-@app.route("/analysis/<int:user_id>/<int:test_id>")
+@bp.route("/analysis/<int:user_id>/<int:test_id>")
 @login_required
+@cache_response(user_company)
 def analysis_page(user_id, test_id):
     user = db_manager.get_user(user_id)
     test = db_manager.get_test(test_id, user.company_id)
     variants = db_manager.get_variants(test_id)
     report = db_manager.get_report(test_id)
 
-    # Parse ai_recommendation from JSON string to dict if needed
-    if report and isinstance(report.ai_recommendation, str):
-        try:
-            report.ai_recommendation = json.loads(report.ai_recommendation)
-        except json.JSONDecodeError:
-            # Keep as string if parsing fails (backward compatibility)
-            pass
-
-    # Convert variants to dictionaries for JSON serialization
-    variants_data = []
+    # Statistics and variant data come from the cached analysis payload, the charts fetch its curves
     if variants and len(variants) >= 2:
-        for variant in variants:
-            # guard conversion rate computation
-            if variant.impressions:
-                conversion_rate = variant.conversions / variant.impressions
-            else:
-                conversion_rate = 0.0
-            variants_data.append({
-                'id': variant.id,
-                'name': variant.name,
-                'impressions': variant.impressions,
-                'conversions': variant.conversions,
-                'conversion_rate': conversion_rate
-            })
-
-        # Calculate relative uplift and other metrics
-        variant_a = variants[0]
-        variant_b = variants[1]
-
-        # Calculate conversion rates as decimals with zero-division guards
-        conv_rate_a = (variant_a.conversions / variant_a.impressions) if variant_a.impressions else 0.0
-        conv_rate_b = (variant_b.conversions / variant_b.impressions) if variant_b.impressions else 0.0
-
-        # Calculate standard errors for normal distribution
-        import math
-        std_error_a = math.sqrt((conv_rate_a * (1 - conv_rate_a)) / variant_a.impressions) if variant_a.impressions else 0.0
-        std_error_b = math.sqrt((conv_rate_b * (1 - conv_rate_b)) / variant_b.impressions) if variant_b.impressions else 0.0
-
-        # Calculate 95% confidence intervals
-        z_score_95 = 1.96
-        ci_lower_a = max(0, conv_rate_a - z_score_95 * std_error_a)
-        ci_upper_a = min(1, conv_rate_a + z_score_95 * std_error_a)
-        ci_lower_b = max(0, conv_rate_b - z_score_95 * std_error_b)
-        ci_upper_b = min(1, conv_rate_b + z_score_95 * std_error_b)
-
-        # Additional analysis data
-        analysis_data = {
-            'total_sessions': variant_a.impressions + variant_b.impressions,
-            'total_conversions': variant_a.conversions + variant_b.conversions,
-            'variant_a_sample_size': variant_a.impressions,
-            'variant_b_sample_size': variant_b.impressions,
-            'distribution_data': {
-                'variant_a': {
-                    'mean': conv_rate_a,
-                    'std_error': std_error_a,
-                    'ci_lower': ci_lower_a,
-                    'ci_upper': ci_upper_a
-                },
-                'variant_b': {
-                    'mean': conv_rate_b,
-                    'std_error': std_error_b,
-                    'ci_lower': ci_lower_b,
-                    'ci_upper': ci_upper_b
-                }
-            }
-        }
+        payload = analysis_payload(test_id, variants)[1]
+        variants_data = payload['variants']
+        analysis_data = payload['stats']
     else:
+        variants_data = []
         analysis_data = None
 
     # Convert report to dictionary for JSON serialization
     report_data = None
     if report:
-        # Parse ai_recommendation from JSON string to dict if needed
-        ai_recommendation = report.ai_recommendation
-        if isinstance(ai_recommendation, str):
-            try:
-                ai_recommendation = json.loads(ai_recommendation)
-            except json.JSONDecodeError:
-                # Keep as string if parsing fails (backward compatibility)
-                pass
-
         report_data = {
             'id': report.id,
             'p_value': report.p_value,
             'significance': report.significance,
             'increase_percent': report.increase_percent,
             'summary': report.summary,
-            'ai_recommendation': ai_recommendation
+            'ai_recommendation': report.ai_recommendation
         }
 
     return render_template("analysis.html",
@@ -501,20 +782,33 @@ def analysis_page(user_id, test_id):
 # EDIT TEST PAGE
 # =================================================================
 
-@app.route("/edit/<int:user_id>/<int:test_id>")
+def editable_test(user, test_id):
+    """Test of the user's company to edit, aborts with 404 when it is missing and 409 when it is archived"""
+    test = db_manager.get_test(test_id, user.company_id)
+    if test is None:
+        abort(404)
+    if test.archived_at:
+        abort(409, description='This test is archived. Restore it before editing: flask archive restore')
+    return test
+
+
+@bp.route("/edit/<int:user_id>/<int:test_id>")
 @login_required
 def edit_test_page(user_id, test_id):
     user = db_manager.get_user(user_id)
-    test = db_manager.get_test(test_id, user.company_id)
+    test = editable_test(user, test_id)
     variants = db_manager.get_variants(test_id)
     report = db_manager.get_report(test_id)
 
     return render_template("edit.html", user=user, test=test, variants=variants, report=report)
 
 
-@app.route("/edit/<int:user_id>/<int:test_id>", methods=["POST"])
+@bp.route("/edit/<int:user_id>/<int:test_id>", methods=["POST"])
 @login_required
 def edit_test_page_update_variant(user_id, test_id):
+    user = db_manager.get_user(user_id)
+    editable_test(user, test_id)
+
     # Update test
     name = request.form.get("name")
     description = request.form.get("description")
@@ -534,73 +828,30 @@ def edit_test_page_update_variant(user_id, test_id):
         conversion_rate = round(float(conversions) / float(impressions) * 100, 2)
         db_manager.update_variant(variant_id, impressions, conversions, conversion_rate)
 
-    # Get variant data
-    variants = db_manager.get_variants(test_id)
-    impressions_a = variants[0].impressions
-    conversions_a = variants[0].conversions
-    impressions_b = variants[1].impressions
-    conversions_b = variants[1].conversions
-
-    # Calculate significance
-    report_data = two_proportion_z_test(
-        int(impressions_a),
-        int(conversions_a),
-        int(impressions_b),
-        int(conversions_b)
-    )
-
-    # Transform data for AI
-
-    # 1. Company data
-    user = db_manager.get_user(user_id)
-    company = db_manager.get_company(user.company_id)
-    company_data = {
-        "name": company.name,
-        "audience": company.audience,
-        "year": company.year
-    }
-    # 2. Test data
-    test_data = db_manager.get_test(test_id, company.id)
-    transform_test_data(test_data, db_manager.get_variants(test_id), report_data)
-
-    # 3. Report data
-    ai_recommendation = generate_ai_recommendation(test_data, report_data, company_data, user_id)
-    ai_summary = generate_ai_summary(ai_recommendation, user_id)
+    # Recompute the parts of the report whose inputs changed, everything if the user asked to regenerate it
+    if len(variant_ids) >= 2:
+        refresh_report(user_id, test_id, force=request.form.get("regenerate") == "1")
 
-    # Calculate increase percentage
-    increase_percent = calculate_increase_percent(
-        report_data["conv_rate_a"],
-        report_data["conv_rate_b"]
-    )
-
-    # Convert ai_recommendation dict to JSON string for database storage
-    ai_recommendation_json = json.dumps(ai_recommendation) if isinstance(ai_recommendation, dict) else ai_recommendation
-
-    # Update report
-    report = db_manager.get_report(test_id)
-    db_manager.update_report(report.id,
-                             summary=ai_summary,
-                             p_value=round(report_data["p_value"], 3),
-                             significance=report_data["significant"],
-                             increase_percent=increase_percent,
-                             ai_recommendation=ai_recommendation_json)
-
-    return redirect(url_for("edit_test_page", user_id=user_id, test_id=test_id))
+    return redirect(url_for("main.edit_test_page", user_id=user_id, test_id=test_id))
 
 
 # =================================================================
 # API
 # =================================================================
 
-@app.route("/api/test-ratios/<int:company_id>")
-def get_test_ratios(company_id):
+def test_ratios(company_id):
     """
-    Calculate and return the ratio of winning, losing, and other tests.
+    Calculate the ratio of winning, losing, and other tests.
 
     Winning: significant AND conversion increased (Variant B > Variant A)
     Losing: significant AND conversion decreased (Variant B < Variant A)
     Other: not significant
     """
+    if analytics_snapshots.enabled:
+        summary = portfolio_summary(analytics_snapshots.read(company_id))
+        return {key: summary[key] for key in ("winning", "losing", "other", "winning_percent",
+                                              "losing_percent", "other_percent")}
+
     tests = db_manager.get_ab_tests(company_id)
 
     winning = 0
@@ -636,26 +887,473 @@ def get_test_ratios(company_id):
     total = winning + losing + other
 
     if total == 0:
-        return jsonify({
+        return {
             "winning": 0,
             "losing": 0,
             "other": 0,
             "winning_percent": 0,
             "losing_percent": 0,
             "other_percent": 0
-        })
+        }
 
-    return jsonify({
+    return {
         "winning": winning,
         "losing": losing,
         "other": other,
         "winning_percent": round((winning / total) * 100, 1),
         "losing_percent": round((losing / total) * 100, 1),
         "other_percent": round((other / total) * 100, 1)
+    }
+
+
+@bp.route("/api/test-ratios/<int:company_id>")
+@cache_response(url_company)
+def get_test_ratios(company_id):
+    """Return the ratio of winning, losing, and other tests"""
+    return jsonify(test_ratios(company_id))
+
+
+@bp.route("/api/analytics/<int:company_id>")
+@login_required
+@cache_response(url_company)
+def portfolio_analytics_api(company_id):
+    """Return portfolio metrics over all tests of a company, read from its analytics snapshot"""
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    if not analytics_snapshots.enabled:
+        return jsonify({"error": "Analytics snapshots are disabled. Install pyarrow and set ANALYTICS_DIR"}), 503
+
+    return jsonify(portfolio_summary(analytics_snapshots.read(company_id)))
+
+
+@bp.route("/api/live/<int:company_id>")
+@login_required
+def live_updates_api(company_id):
+    """
+    Stream the changes of a company's dashboard as Server-Sent Events (data/live.py).
+
+    The stream ends after LIVE_STREAM_TIMEOUT seconds and the browser reconnects.
+    """
+    if not live_hub.enabled:
+        abort(404)
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+    try:
+        subscription = live_hub.subscribe(company_id)
+    except OverflowError as e:
+        response = jsonify({"error": str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(live_hub.stream_timeout))
+        return response
+
+    # The stream must see the writes it is notified about
+    g.read_replica = False
+
+    def generate():
+        yield format_retry(RECONNECT_DELAY)
+        state = version = None
+        started = last_sent = time.monotonic()
+        while not subscription.closed and time.monotonic() - started < live_hub.stream_timeout:
+            now = time.monotonic()
+            # Every write, also of other processes and of the analytics snapshots the ratios come from, moves it
+            current_version = response_cache.version(company_id)
+            if current_version != version:
+                version = current_version
+                current = live_hub.state(company_id, version, dashboard_state)
+                # End the read transaction and forget the request's rows, the next read must see new writes
+                db.session.remove()
+                g.pop('db_cache', None)
+                for event, data in state_events(state, current):
+                    yield format_event(event, data)
+                    last_sent = now
+                state = current
+            elif now - last_sent >= HEARTBEAT_INTERVAL:
+                yield format_comment("keep-alive")
+                last_sent = now
+
+            subscription.wait(live_hub.poll_interval)
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep proxies like nginx from buffering the events
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda: live_hub.unsubscribe(subscription))
+    return response
+
+
+@bp.route("/api/replica-status")
+def replica_status_api():
+    """Return the replica lag and how many requests read from the replica or the primary"""
+    return jsonify(replica_router.stats())
+
+
+@bp.route("/api/tests/<int:company_id>")
+@login_required
+def list_tests_api(company_id):
+    """
+    Return one page of a company's tests, newest first.
+
+    Query parameters:
+        cursor: next_cursor value from the previous page
+        limit: page size (default 20, max 100)
+        with_variants: if "1", only return tests that have variants
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    limit = min(request.args.get("limit", TESTS_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+    only_with_variants = request.args.get("with_variants") == "1"
+
+    try:
+        tests, next_cursor = db_manager.get_tests_page(company_id, max(limit, 1),
+                                                       cursor=request.args.get("cursor"),
+                                                       only_with_variants=only_with_variants)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    return jsonify({
+        "tests": [test_to_dict(test) for test in tests],
+        "next_cursor": next_cursor
+    })
+
+
+@bp.route("/api/search/<int:company_id>")
+@login_required
+def search_tests_api(company_id):
+    """
+    Full-text search over a company's tests and reports, best matches first.
+
+    Query parameters:
+        q: words to search for, each matched as a word prefix
+        limit: number of results (default 50, max 100)
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    limit = min(request.args.get("limit", SEARCH_RESULTS_LIMIT, type=int), MAX_PAGE_SIZE)
+    results = db_manager.search_tests(company_id, request.args.get("q", ""), limit=max(limit, 1))
+
+    return jsonify({
+        "results": [{
+            **test_to_dict(result['test']),
+            "rank": result['rank'],
+            "snippet": result['snippet'].replace(HIGHLIGHT_OPEN, '').replace(HIGHLIGHT_CLOSE, ''),
+            "snippet_html": highlight_snippet(result['snippet'])
+        } for result in results]
     })
 
 
-@app.route("/api/generate-description", methods=["POST"])
+@bp.route("/api/tests/<int:company_id>/<int:test_id>")
+@login_required
+def get_test_api(company_id, test_id):
+    """Return a single test with its variants and report"""
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    test = db_manager.get_test(test_id, company_id)
+    if not test:
+        return jsonify({"error": "Test not found"}), 404
+
+    report = db_manager.get_report(test_id)
+
+    return jsonify({
+        "test": test_to_dict(test),
+        "variants": [variant_to_dict(variant) for variant in db_manager.get_variants(test_id)],
+        "report": report_to_dict(report) if report else None
+    })
+
+
+@bp.route("/api/tests/<int:company_id>/<int:test_id>/timeseries")
+@login_required
+def get_test_timeseries_api(company_id, test_id):
+    """Return the daily snapshot series of a test's variants, downsampled to ?points"""
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    test = db_manager.get_test(test_id, company_id)
+    if not test:
+        return jsonify({"error": "Test not found"}), 404
+
+    points = request.args.get("points", TIME_SERIES_POINTS, type=int)
+    points = min(max(points, 1), MAX_TIME_SERIES_POINTS)
+
+    return jsonify(build_time_series(db_manager.get_variants(test_id),
+                                     db_manager.get_variant_snapshots(test_id),
+                                     points))
+
+
+@bp.route("/api/tests/<int:company_id>/<int:test_id>/analysis")
+@login_required
+def get_test_analysis_api(company_id, test_id):
+    """
+    Return the precomputed analysis payload of a test (see data/analysis.py).
+
+    The ETag is the payload's fingerprint, so clients revalidate with
+    If-None-Match and get 304 Not Modified until the variants change.
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    test = db_manager.get_test(test_id, company_id)
+    if not test:
+        return jsonify({"error": "Test not found"}), 404
+
+    variants = db_manager.get_variants(test_id)
+    if len(variants) < 2:
+        return jsonify({"error": "Test has fewer than two variants"}), 404
+
+    fingerprint, payload = analysis_payload(test_id, variants)
+    if request.if_none_match.contains(fingerprint):
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(fingerprint)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@bp.route("/api/events/<int:company_id>", methods=["POST"])
+@login_required
+def ingest_events_api(company_id):
+    """
+    Ingest a batch of impression/conversion events as NDJSON.
+
+    Each line is {"test_id": 1, "variant_id": 2, "event": "impression" | "conversion", "count": 1}.
+    Events are aggregated in memory and written to the variants table in batches,
+    so the counts become visible after the next flush.
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    def is_known(test_id, variant_id):
+        return db_manager.get_variant_test_ids(company_id, [variant_id]).get(variant_id) == test_id
+
+    # request.stream reads line by line in tiny chunks, buffering it is an order of magnitude faster
+    deltas, accepted, rejected, errors = parse_events(io.BufferedReader(request.stream), is_known=is_known)
+    if deltas:
+        event_aggregator.add({(company_id, *key): delta for key, delta in deltas.items()}, accepted)
+
+    return jsonify({
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors
+    }), 202
+
+
+@bp.route("/api/tests/<int:company_id>/delete", methods=["POST"])
+@login_required
+def delete_tests_api(company_id):
+    """
+    Delete many tests at once, body {"test_ids": [1, 2, 3]}.
+
+    Tests are soft-deleted with one UPDATE and disappear immediately, their
+    variants and reports are removed by the background purge.
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    test_ids = (request.get_json(silent=True) or {}).get("test_ids")
+    if not isinstance(test_ids, list) or not all(isinstance(test_id, int) for test_id in test_ids):
+        return jsonify({"error": "test_ids must be a list of test IDs"}), 400
+    if len(test_ids) > MAX_BULK_DELETE:
+        return jsonify({"error": f"At most {MAX_BULK_DELETE} tests can be deleted at once"}), 400
+
+    deleted = db_manager.delete_ab_tests(company_id, test_ids) if test_ids else 0
+    return jsonify({"deleted": deleted})
+
+
+@bp.route("/api/import/<int:company_id>", methods=["POST"])
+@login_required
+def import_tests_api(company_id):
+    """
+    Bulk import historical tests from an uploaded CSV or Parquet file ("file" field).
+
+    The response is streamed as NDJSON, one progress line per imported chunk,
+    followed by a final line with "done": true.
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"error": "A CSV or Parquet file is required"}), 400
+
+    filename = upload.filename.lower()
+    if not filename.endswith((".csv", ".parquet")):
+        return jsonify({"error": "Unsupported file type. Use .csv or .parquet"}), 400
+
+    # The upload is closed when the view returns, so keep a copy for the streamed response
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+    os.close(fd)
+    try:
+        upload.save(path)
+    except OSError:
+        os.remove(path)
+        raise
+
+    def generate():
+        summary = {'rows': 0, 'imported': 0, 'rejected': 0, 'errors': []}
+        try:
+            with open(path, "rb") as f:
+                for summary in iter_import(db_manager, company_id, iter_chunks(f, filename)):
+                    yield dumps({'rows': summary['rows'], 'imported': summary['imported'],
+                                 'rejected': summary['rejected']}, sort_keys=False) + b"\n"
+        except ValueError as e:
+            yield dumps({"error": str(e)}) + b"\n"
+            return
+        yield dumps({**summary, "done": True}, sort_keys=False) + b"\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    # Runs after the body was sent, and also when the client left before the body started
+    response.call_on_close(lambda: os.remove(path))
+    return response
+
+
+def parse_export_filters(args):
+    """
+    Read the export filters from query parameters.
+
+    start and end are inclusive ISO dates, significant is "1" or "0".
+
+    Raises:
+        ValueError: If a filter is malformed
+    """
+    filters = {}
+    if args.get("start"):
+        filters["start"] = datetime.fromisoformat(args["start"])
+    if args.get("end"):
+        filters["end"] = datetime.fromisoformat(args["end"]) + timedelta(days=1)
+    if args.get("significant") in ("1", "0"):
+        filters["significant"] = args["significant"] == "1"
+    elif args.get("significant"):
+        raise ValueError("significant must be 1 or 0")
+    return filters
+
+
+@bp.route("/api/export/<int:company_id>")
+@login_required
+def export_tests_api(company_id):
+    """
+    Stream all tests of a company with their variants and reports as a download.
+
+    Query parameters:
+        format: ndjson (default), csv or parquet
+        gzip: if "1", gzip the ndjson or csv output
+        start, end: only tests created within these ISO dates (inclusive)
+        significant: "1" or "0" to only export (non-)significant tests
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    export_format = request.args.get("format", "ndjson")
+    compress = request.args.get("gzip") == "1" and export_format != "parquet"
+
+    try:
+        filters = parse_export_filters(request.args)
+        chunks = iter_export(db_manager.iter_export_rows(company_id, **filters), export_format, compress)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetypes = {"ndjson": "application/x-ndjson", "csv": "text/csv",
+                 "parquet": "application/vnd.apache.parquet"}
+    filename = f"tests-{company_id}.{export_format}" + (".gz" if compress else "")
+
+    return Response(stream_with_context(chunks),
+                    mimetype="application/gzip" if compress else mimetypes[export_format],
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
+@bp.route("/api/reports/<int:company_id>/<int:test_id>/export")
+@login_required
+def export_report_api(company_id, test_id):
+    """
+    Download the report of a test as a PDF or PowerPoint file rendered on the server.
+
+    Query parameters:
+        format: pdf (default) or pptx
+        template: executive, technical or full (default)
+        sections: comma-separated visible sections in the order of the saved report layout
+
+    Rendered files are cached per test version and layout and carry an ETag.
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    test = db_manager.get_test(test_id, company_id)
+    if not test:
+        return jsonify({"error": "Test not found"}), 404
+
+    try:
+        report_format, template, sections = parse_report_export(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    document = report_document(test)
+    if document is None:
+        return jsonify({"error": "The test needs at least 2 variants for a report"}), 400
+
+    try:
+        fingerprint, content = report_renderer.render(report_format, document, sections)
+    except ExportError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    response = send_file(io.BytesIO(content), mimetype=REPORT_MIMETYPES[report_format],
+                         as_attachment=True, download_name=report_filename(document, template, report_format),
+                         etag=fingerprint, max_age=0)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@bp.route("/api/reports/<int:company_id>/export", methods=["POST"])
+@login_required
+def export_reports_api(company_id):
+    """
+    Download the reports of many tests as one zip archive,
+    body {"test_ids": [1, 2, 3], "format": "pdf", "template": "full", "sections": [...]}.
+
+    The reports are rendered in parallel by the worker pool, tests with fewer
+    than 2 variants are left out.
+    """
+    user = db_manager.get_user(session.get('user_id'))
+    if not user or user.company_id != company_id:
+        return jsonify({"error": "Company not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    test_ids = data.get("test_ids")
+    if not isinstance(test_ids, list) or not all(isinstance(test_id, int) for test_id in test_ids):
+        return jsonify({"error": "test_ids must be a list of test IDs"}), 400
+    if len(test_ids) > MAX_BATCH_EXPORT:
+        return jsonify({"error": f"At most {MAX_BATCH_EXPORT} reports can be exported at once"}), 400
+
+    try:
+        report_format, template, sections = parse_report_export(data)
+        content, count = report_archive(company_id, test_ids, report_format, template, sections)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ExportError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    if not count:
+        return jsonify({"error": "None of the tests has a report to export"}), 400
+
+    return send_file(io.BytesIO(content), mimetype="application/zip", as_attachment=True,
+                     download_name=f"reports-{company_id}-{template}-{report_format}.zip")
+
+
+@bp.route("/api/generate-description", methods=["POST"])
 def generate_description_api():
     """
     Generate an AI-powered description for an AB test based on its name.
@@ -681,7 +1379,7 @@ def generate_description_api():
 # SETTINGS
 # =================================================================
 
-@app.route("/settings/<int:user_id>")
+@bp.route("/settings/<int:user_id>")
 @login_required
 def settings(user_id):
     from routes.llm_config import get_available_models, get_default_model
@@ -716,7 +1414,7 @@ def settings(user_id):
                            )
 
 
-@app.route("/settings/<int:user_id>", methods=["POST"])
+@bp.route("/settings/<int:user_id>", methods=["POST"])
 @login_required
 def update_user(user_id):
     from routes.llm_config import get_available_models
@@ -730,7 +1428,7 @@ def update_user(user_id):
         available_models = get_available_models()
         if llm_model not in available_models:
             flash(f"Invalid model selection: {llm_model}", "error")
-            return redirect(url_for("settings", user_id=user_id))
+            return redirect(url_for("main.settings", user_id=user_id))
 
         db_manager.update_model(user_id, llm_model)
         flash("Settings updated successfully!", "success")
@@ -739,10 +1437,10 @@ def update_user(user_id):
         db_manager.update_user(user_id, name, email, llm_model)
         flash("Settings updated successfully!", "success")
 
-    return redirect(url_for("settings", user_id=user_id))
+    return redirect(url_for("main.settings", user_id=user_id))
 
 
-@app.route("/settings/<int:user_id>/<int:company_id>", methods=["POST"])
+@bp.route("/settings/<int:user_id>/<int:company_id>", methods=["POST"])
 @login_required
 def update_company(user_id ,company_id):
     name = request.form.get("company_name")
@@ -751,11 +1449,341 @@ def update_company(user_id ,company_id):
     website = request.form.get("website")
     db_manager.update_company(company_id, name, year, audience, website)
 
-    return redirect(url_for("settings", user_id=user_id))
+    return redirect(url_for("main.settings", user_id=user_id))
+
+
+# =================================================================
+# CLI
+# =================================================================
+
+@bp.cli.command("build-assets")
+def build_assets_command():
+    """Bundle, minify, hash and precompress the static assets."""
+    if not current_app.config['ASSETS_BUILD_DIR']:
+        raise click.ClickException("Set ASSETS_BUILD_DIR to the build directory")
+    manifest = build_assets(current_app.static_folder, current_app.config['ASSETS_BUILD_DIR'])
+    for name, filename in sorted(manifest.items()):
+        click.echo(f"{name}\t{filename}")
+    click.echo(f"Done: {len(manifest)} bundles built, restart the app to serve them")
+
+
+@bp.cli.command("import-tests")
+@click.argument("company_id", type=int)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=DEFAULT_CHUNK_SIZE, show_default=True, help="Rows per transaction")
+def import_tests_command(company_id, path, chunk_size):
+    """Import historical A/B tests for a company from a CSV or Parquet file."""
+    def report_progress(summary):
+        click.echo(f"{summary['rows']:,} rows read, {summary['imported']:,} imported, "
+                   f"{summary['rejected']:,} rejected")
+
+    with open(path, "rb") as f:
+        try:
+            summary = import_tests(db_manager, company_id, iter_chunks(f, path, chunk_size),
+                                   progress=report_progress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    for error in summary['errors']:
+        click.echo(f"  {error}")
+    click.echo(f"Done: {summary['imported']:,} tests imported")
+
+
+@bp.cli.command("export-tests")
+@click.argument("company_id", type=int)
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "export_format", type=click.Choice(EXPORT_FORMATS), default="ndjson", show_default=True)
+@click.option("--gzip", "compress", is_flag=True, help="Gzip ndjson or csv output")
+@click.option("--start", help="Only tests created on or after this ISO date")
+@click.option("--end", help="Only tests created on or before this ISO date")
+@click.option("--significant", type=click.Choice(["1", "0"]), help="Only (non-)significant tests")
+def export_tests_command(company_id, path, export_format, compress, start, end, significant):
+    """Export all A/B tests of a company with their variants and reports."""
+    try:
+        filters = parse_export_filters({"start": start, "end": end, "significant": significant})
+        chunks = iter_export(db_manager.iter_export_rows(company_id, **filters), export_format, compress)
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"Exported to {path}")
+
+
+@bp.cli.command("export-reports")
+@click.argument("company_id", type=int)
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--test", "test_ids", type=int, multiple=True, help="Test to export, repeatable [default: all tests]")
+@click.option("--format", "report_format", type=click.Choice(REPORT_FORMATS), default="pdf", show_default=True)
+@click.option("--template", type=click.Choice(list(REPORT_TEMPLATES)), default="full", show_default=True)
+@click.option("--sections", help="Comma-separated sections in layout order [default: the template's]")
+def export_reports_command(company_id, path, test_ids, report_format, template, sections):
+    """Render the reports of a company's tests into a zip archive."""
+    if not test_ids:
+        test_ids = [test.id for test in db_manager.get_ab_tests(company_id)]
+
+    try:
+        report_format, template, sections = parse_report_export(
+            {"format": report_format, "template": template, "sections": sections})
+        content, count = report_archive(company_id, test_ids, report_format, template, sections)
+    except (ValueError, ExportError) as e:
+        raise click.ClickException(str(e))
+
+    with open(path, "wb") as f:
+        f.write(content)
+    click.echo(f"Exported {count:,} reports to {path}")
+
+
+@bp.cli.command("purge-tests")
+def purge_tests_command():
+    """Remove deleted tests with their variants, reports and snapshots now."""
+    purged = test_purger.purge()
+    click.echo(f"Done: {purged:,} deleted tests purged")
+
+
+@bp.cli.group("shards")
+def shards_command():
+    """Split the database into per-company shards and rebalance them (run with the app stopped)."""
+    if not shard_router.enabled:
+        if not current_app.config['SHARD_DIR']:
+            raise click.ClickException("Set SHARD_DIR to the directory of the shard databases")
+        shard_router.configure(current_app.config['SHARD_DIR'], db.engine)
+
+
+@shards_command.command("split")
+@click.option("--count", default=4, show_default=True, help="Number of shards")
+@click.option("--drop-source", is_flag=True, help="Delete the copied tests from database.db")
+def split_shards_command(count, drop_source):
+    """Copy the tests of every company from database.db into its shard."""
+    try:
+        assignment = split_database(count, drop_source=drop_source)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Done: {len(assignment)} companies split into {count} shards")
+
+
+@shards_command.command("move")
+@click.argument("company_id", type=int)
+@click.argument("shard")
+def move_shard_command(company_id, shard):
+    """Move the tests of a company to another shard."""
+    if move_company(company_id, shard):
+        click.echo(f"Company {company_id} moved to {shard}")
+    else:
+        click.echo(f"Company {company_id} already is on {shard}")
+
+
+@shards_command.command("rebalance")
+@click.option("--count", type=int, help="Total number of shards, adds empty shards if higher than today")
+def rebalance_shards_command(count):
+    """Move companies until the shards hold similar numbers of tests."""
+    moves = rebalance(count)
+    click.echo(f"Done: {len(moves)} companies moved")
+
+
+@shards_command.command("list")
+def list_shards_command():
+    """Show the shard of every company."""
+    for company_id, shard in sorted(shard_router.shard_map().items()):
+        click.echo(f"{company_id}\t{shard}")
+
+
+@bp.cli.group("archive")
+def archive_command():
+    """Move old tests into the compressed archive and back."""
+    if not test_archive.enabled:
+        raise click.ClickException("Set ARCHIVE_PATH to the archive database")
+
+
+@archive_command.command("run")
+@click.option("--days", type=int, help="Archive tests older than this many days [default: ARCHIVE_AFTER_DAYS]")
+@click.option("--company", "company_id", type=int, help="Only archive tests of this company")
+def run_archive_command(days, company_id):
+    """Archive the variants, reports and snapshots of old tests."""
+    days = days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    company_ids = [company_id] if company_id else [company.id for company in db_manager.get_companies()]
+    total = 0
+    for company_id in company_ids:
+        archived = archive_tests(db_manager, company_id, days)
+        if archived:
+            click.echo(f"Company {company_id}: {archived:,} tests archived")
+        total += archived
+    click.echo(f"Done: {total:,} tests archived")
+
+
+@archive_command.command("restore")
+@click.argument("test_id", type=int)
+def restore_archive_command(test_id):
+    """Move an archived test back into the database."""
+    if not restore_test(db_manager, test_id):
+        raise click.ClickException(f"Test {test_id} is not archived")
+    click.echo(f"Test {test_id} restored")
+
+
+@archive_command.command("stats")
+def archive_stats_command():
+    """Show the number and compressed size of archived tests per company."""
+    for company_id, stats in sorted(test_archive.stats().items()):
+        click.echo(f"{company_id}\t{stats['tests']:,} tests\t{stats['bytes']:,} bytes")
+
+
+# =================================================================
+# HEALTH
+# =================================================================
+
+# Set in a process once init_worker() ran and cleared again by shutdown_worker()
+worker_ready = threading.Event()
+
+
+@bp.route("/healthz")
+def healthz():
+    """Liveness: the process serves requests"""
+    return jsonify({"status": "ok"})
+
+
+@bp.route("/readyz")
+def readyz():
+    """Readiness: the worker is initialised, not shutting down and reaches the database"""
+    if not worker_ready.is_set():
+        return jsonify({"status": "starting"}), 503
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(sa.text("SELECT 1"))
+    except sa.exc.SQLAlchemyError as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    return jsonify({"status": "ready"})
+
+
+@bp.route("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics of all worker processes (utils/metrics.py)"""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({"error": "Invalid metrics token"}), 401
+    if not metrics.available:
+        return jsonify({"error": "Metrics need the prometheus_client package"}), 501
+
+    body, content_type = metrics.exposition()
+    response = Response(body, content_type=content_type)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# =================================================================
+# APPLICATION FACTORY
+# =================================================================
+
+def create_app(profile=None, start_workers=True):
+    """
+    Create the app with a configuration profile of config.py.
+
+    Engines are created lazily and background threads only start in
+    init_worker(), so a pre-forking server can create the app once in its
+    master process (start_workers=False) and call init_worker() in every
+    worker after the fork, see gunicorn.conf.py.
+
+    Args:
+        profile: Name of the profile, defaults to the APP_ENV environment variable or development
+        start_workers: Whether to call init_worker() right away, for single-process servers and the CLI
+    """
+    profile = profile or os.environ.get('APP_ENV', 'development')
+    if profile not in CONFIG_PROFILES:
+        raise RuntimeError(f"Unknown APP_ENV {profile!r}, expected one of {', '.join(CONFIG_PROFILES)}")
+    config = CONFIG_PROFILES[profile]
+    config.validate()
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    # jsonify and the tojson filter encode with orjson when it is installed (data/serialization.py)
+    app.json = FastJSONProvider(app)
+    db.init_app(app)
+    app.register_blueprint(bp)
+
+    shared_cache.configure(ttl=app.config['DB_CACHE_TTL'])
+    analysis_cache.configure(ttl=app.config['ANALYSIS_CACHE_TTL'], maxsize=app.config['ANALYSIS_CACHE_SIZE'])
+    report_renderer.configure(app.config['REPORT_RENDER_WORKERS'], app.config['REPORT_CACHE_TTL'],
+                              app.config['REPORT_CACHE_SIZE'])
+    assets.configure(app.static_folder, app.config['ASSETS_BUILD_DIR'], app.config['ASSETS_MAX_AGE'])
+    response_cache.configure(app.config['RESPONSE_CACHE_TTL'], app.config['RESPONSE_CACHE_SIZE'],
+                             app.config['RESPONSE_CACHE_VERSION_TTL'], db_manager.get_company_version)
+    event_aggregator.configure(partial(flush_events, app), app.config['INGEST_MAX_PENDING_EVENTS'],
+                               app.config['INGEST_FLUSH_INTERVAL'])
+    request_profiler.configure(app.config['PROFILE_SAMPLE_RATE'], app.config['PROFILE_REPEAT_THRESHOLD'],
+                               app.config['PROFILE_SLOW_MS'])
+    live_hub.configure(app.config['LIVE_MAX_STREAMS'], app.config['LIVE_POLL_INTERVAL'],
+                       app.config['LIVE_STREAM_TIMEOUT'])
+    metrics.configure(
+        app.config['METRICS_ENABLED'],
+        caches={'db': shared_cache, 'analysis': analysis_cache, 'response': response_cache.responses,
+                'live_state': live_hub.states,
+                'company_version': response_cache.versions, 'report': report_renderer.cache},
+        queues={'ingest_events': lambda: event_aggregator.pending_events,
+                'analytics_tests': lambda: analytics_snapshots.pending,
+                'report_renders': lambda: report_renderer.pending,
+                'live_streams': lambda: live_hub.subscribers})
+
+    if app.config['SHARD_DIR']:
+        with app.app_context():
+            shard_router.configure(app.config['SHARD_DIR'], db.engine)
+
+    if app.config['REPLICA_DATABASE_URI']:
+        replica_router.configure_uri(app.config['REPLICA_DATABASE_URI'], app.config['REPLICA_MAX_LAG'])
+    elif app.config['REPLICA_SQLITE_COPY']:
+        replica_router.configure_copy(app.config['DATABASE_PATH'], app.config['REPLICA_SQLITE_COPY'],
+                                      app.config['REPLICA_REFRESH_INTERVAL'], app.config['REPLICA_MAX_LAG'])
+
+    if app.config['ARCHIVE_PATH']:
+        test_archive.configure(app.config['ARCHIVE_PATH'])
+
+    test_purger.configure(app.config['PURGE_INTERVAL'], app.app_context)
+
+    if app.config['ANALYTICS_DIR']:
+        analytics_snapshots.configure(app.config['ANALYTICS_DIR'], db_manager, app.app_context)
+
+    if start_workers:
+        init_worker(app)
+    return app
+
+
+def init_worker(app):
+    """
+    Prepare a process to serve requests, in every worker right after it was forked.
+
+    Pooled database connections, LLM clients and the render pool inherited from
+    the parent belong to it and must not be used by the worker, so they are
+    dropped without closing them and reopened on first use. Then the background
+    threads of the process are started.
+    """
+    with app.app_context():
+        engines = list(db.engines.values()) + shard_router.engines()
+    engines += [engine for engine in (replica_router.engine, test_archive.engine) if engine is not None]
+    for engine in engines:
+        engine.dispose(close=False)
+
+    reset_llm_clients()
+    report_renderer.reset()
+    test_purger.start()
+    replica_router.start()
+    worker_ready.set()
+
+
+def shutdown_worker():
+    """Stop the background work of a worker process, writing pending events and snapshot changes"""
+    worker_ready.clear()
+    live_hub.close()
+    event_aggregator.stop()
+    test_purger.stop()
+    replica_router.stop()
+    analytics_snapshots.stop()
+    report_renderer.shutdown()
 
 
 if __name__ == "__main__":
+    app = create_app()
     with app.app_context():
         db.create_all()
 
-    # app.run()
+    app.run()
@@ -0,0 +1,121 @@
+"""
+Configuration profiles of the app.
+
+create_app() in app.py loads the profile named by its argument or the APP_ENV
+environment variable (development by default). The settings of Config are read
+from the environment variables of the same name.
+
+- development: the defaults, for "python app.py" and "flask run"
+- production: for gunicorn (see gunicorn.conf.py), refuses to start without a
+  SECRET_KEY and checks pooled connections before use
+- testing: TESTING on, background workers, render pool and caches off
+"""
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+DEFAULT_SECRET_KEY = 'dev-secret-key-change-in-production'
+
+
+class Config:
+    """Settings shared by all profiles"""
+
+    DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(basedir, 'data/database.db'))
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE_PATH}"
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SECRET_KEY = os.environ.get('SECRET_KEY', DEFAULT_SECRET_KEY)
+    # Seconds users and companies stay in the cross-request cache (0 disables it)
+    DB_CACHE_TTL = int(os.environ.get('DB_CACHE_TTL', 0))
+    # Ingested events are flushed to the database after this many events or seconds
+    INGEST_MAX_PENDING_EVENTS = int(os.environ.get('INGEST_MAX_PENDING_EVENTS', 10000))
+    INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 5))
+    # Directory of the per-company shard databases (empty keeps all companies in database.db)
+    SHARD_DIR = os.environ.get('SHARD_DIR', '')
+    # Read replica for GET requests: an external database URI or a path for a periodically refreshed SQLite copy
+    REPLICA_DATABASE_URI = os.environ.get('REPLICA_DATABASE_URI', '')
+    REPLICA_SQLITE_COPY = os.environ.get('REPLICA_SQLITE_COPY', '')
+    REPLICA_REFRESH_INTERVAL = float(os.environ.get('REPLICA_REFRESH_INTERVAL', 5))
+    # Requests read from the primary while the replica lags by more than this many seconds
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 30))
+    # Directory of the per-company analytics snapshots (empty disables them)
+    ANALYTICS_DIR = os.environ.get('ANALYTICS_DIR', os.path.join(basedir, 'data/analytics'))
+    # Database of archived tests (empty disables archiving) and the age in days after which tests are archived
+    ARCHIVE_PATH = os.environ.get('ARCHIVE_PATH', os.path.join(basedir, 'data/archive.db'))
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    # Seconds and number of tests the precomputed analysis payloads stay cached (0 disables the cache)
+    ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 3600))
+    ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', 1024))
+    # Seconds and number of rendered responses kept by the response cache (0 disables it), and seconds
+    # a company's data version is reused before it is read again, i.e. how long other workers' writes may go unseen
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+    RESPONSE_CACHE_VERSION_TTL = float(os.environ.get('RESPONSE_CACHE_VERSION_TTL', 1))
+    # Processes rendering PDF/PowerPoint report exports (0 renders in the request thread),
+    # and seconds and number of rendered files kept (0 disables the cache)
+    REPORT_RENDER_WORKERS = int(os.environ.get('REPORT_RENDER_WORKERS', 2))
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 3600))
+    REPORT_CACHE_SIZE = int(os.environ.get('REPORT_CACHE_SIZE', 128))
+    # Live dashboard streams one process keeps open (0 disables them, each takes a server thread),
+    # seconds between checks for writes of other processes and seconds after which browsers reconnect
+    LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', 8))
+    LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', 2))
+    LIVE_STREAM_TIMEOUT = float(os.environ.get('LIVE_STREAM_TIMEOUT', 300))
+    # Share of requests profiled (0 to 1, see utils/instrumentation.py), executions of one statement shape
+    # in a request reported as N+1 and milliseconds after which a request is logged as slow
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 1))
+    PROFILE_REPEAT_THRESHOLD = int(os.environ.get('PROFILE_REPEAT_THRESHOLD', 10))
+    PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 1000))
+    # Prometheus metrics on /metrics (see utils/metrics.py, needs prometheus_client) and the bearer
+    # token scrapes must send (empty allows anyone reaching the server)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    # Seconds between background purges of deleted tests (0 disables them, "flask purge-tests" still works)
+    PURGE_INTERVAL = float(os.environ.get('PURGE_INTERVAL', 60))
+    # Directory "flask build-assets" writes the hashed bundles to (empty always serves the sources),
+    # and seconds browsers cache the built files
+    ASSETS_BUILD_DIR = os.environ.get('ASSETS_BUILD_DIR', os.path.join(basedir, 'static/dist'))
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))
+
+    @classmethod
+    def validate(cls):
+        """Raise RuntimeError if the settings can't be used with this profile"""
+
+
+class DevelopmentConfig(Config):
+    """Local development with the Flask development server"""
+
+
+class ProductionConfig(Config):
+    """Pre-forking production server"""
+
+    # Pooled connections may have been closed by the database while the worker was idle
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True}
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.05))
+
+    @classmethod
+    def validate(cls):
+        if cls.SECRET_KEY == DEFAULT_SECRET_KEY:
+            raise RuntimeError("Set SECRET_KEY to a random value in production")
+
+
+class TestingConfig(Config):
+    """Tests, without background threads, worker processes or caches between requests"""
+
+    TESTING = True
+    PURGE_INTERVAL = 0
+    REPORT_RENDER_WORKERS = 0
+    ANALYTICS_DIR = ''
+    RESPONSE_CACHE_TTL = 0
+    ANALYSIS_CACHE_TTL = 0
+    REPORT_CACHE_TTL = 0
+    PROFILE_SAMPLE_RATE = 0
+    METRICS_ENABLED = False
+
+
+CONFIG_PROFILES = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
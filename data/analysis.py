@@ -0,0 +1,127 @@
+"""
+Precomputed analysis payloads of tests.
+
+The analysis page shows the conversion rate statistics of a test's first two
+variants and charts their normal approximations: density curves with 95%
+confidence intervals and a Q-Q plot. The payload holds the statistics together
+with the chart points, built in one vectorised pass (normal_approximation in
+utils/utils.py), so browsers only draw them.
+
+Payloads are cached per test version: the analysis_fingerprint of the variants
+(IDs, names and counts) plus PAYLOAD_VERSION. The fingerprint is also the ETag
+of the JSON endpoint. A cached payload is only served while its fingerprint
+matches the current variants, and DBManager drops it when the variants of its
+test change, so it's never stale.
+"""
+from data.cache import MISSING, TTLCache
+from data.fingerprints import analysis_fingerprint
+from utils.utils import normal_approximation
+
+# Format of the payload, part of its fingerprint. Bump it when the payload changes.
+PAYLOAD_VERSION = 1
+
+# Points of the density curves and quantiles of the Q-Q plot
+CURVE_POINTS = 200
+QQ_POINTS = 50
+
+# Significant digits of the chart points, plenty for a chart and half the JSON size of full floats
+CHART_DIGITS = 6
+
+# Standard normal quantiles the Q-Q reference line is drawn between
+QQ_REFERENCE_RANGE = (-3, 3)
+
+
+def _compact(values):
+    return [float(f'{value:.{CHART_DIGITS}g}') for value in values]
+
+
+def _ci_range(x, lower, upper):
+    """First and last index of the curve points inside a confidence interval, or None"""
+    inside = ((x >= lower) & (x <= upper)).nonzero()[0]
+    return [int(inside[0]), int(inside[-1])] if len(inside) else None
+
+
+def build_analysis_payload(variants):
+    """
+    Compute the analysis payload of a test.
+
+    Args:
+        variants: Variants of the test, at least two. The statistics and charts
+            compare the first two.
+
+    Returns:
+        Dict with variants (counts and rate of every variant), stats (totals and
+        the normal approximation of both variants), curve (x in percent and a
+        density per variant, with the index range of each confidence interval)
+        and qq (theoretical quantiles, sample quantiles in percent per variant
+        and the reference line)
+    """
+    variant_a, variant_b = variants[0], variants[1]
+    approximation = normal_approximation([variant_a.impressions, variant_b.impressions],
+                                         [variant_a.conversions, variant_b.conversions],
+                                         curve_points=CURVE_POINTS, qq_points=QQ_POINTS)
+    x = approximation['x']
+
+    distribution_data = {}
+    for i, key in enumerate(('variant_a', 'variant_b')):
+        distribution_data[key] = {
+            'mean': float(approximation['conversion_rate'][i]),
+            'std_error': float(approximation['std_error'][i]),
+            'ci_lower': float(approximation['ci_lower'][i]),
+            'ci_upper': float(approximation['ci_upper'][i])
+        }
+
+    # Reference line of the Q-Q plot, spanning both variants
+    std_error = approximation['std_error'].max()
+    low, high = QQ_REFERENCE_RANGE
+    reference = [[low, (low * std_error + approximation['conversion_rate'].min()) * 100],
+                 [high, (high * std_error + approximation['conversion_rate'].max()) * 100]]
+
+    return {
+        'version': PAYLOAD_VERSION,
+        'variants': [{
+            'id': variant.id,
+            'name': variant.name,
+            'impressions': variant.impressions,
+            'conversions': variant.conversions,
+            'conversion_rate': variant.conversions / variant.impressions if variant.impressions else 0.0
+        } for variant in variants],
+        'stats': {
+            'total_sessions': variant_a.impressions + variant_b.impressions,
+            'total_conversions': variant_a.conversions + variant_b.conversions,
+            'variant_a_sample_size': variant_a.impressions,
+            'variant_b_sample_size': variant_b.impressions,
+            'distribution_data': distribution_data
+        },
+        'curve': {
+            'x': _compact(x * 100),
+            'density': [_compact(density) for density in approximation['density']],
+            'ci': [_ci_range(x, approximation['ci_lower'][i], approximation['ci_upper'][i]) for i in range(2)]
+        },
+        'qq': {
+            'theoretical': _compact(approximation['theoretical']),
+            'quantiles': [_compact(quantiles * 100) for quantiles in approximation['quantiles']],
+            'reference': reference
+        }
+    }
+
+
+def analysis_payload(test_id, variants):
+    """
+    Get the analysis payload of a test from the cache, building it on a miss.
+
+    Returns:
+        Tuple (fingerprint, payload)
+    """
+    fingerprint = analysis_fingerprint(variants, PAYLOAD_VERSION)
+    cached = analysis_cache.get(int(test_id))
+    if cached is not MISSING and cached[0] == fingerprint:
+        return cached
+
+    entry = (fingerprint, build_analysis_payload(variants))
+    analysis_cache.set(int(test_id), entry)
+    return entry
+
+
+# Payloads of this process by test ID, configured by the app
+analysis_cache = TTLCache()
@@ -0,0 +1,382 @@
+"""
+Columnar analytics snapshots of a company's tests.
+
+Each company gets one Arrow IPC file with a row per test (variant A/B counts and
+rates, totals over all variants and report metrics). Portfolio analytics read
+it memory-mapped, so aggregates over every test of a company are computed on
+Arrow columns without querying SQLite or building ORM objects.
+
+DBManager reports every changed test through mark_changed(). A background
+thread then patches the affected snapshots: rows of changed tests are dropped
+and only those tests are queried again, so a snapshot is never rebuilt from
+scratch after it exists. Snapshots lag behind writes by up to rebuild_delay
+seconds.
+
+Requires pyarrow. Without it the snapshots stay disabled and callers fall back
+to querying the database.
+"""
+import atexit
+import os
+import re
+import threading
+import time
+
+from utils.utils import two_proportion_z_test_batch
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+SNAPSHOT_FILE = 'company_{}.arrow'
+SNAPSHOT_PATTERN = re.compile(r'^company_(\d+)\.arrow$')
+
+# Tests converted to a record batch at a time while building a snapshot
+BUILD_BATCH_ROWS = 10000
+
+
+def snapshot_schema():
+    return pa.schema([
+        ('test_id', pa.int64()),
+        ('created_at', pa.string()),
+        ('variant_count', pa.int32()),
+        ('impressions_a', pa.int64()),
+        ('conversions_a', pa.int64()),
+        ('conversion_rate_a', pa.float64()),
+        ('impressions_b', pa.int64()),
+        ('conversions_b', pa.int64()),
+        ('conversion_rate_b', pa.float64()),
+        ('impressions', pa.int64()),
+        ('conversions', pa.int64()),
+        ('has_report', pa.bool_()),
+        ('p_value', pa.float64()),
+        ('significance', pa.bool_()),
+        ('increase_percent', pa.float64()),
+    ])
+
+
+def snapshot_row(row):
+    """Turn a test from DBManager.iter_export_rows into a snapshot row"""
+    variants = row['variants']
+    variant_a = variants[0] if len(variants) > 0 else {}
+    variant_b = variants[1] if len(variants) > 1 else {}
+    return {
+        'test_id': row['id'],
+        'created_at': row['created_at'],
+        'variant_count': len(variants),
+        'impressions_a': variant_a.get('impressions'),
+        'conversions_a': variant_a.get('conversions'),
+        'conversion_rate_a': variant_a.get('conversion_rate'),
+        'impressions_b': variant_b.get('impressions'),
+        'conversions_b': variant_b.get('conversions'),
+        'conversion_rate_b': variant_b.get('conversion_rate'),
+        'impressions': sum(variant['impressions'] for variant in variants),
+        'conversions': sum(variant['conversions'] for variant in variants),
+        'has_report': row['p_value'] is not None,
+        'p_value': row['p_value'],
+        'significance': bool(row['significance']),
+        'increase_percent': row['increase_percent']
+    }
+
+
+class AnalyticsSnapshots:
+    """
+    Builds, patches and reads the per-company snapshot files.
+
+    Args:
+        rebuild_delay: Seconds changes are collected before the snapshots are patched
+    """
+
+    def __init__(self, rebuild_delay=2.0):
+        self.rebuild_delay = rebuild_delay
+        self.directory = None
+        self.source = None
+        self.context = None
+        self._changed = set()
+        self._tables = {}
+        self._lock = threading.Lock()
+        # Serialises builds and patches within the process
+        self._build_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    @property
+    def pending(self):
+        """Number of changed tests waiting to be patched into the snapshots"""
+        return len(self._changed)
+
+    def configure(self, directory, source, context):
+        """
+        Enable the snapshots.
+
+        Args:
+            directory: Directory the snapshot files are written to
+            source: DBManager providing iter_export_rows, get_test_companies and
+                bump_company_versions
+            context: Callable returning the context manager database reads run in,
+                e.g. app.app_context
+
+        Returns:
+            True if enabled, False if pyarrow is not installed
+        """
+        if pa is None:
+            return False
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.source = source
+        self.context = context
+        return True
+
+    def path(self, company_id):
+        return os.path.join(self.directory, SNAPSHOT_FILE.format(int(company_id)))
+
+    def mark_changed(self, test_ids):
+        """Record tests whose rows changed; the snapshots are patched in the background"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._changed.update(int(test_id) for test_id in test_ids)
+        self._ensure_started()
+        self._wake.set()
+
+    def read(self, company_id):
+        """
+        Get the snapshot table of a company, building it on first use.
+
+        The file is memory-mapped and uncompressed, so the columns are views on
+        the mapped pages rather than copies. The table is reused until the file
+        is replaced.
+        """
+        path = self.path(company_id)
+        if not os.path.exists(path):
+            self.build(company_id)
+
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_mtime_ns)
+        cached = self._tables.get(company_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        self._tables[company_id] = (version, table)
+        return table
+
+    def build(self, company_id):
+        """Write the snapshot of a company from scratch"""
+        with self._build_lock, self._file_lock(company_id):
+            schema = snapshot_schema()
+            with self.context():
+                rows = self.source.iter_export_rows(company_id)
+                self._write(company_id, schema, self._batches(rows, schema))
+
+    def apply_changes(self):
+        """
+        Patch the snapshots of all companies with changed tests.
+
+        Returns:
+            Number of changed tests applied
+        """
+        with self._build_lock:
+            with self._lock:
+                changed, self._changed = self._changed, set()
+            if not changed:
+                return 0
+
+            try:
+                self._apply(changed)
+            except Exception:
+                # Keep the changes so the next run retries them
+                with self._lock:
+                    self._changed.update(changed)
+                raise
+            return len(changed)
+
+    def stop(self):
+        """Stop the background thread and apply what is left"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.rebuild_delay + 5)
+            self._thread = None
+        if self.enabled:
+            self.apply_changes()
+
+    def _apply(self, changed):
+        with self.context():
+            companies = self.source.get_test_companies(changed)
+
+            by_company = {}
+            for test_id, company_id in companies.items():
+                by_company.setdefault(company_id, []).append(test_id)
+
+            # Deleted tests can only be found in the snapshots that still hold them
+            if changed - set(companies):
+                for name in os.listdir(self.directory):
+                    match = SNAPSHOT_PATTERN.match(name)
+                    if match:
+                        by_company.setdefault(int(match.group(1)), [])
+
+            patched = []
+            for company_id, test_ids in by_company.items():
+                # Companies without a snapshot get a full build on their first read
+                if os.path.exists(self.path(company_id)):
+                    self._patch(company_id, changed, test_ids)
+                    patched.append(company_id)
+
+            # Responses computed from the old snapshots are retired
+            self.source.bump_company_versions(patched)
+
+    def _patch(self, company_id, changed, test_ids):
+        with self._file_lock(company_id):
+            schema = snapshot_schema()
+            with pa.memory_map(self.path(company_id)) as source:
+                table = pa.ipc.open_file(source).read_all()
+
+            stale = pc.is_in(table['test_id'], value_set=pa.array(sorted(changed), pa.int64()))
+            if not test_ids and not pc.any(stale).as_py():
+                return
+
+            kept = table.filter(pc.invert(stale))
+            rows = self.source.iter_export_rows(company_id, test_ids=test_ids) if test_ids else []
+            self._write(company_id, schema, [*kept.to_batches(), *self._batches(rows, schema)])
+
+    def _batches(self, rows, schema):
+        batch = []
+        for row in rows:
+            batch.append(snapshot_row(row))
+            if len(batch) >= BUILD_BATCH_ROWS:
+                yield pa.RecordBatch.from_pylist(batch, schema=schema)
+                batch = []
+        if batch:
+            yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+    def _write(self, company_id, schema, batches):
+        """Write the batches to a temporary file and swap it in atomically"""
+        path = self.path(company_id)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    for batch in batches:
+                        writer.write_batch(batch)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _file_lock(self, company_id):
+        """Lock a company's snapshot against builds and patches in other processes"""
+        return _FileLock(self.path(company_id) + '.lock')
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stop.is_set():
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='analytics-snapshots', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            # Collect changes for a while so bursts of writes cause one patch
+            if self._stop.wait(self.rebuild_delay):
+                return
+            self._wake.clear()
+            try:
+                self.apply_changes()
+            except Exception as e:
+                print(f"Error updating analytics snapshots: {str(e)}")
+                time.sleep(1)
+                self._wake.set()
+
+
+class _FileLock:
+    """Exclusive flock on a lock file, a no-op where fcntl is unavailable"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.file = open(self.path, 'a')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+def portfolio_summary(table):
+    """
+    Aggregate a company snapshot into portfolio metrics.
+
+    Winning and losing tests follow the same rule as the test ratio chart: a
+    significant test wins if variant B converts better than variant A. Tests
+    without a report or with fewer than two variants count as other.
+
+    Returns:
+        Dict of counts, totals and the ratio of winning, losing and other tests.
+        "significant_now" re-tests every test on its current variant counts.
+    """
+    comparable = pc.and_(table['has_report'], pc.greater_equal(table['variant_count'], 2))
+    significant = pc.and_(comparable, table['significance'])
+    b_better = pc.fill_null(pc.greater(table['conversion_rate_b'], table['conversion_rate_a']), False)
+
+    total = table.num_rows
+    winning = pc.sum(pc.and_(significant, b_better)).as_py() or 0
+    losing = pc.sum(pc.and_(significant, pc.invert(b_better))).as_py() or 0
+    other = total - winning - losing
+
+    def percent(count):
+        return round(count / total * 100, 1) if total else 0
+
+    # Significance from the current counts, which may have moved on since the reports were written
+    counted = pc.and_(comparable, pc.and_(pc.greater(table['impressions_a'], 0), pc.greater(table['impressions_b'], 0)))
+    counts = table.filter(counted)
+    significant_now = 0
+    if counts.num_rows:
+        results = two_proportion_z_test_batch(
+            counts['impressions_a'].to_numpy(), counts['conversions_a'].to_numpy(),
+            counts['impressions_b'].to_numpy(), counts['conversions_b'].to_numpy())
+        significant_now = int(results['significant'].sum())
+
+    return {
+        "tests": total,
+        "impressions": pc.sum(table['impressions']).as_py() or 0,
+        "conversions": pc.sum(table['conversions']).as_py() or 0,
+        "significant": winning + losing,
+        "significant_now": significant_now,
+        "average_increase_percent": pc.mean(pc.filter(table['increase_percent'], significant)).as_py(),
+        "winning": winning,
+        "losing": losing,
+        "other": other,
+        "winning_percent": percent(winning),
+        "losing_percent": percent(losing),
+        "other_percent": percent(other)
+    }
+
+
+# Snapshots of this process, configured by the app
+analytics_snapshots = AnalyticsSnapshots()
@@ -0,0 +1,180 @@
+"""
+Cold archive of old tests.
+
+Archiving moves the variants, reports and variant snapshots of a test into a
+separate SQLite database, as one zlib-compressed JSON document per test, and
+keeps the ab_tests row as a stub with archived_at set. Hot tables stay small and
+the long ai_recommendation texts leave the main database.
+
+DBManager reads archived tests through the archive: get_variants, get_report
+and get_variant_snapshots return rows of the archived document when the test is
+a stub, so analysis pages of archived tests keep working. restore_test moves a
+test back into the hot tables.
+"""
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+# Bump when the layout of the archived document changes
+ARCHIVE_FORMAT_VERSION = 1
+
+# Decompressed documents kept in memory
+DOCUMENT_CACHE_SIZE = 128
+
+# Tests moved per transaction
+ARCHIVE_BATCH_SIZE = 100
+
+# Documents read per query by get_many, keeps the IN list under SQLite's parameter limit
+READ_BATCH_SIZE = 500
+
+
+class TestArchive:
+    """Compressed per-test documents in the archive database"""
+
+    def __init__(self):
+        self.engine = None
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.engine is not None
+
+    def configure(self, path):
+        self.engine = sa.create_engine(f'sqlite:///{path}')
+        with self.engine.begin() as conn:
+            conn.execute(sa.text("""
+                CREATE TABLE IF NOT EXISTS archived_tests (
+                    test_id INTEGER PRIMARY KEY,
+                    company_id INTEGER NOT NULL,
+                    archived_at TEXT NOT NULL,
+                    format_version INTEGER NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """))
+
+    def put(self, documents):
+        """
+        Store documents, replacing earlier ones of the same tests.
+
+        Args:
+            documents: List of dicts with test_id, company_id and the rows of the test
+        """
+        archived_at = datetime.now().isoformat(sep=' ')
+        with self.engine.begin() as conn:
+            conn.execute(sa.text("""
+                INSERT OR REPLACE INTO archived_tests (test_id, company_id, archived_at, format_version, payload)
+                VALUES (:test_id, :company_id, :archived_at, :format_version, :payload)
+            """), [{
+                'test_id': document['test_id'],
+                'company_id': document['company_id'],
+                'archived_at': archived_at,
+                'format_version': ARCHIVE_FORMAT_VERSION,
+                'payload': zlib.compress(json.dumps(document).encode('utf-8'), 9)
+            } for document in documents])
+
+        with self._lock:
+            for document in documents:
+                self._documents.pop(document['test_id'], None)
+
+    def get(self, test_id):
+        """Get the archived document of a test, or None"""
+        return self.get_many([test_id]).get(int(test_id))
+
+    def get_many(self, test_ids):
+        """
+        Get the archived documents of several tests, reading the ones not in memory in batches.
+
+        Returns:
+            Dict mapping test_id to document, tests without a document are left out
+        """
+        documents = {}
+        missing = []
+        with self._lock:
+            for test_id in {int(test_id) for test_id in test_ids}:
+                document = self._documents.get(test_id)
+                if document is None:
+                    missing.append(test_id)
+                else:
+                    self._documents.move_to_end(test_id)
+                    documents[test_id] = document
+
+        query = (sa.text("SELECT test_id, payload FROM archived_tests WHERE test_id IN :test_ids")
+                 .bindparams(sa.bindparam('test_ids', expanding=True)))
+        loaded = {}
+        with self.engine.connect() as conn:
+            for start in range(0, len(missing), READ_BATCH_SIZE):
+                for test_id, payload in conn.execute(query, {'test_ids': missing[start:start + READ_BATCH_SIZE]}):
+                    loaded[test_id] = json.loads(zlib.decompress(payload))
+
+        with self._lock:
+            self._documents.update(loaded)
+            while len(self._documents) > DOCUMENT_CACHE_SIZE:
+                self._documents.popitem(last=False)
+        documents.update(loaded)
+        return documents
+
+    def delete(self, *test_ids):
+        test_ids = [int(test_id) for test_id in test_ids]
+        with self.engine.begin() as conn:
+            conn.execute(sa.text("DELETE FROM archived_tests WHERE test_id = :test_id"),
+                         [{'test_id': test_id} for test_id in test_ids])
+        with self._lock:
+            for test_id in test_ids:
+                self._documents.pop(test_id, None)
+
+    def stats(self):
+        """Number of archived tests and compressed bytes per company"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(sa.text("""
+                SELECT company_id, COUNT(*), SUM(LENGTH(payload)) FROM archived_tests GROUP BY company_id
+            """)).all()
+        return {company_id: {'tests': count, 'bytes': size} for company_id, count, size in rows}
+
+
+# Archive of this process, configured by the app
+test_archive = TestArchive()
+
+
+def archive_tests(db_manager, company_id, older_than_days):
+    """
+    Archive all tests of a company created more than older_than_days ago.
+
+    Each batch is written to the archive first and only then removed from the
+    hot tables, so an interruption never loses data; archiving again simply
+    replaces the documents.
+
+    Returns:
+        Number of tests archived
+    """
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    archived = 0
+    while True:
+        test_ids = db_manager.get_archive_candidates(company_id, cutoff, ARCHIVE_BATCH_SIZE)
+        if not test_ids:
+            return archived
+
+        documents = db_manager.get_test_documents(company_id, test_ids)
+        test_archive.put(documents)
+        db_manager.strip_archived_tests(company_id, test_ids)
+        archived += len(test_ids)
+
+
+def restore_test(db_manager, test_id):
+    """
+    Move an archived test back into the hot tables.
+
+    Returns:
+        True if the test was restored, False if it is not archived
+    """
+    document = test_archive.get(test_id)
+    if document is None:
+        return False
+
+    db_manager.restore_test_document(document)
+    test_archive.delete(test_id)
+    return True
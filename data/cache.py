@@ -0,0 +1,100 @@
+"""
+Caching helpers for DBManager reads.
+
+Two layers are provided:
+- A per-request identity map stored on flask.g, so repeated reads of the same
+  rows within one request hit the database only once.
+- An optional cross-request TTL/LRU cache for rarely changing rows (users and
+  companies). It is disabled until configure() is called with a positive TTL.
+  The cache lives in process memory, so with several worker processes an update
+  in one worker only becomes visible in the others once the TTL expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_app_context
+
+# Sentinel for cache misses, so None can be cached as a value
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed time"""
+
+    def __init__(self, maxsize=1024, ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.maxsize > 0
+
+    def configure(self, ttl, maxsize=None):
+        """Set the TTL in seconds (0 disables the cache) and optionally the size"""
+        with self._lock:
+            self.ttl = ttl
+            if maxsize is not None:
+                self.maxsize = maxsize
+            self._data.clear()
+
+    def get(self, key):
+        if not self.enabled:
+            return MISSING
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Cross-request cache shared by all DBManager instances of this process
+shared_cache = TTLCache()
+
+
+def request_cache():
+    """
+    Get the identity map of the current request.
+
+    Returns:
+        dict stored on flask.g, or None outside of an app context
+    """
+    if not has_app_context():
+        return None
+
+    if 'db_cache' not in g:
+        g.db_cache = {}
+    return g.db_cache
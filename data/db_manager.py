@@ -1,9 +1,338 @@
-from data.models import db, ab_tests, variants, reports, users, companies
+import base64
+import inspect
+import json
+from datetime import datetime, timezone
+from functools import wraps
+
+from sqlalchemy import or_, and_, case, cast, func, insert, update, Float, String, type_coerce
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.types import NullType
+from sqlalchemy.orm import selectinload, make_transient_to_detached
+
+from data.analysis import analysis_cache
+from data.analytics import analytics_snapshots
+from data.archive import test_archive
+from data.cache import MISSING, request_cache, shared_cache
+from data.live import live_hub
+from data.models import db, ab_tests, variants, reports, users, companies, variant_snapshots, company_versions
+from data.recommendations import RecommendationType, decode_recommendation
+from data.response_cache import response_cache
+from data.search import HIGHLIGHT_CLOSE, HIGHLIGHT_OPEN, SEARCH_QUERY, best_snippet, build_match_query, search_row
+from data.sharding import shard_router
+
+# Tests that are not soft-deleted, every company-scoped read filters on it
+LIVE_TESTS = ab_tests.deleted_at.is_(None)
+
+# Adds the day's deltas to the variant's snapshot of that day and copies the
+# current totals of the variant as the cumulative values
+RECORD_SNAPSHOT_SQL = db.text("""
+    INSERT INTO variant_snapshots (test_id, variant_id, day, impressions, conversions, conversion_rate,
+                                   cumulative_impressions, cumulative_conversions)
+    SELECT test_id, id, :day, :impressions, :conversions,
+           CASE WHEN :impressions > 0 THEN ROUND(CAST(:conversions AS REAL) * 100 / :impressions, 2) ELSE 0.0 END,
+           impressions, conversions
+    FROM variants WHERE id = :variant_id
+    ON CONFLICT (variant_id, day) DO UPDATE SET
+        impressions = variant_snapshots.impressions + excluded.impressions,
+        conversions = variant_snapshots.conversions + excluded.conversions,
+        conversion_rate = CASE WHEN variant_snapshots.impressions + excluded.impressions > 0
+            THEN ROUND(CAST(variant_snapshots.conversions + excluded.conversions AS REAL) * 100
+                       / (variant_snapshots.impressions + excluded.impressions), 2)
+            ELSE 0.0 END,
+        cumulative_impressions = excluded.cumulative_impressions,
+        cumulative_conversions = excluded.cumulative_conversions
+""")
+
+# Summary stored on reports of imported tests, which get no AI analysis
+IMPORTED_REPORT_SUMMARY = 'Imported test. Edit the test to generate an AI summary.'
+
+# Variants per UPDATE statement in increment_variants. Each variant binds about
+# 11 parameters, which keeps a statement under SQLite's default limit of 999.
+INCREMENT_CHUNK_SIZE = 80
+
+
+def encode_cursor(created_at, test_id):
+    """
+    Encode a (created_at, id) position as an opaque URL-safe cursor.
+
+    created_at must be the text stored in the database, not a datetime, because
+    rows created with db.func.now() and rows created from Python datetimes are
+    stored with different precision.
+    """
+    raw = json.dumps([created_at, test_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor.
+
+    Returns:
+        Tuple of (created_at string, test id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        created_at, test_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(test_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def routed(method):
+    """Run a DBManager method on the shard of its company_id argument (sharded mode only)"""
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not shard_router.enabled:
+            return method(self, *args, **kwargs)
+
+        company_id = signature.bind(self, *args, **kwargs).arguments['company_id']
+        with shard_router.company(company_id):
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class DBManager:
 
+    # Cache helpers
+    def _cached(self, key, loader):
+        """Return the value for key from the request identity map, loading it on a miss"""
+        cache = request_cache()
+        if cache is None:
+            return loader()
+
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            value = loader()
+            cache[key] = value
+        return value
+
+    def _invalidate(self, *keys):
+        """
+        Drop keys from the request identity map and the cross-request cache.
+
+        Keys of tests, variants and reports hold a test ID, those tests are also
+        marked as changed for the analytics snapshots. Changed variants drop the
+        cached analysis payload of their test. The versions of the affected
+        companies are bumped, which retires their cached responses, and their
+        live dashboards are notified (see data/live.py).
+        """
+        cache = request_cache()
+        changed_tests = []
+        for key in keys:
+            if cache is not None:
+                cache.pop(key, None)
+            shared_cache.delete(key)
+            if key[0] in ('ab_tests', 'variants', 'reports'):
+                changed_tests.append(key[1])
+            if key[0] == 'variants':
+                analysis_cache.delete(int(key[1]))
+
+        if changed_tests:
+            analytics_snapshots.mark_changed(changed_tests)
+        if response_cache.enabled or live_hub.enabled:
+            company_ids = self._key_companies(keys)
+            self.bump_company_versions(company_ids)
+            live_hub.publish(company_ids)
+
+    def _key_companies(self, keys):
+        """Companies whose data the rows behind cache keys belong to"""
+        test_ids = [key[1] for key in keys if key[0] in ('ab_tests', 'variants', 'reports', 'archive')]
+        user_ids = [key[1] for key in keys if key[0] == 'users']
+        company_ids = {key[1] for key in keys if key[0] == 'companies'}
+        if test_ids:
+            company_ids.update(self.get_test_companies(test_ids).values())
+        if user_ids:
+            company_ids.update(company_id for company_id, in
+                               db.session.query(users.company_id).filter(users.id.in_(user_ids)))
+        return company_ids
+
+    # Company versions
+    def get_company_version(self, company_id):
+        """Version of a company's data, 0 until its first bump (see data/response_cache.py)"""
+        version = (db.session.query(company_versions.version)
+                   .filter(company_versions.company_id == company_id)
+                   .scalar())
+        return version or 0
+
+    def bump_company_versions(self, company_ids):
+        """
+        Increment the versions of companies, in a transaction of its own.
+
+        Must run after the write it accounts for committed, so a response cached
+        under the new version never predates the write. Does nothing while the
+        response cache and the live updates are disabled.
+        """
+        company_ids = sorted({int(company_id) for company_id in company_ids})
+        if not company_ids or not (response_cache.enabled or live_hub.enabled):
+            return
+
+        selected = company_versions.company_id.in_(company_ids)
+        for attempt in range(2):
+            try:
+                existing = {company_id for company_id, in db.session.query(company_versions.company_id).filter(selected)}
+                if existing:
+                    db.session.execute(update(company_versions)
+                                       .where(company_versions.company_id.in_(existing))
+                                       .values(version=company_versions.version + 1))
+                missing = [company_id for company_id in company_ids if company_id not in existing]
+                if missing:
+                    db.session.execute(insert(company_versions),
+                                       [{'company_id': company_id, 'version': 1} for company_id in missing])
+                db.session.commit()
+                break
+            except IntegrityError:
+                # Another process added the row first, it is updated on the retry
+                db.session.rollback()
+                if attempt:
+                    raise
+
+        for company_id, version in db.session.query(company_versions.company_id, company_versions.version).filter(selected):
+            response_cache.set_version(company_id, version)
+
+    def _record_snapshots(self, deltas, day=None):
+        """
+        Add count deltas to today's variant snapshots, inside the caller's transaction.
+
+        Must run after the variant totals were changed, because the cumulative
+        values are copied from the variants table.
+
+        Args:
+            deltas: dict mapping variant_id to (impressions delta, conversions delta)
+            day: Date of the snapshot, defaults to today (UTC)
+        """
+        if not deltas:
+            return
+
+        day = (day or datetime.now(timezone.utc).date()).isoformat()
+        db.session.flush()
+        db.session.execute(RECORD_SNAPSHOT_SQL, [
+            {'variant_id': int(variant_id), 'day': day,
+             'impressions': int(impressions), 'conversions': int(conversions)}
+            for variant_id, (impressions, conversions) in deltas.items()
+        ])
+
+    def _assign_ids(self, table_name, rows):
+        """Give rows for a Core insert IDs that are unique across shards (sharded mode only)"""
+        if shard_router.enabled:
+            for row, row_id in zip(rows, shard_router.allocate_ids(table_name, len(rows))):
+                row['id'] = row_id
+
+    def _write_search_rows(self, rows):
+        """Insert rows built with search_row into the full-text index"""
+        if rows:
+            db.session.execute(db.text(
+                "INSERT INTO test_search (rowid, company_id, name, description, metric, summary, recommendation) "
+                "VALUES (:test_id, :company_id, :name, :description, :metric, :summary, :recommendation)"
+            ), rows)
+
+    def _index_tests(self, test_ids):
+        """
+        Rewrite the full-text index rows of tests in the current transaction.
+
+        Deleted tests are only removed from the index. Reports of archived tests
+        are read from the archive.
+        """
+        test_ids = [int(test_id) for test_id in test_ids]
+        if not test_ids:
+            return
+
+        rows = (db.session.query(ab_tests.id, ab_tests.company_id, ab_tests.name, ab_tests.description,
+                                 ab_tests.metric, ab_tests.archived_at, reports.summary, reports.ai_recommendation)
+                .outerjoin(reports, reports.test_id == ab_tests.id)
+                .filter(ab_tests.id.in_(test_ids), LIVE_TESTS)
+                .all())
+        db.session.execute(db.text("DELETE FROM test_search WHERE rowid = :test_id"),
+                           [{'test_id': test_id} for test_id in test_ids])
+
+        documents = []
+        for row in rows:
+            summary, recommendation = row.summary, row.ai_recommendation
+            if row.archived_at is not None and summary is None:
+                report = self.get_report(row.id)
+                if report is not None:
+                    summary, recommendation = report.summary, report.ai_recommendation
+            documents.append(search_row(row.id, row.company_id, row.name, row.description, row.metric,
+                                        summary, recommendation))
+        self._write_search_rows(documents)
+
+    def _hot_rows(self, model, test_id, order_by):
+        """
+        Rows of a test in a hot table, and whether the test is an archive stub, in one query.
+
+        Returns:
+            Tuple (list of rows, True if the test is archived)
+        """
+        result = (db.session.query(ab_tests.archived_at, model)
+                  .outerjoin(model, model.test_id == ab_tests.id)
+                  .filter(ab_tests.id == test_id)
+                  .order_by(order_by)
+                  .all())
+        rows = [row for _, row in result if row is not None]
+        return rows, bool(result) and result[0][0] is not None
+
+    def _archived_rows(self, model, test_id):
+        """
+        Read-through for archive stubs: the test's rows of a table, from the archive.
+
+        Returns:
+            List of transient model instances, or None if the test has no archived document
+        """
+        if not test_archive.enabled:
+            return None
+        document = self._cached(('archive', int(test_id)), lambda: test_archive.get(test_id))
+        return self._document_rows(model, document)
+
+    def _document_rows(self, model, document):
+        """Rows of a table in an archived document as transient model instances, None without a document"""
+        if document is None:
+            return None
+
+        rows = []
+        for row in document[model.__tablename__]:
+            values = dict(row)
+            for column in model.__table__.columns:
+                # Values are archived as stored, turn date columns back into Python objects
+                if isinstance(values.get(column.key), str) and isinstance(column.type, (db.DateTime, db.Date)):
+                    parsed = datetime.fromisoformat(values[column.key])
+                    values[column.key] = parsed.date() if isinstance(column.type, db.Date) else parsed
+                elif values.get(column.key) is not None and isinstance(column.type, db.Boolean):
+                    values[column.key] = bool(values[column.key])
+                elif isinstance(column.type, RecommendationType):
+                    values[column.key] = decode_recommendation(values.get(column.key))
+            rows.append(model(**values))
+        return rows
+
+    def _get_by_id(self, model, object_id):
+        """
+        Load a user or company by primary key.
+
+        The row is taken from the session identity map if already loaded in this
+        request, then from the cross-request cache, and only then from the database.
+        The cross-request cache stores plain column values which are merged back into
+        the current session without a query.
+        """
+        if object_id is None:
+            return None
+
+        key = (model.__tablename__, int(object_id))
+        data = shared_cache.get(key)
+        if data is not MISSING:
+            obj = model(**data)
+            make_transient_to_detached(obj)
+            return db.session.merge(obj, load=False)
+
+        obj = db.session.get(model, int(object_id))
+        if obj is not None:
+            shared_cache.set(key, {column.key: getattr(obj, column.key) for column in model.__table__.columns})
+        return obj
+
+
     # Create features
+    @routed
     def create_ab_test(self, company_id, name, description, metric):
         test = ab_tests(
             company_id=company_id,
@@ -13,7 +342,10 @@ class DBManager:
             created_at=db.func.now()
         )
         db.session.add(test)
+        db.session.flush()
+        self._index_tests([test.id])
         db.session.commit()
+        self._invalidate(('ab_tests', test.id))
 
     def create_variant(self, test_id, name, impressions, conversions, conversion_rate):
         variant = variants(
@@ -24,9 +356,13 @@ class DBManager:
             conversion_rate=conversion_rate
         )
         db.session.add(variant)
+        db.session.flush()
+        self._record_snapshots({variant.id: (impressions, conversions)})
         db.session.commit()
+        self._invalidate(('variants', int(test_id)))
 
-    def create_report(self, test_id, summary, p_value, significance, increase_percent, ai_recommendation):
+    def create_report(self, test_id, summary, p_value, significance, increase_percent, ai_recommendation,
+                      stats_fingerprint=None, ai_fingerprint=None):
         report = reports(
             test_id=test_id,
             summary=summary,
@@ -34,10 +370,15 @@ class DBManager:
             significance=significance,
             increase_percent=increase_percent,
             ai_recommendation=ai_recommendation,
+            stats_fingerprint=stats_fingerprint,
+            ai_fingerprint=ai_fingerprint,
             created_at=db.func.now()
         )
         db.session.add(report)
+        db.session.flush()
+        self._index_tests([test_id])
         db.session.commit()
+        self._invalidate(('reports', int(test_id)))
 
     def create_user(self, name, email):
         user = users(
@@ -57,113 +398,633 @@ class DBManager:
         return company
 
 
+    @routed
+    def bulk_import_tests(self, company_id, rows, results):
+        """
+        Insert many A/B tests with their two variants and report in one transaction.
+
+        Rows are written with executemany-style inserts, so a chunk of thousands of
+        tests takes three statements' worth of round trips instead of one per row.
+
+        Args:
+            company_id: Company ID
+            rows: List of validated dicts with name, description, metric, created_at,
+                impressions_a, conversions_a, impressions_b and conversions_b
+            results: Output of two_proportion_z_test_batch for the same rows
+
+        Returns:
+            List of the new test IDs in row order
+        """
+        if not rows:
+            return []
+
+        test_rows = [{
+            'company_id': company_id,
+            'name': row['name'],
+            'description': row['description'],
+            'metric': row['metric'],
+            'created_at': row['created_at']
+        } for row in rows]
+        self._assign_ids('ab_tests', test_rows)
+        test_ids = db.session.execute(
+            insert(ab_tests).returning(ab_tests.id, sort_by_parameter_order=True),
+            test_rows
+        ).scalars().all()
+
+        variant_rows = []
+        report_rows = []
+        for i, (test_id, row) in enumerate(zip(test_ids, rows)):
+            variant_rows.append({
+                'test_id': test_id,
+                'name': 'Variant A',
+                'impressions': row['impressions_a'],
+                'conversions': row['conversions_a'],
+                'conversion_rate': round(float(results['conv_rate_a'][i]) * 100, 2)
+            })
+            variant_rows.append({
+                'test_id': test_id,
+                'name': 'Variant B',
+                'impressions': row['impressions_b'],
+                'conversions': row['conversions_b'],
+                'conversion_rate': round(float(results['conv_rate_b'][i]) * 100, 2)
+            })
+            report_rows.append({
+                'test_id': test_id,
+                'summary': IMPORTED_REPORT_SUMMARY,
+                'p_value': round(float(results['p_value'][i]), 3),
+                'significance': bool(results['significant'][i]),
+                'increase_percent': float(results['increase_percent'][i]),
+                'ai_recommendation': '',
+                'created_at': row['created_at']
+            })
+
+        self._assign_ids('variants', variant_rows)
+        self._assign_ids('reports', report_rows)
+        variant_ids = db.session.execute(
+            insert(variants).returning(variants.id, sort_by_parameter_order=True),
+            variant_rows
+        ).scalars().all()
+        db.session.execute(insert(reports), report_rows)
+
+        # The first snapshot of an imported test is dated on its creation day, like one created through the forms
+        deltas_by_day = {}
+        for i, row in enumerate(rows):
+            deltas = deltas_by_day.setdefault(row['created_at'].date(), {})
+            deltas[variant_ids[2 * i]] = (row['impressions_a'], row['conversions_a'])
+            deltas[variant_ids[2 * i + 1]] = (row['impressions_b'], row['conversions_b'])
+        for day, deltas in deltas_by_day.items():
+            self._record_snapshots(deltas, day)
+        self._write_search_rows([search_row(test_id, company_id, row['name'], row['description'], row['metric'],
+                                            IMPORTED_REPORT_SUMMARY)
+                                 for test_id, row in zip(test_ids, rows)])
+        db.session.commit()
+        analytics_snapshots.mark_changed(test_ids)
+        self.bump_company_versions([company_id])
+        live_hub.publish([company_id])
+
+        return test_ids
+
+
     # Read features
+    @routed
     def get_ab_tests(self, company_id):
-        return ab_tests.query.filter_by(company_id=company_id).order_by(ab_tests.created_at.desc()).all()
+        return (ab_tests.query.filter_by(company_id=company_id).filter(LIVE_TESTS)
+                .order_by(ab_tests.created_at.desc()).all())
 
+    @routed
     def get_recent_test(self, company_id):
-        return ab_tests.query.filter_by(company_id=company_id).order_by(ab_tests.created_at.desc()).first()
+        return (ab_tests.query.filter_by(company_id=company_id).filter(LIVE_TESTS)
+                .order_by(ab_tests.created_at.desc()).first())
 
+    @routed
     def get_test(self, test_id, company_id):
-        return ab_tests.query.filter_by(id=test_id, company_id=company_id).first()
+        test = self._cached(('ab_tests', int(test_id)),
+                            lambda: ab_tests.query.filter_by(id=test_id).filter(LIVE_TESTS).first())
+        if test is None or test.company_id != int(company_id):
+            return None
+        return test
 
+    @routed
     def get_all_variants(self, company_id):
-        return db.session.query(variants).join(ab_tests).filter(ab_tests.company_id == company_id).all()
+        rows = db.session.query(variants).join(ab_tests).filter(ab_tests.company_id == company_id, LIVE_TESTS).all()
+        if test_archive.enabled:
+            archived_ids = (db.session.query(ab_tests.id)
+                            .filter(ab_tests.company_id == company_id, ab_tests.archived_at.isnot(None), LIVE_TESTS)
+                            .all())
+            # One read of the archive for all stubs instead of one per test
+            for document in test_archive.get_many([test_id for test_id, in archived_ids]).values():
+                rows.extend(self._document_rows(variants, document))
+        return rows
 
     def get_variants(self, test_id):
-        return variants.query.filter_by(test_id=test_id).all()
+        def load():
+            rows, archived = self._hot_rows(variants, test_id, variants.id)
+            if archived:
+                rows = self._archived_rows(variants, test_id) or []
+            return rows
+
+        return self._cached(('variants', int(test_id)), load)
+
+    @routed
+    def get_variant_test_ids(self, company_id, variant_ids):
+        """Map the given variant IDs that belong to the company to their test ID"""
+        rows = (db.session.query(variants.id, variants.test_id)
+                .join(ab_tests)
+                .filter(ab_tests.company_id == company_id, LIVE_TESTS, variants.id.in_(list(variant_ids)))
+                .all())
+        return {variant_id: test_id for variant_id, test_id in rows}
+
+    def get_test_companies(self, test_ids):
+        """Map the given test IDs that still exist, deleted or not, to their company ID, looking in every shard"""
+        query = (db.session.query(ab_tests.id, ab_tests.company_id)
+                 .filter(ab_tests.id.in_(list(test_ids))))
+        if not shard_router.enabled:
+            return dict(query.all())
+
+        test_companies = {}
+        for shard in shard_router.shards():
+            with shard_router.shard(shard):
+                test_companies.update(query.all())
+        return test_companies
+
+    def get_variant_snapshots(self, test_id):
+        """Get the daily snapshots of all variants of a test, oldest first (index range scan)"""
+        rows, archived = self._hot_rows(variant_snapshots, test_id, variant_snapshots.day)
+        if archived:
+            rows = sorted(self._archived_rows(variant_snapshots, test_id) or [], key=lambda row: row.day)
+        return rows
 
     def get_all_reports(self):
-        return reports.query.all()
+        return db.session.query(reports).join(ab_tests).filter(LIVE_TESTS).all()
+
+    @routed
+    def get_tests_with_results(self, company_id):
+        """
+        Get all tests of a company with their variants and report already loaded.
+
+        Variants and reports are fetched with one extra query each (selectinload),
+        so callers can use test.variants and test.report without further queries.
+        """
+        return (ab_tests.query
+                .filter_by(company_id=company_id)
+                .filter(LIVE_TESTS)
+                .options(selectinload(ab_tests.variants), selectinload(ab_tests.report))
+                .order_by(ab_tests.created_at.desc())
+                .all())
+
+    @routed
+    def get_tests_page(self, company_id, limit, cursor=None, with_results=False, only_with_variants=False):
+        """
+        Get one page of a company's tests, newest first, using keyset pagination.
+
+        Tests are ordered by (created_at, id) descending and the page starts right
+        after the position encoded in the cursor, so every page is an index range
+        scan no matter how deep the caller pages.
+
+        Args:
+            company_id: Company ID
+            limit: Maximum number of tests to return
+            cursor: Cursor returned with the previous page, or None for the first page
+            with_results: Also load variants and report of each test
+            only_with_variants: Skip tests that have no variants yet
+
+        Returns:
+            Tuple of (list of tests, cursor for the next page or None)
+        """
+        query = ab_tests.query.filter_by(company_id=company_id).filter(LIVE_TESTS)
+
+        if cursor:
+            created_at, test_id = decode_cursor(cursor)
+            # created_at is compared as the stored text so equal timestamps still match
+            created_at = type_coerce(created_at, String)
+            query = query.filter(or_(
+                ab_tests.created_at < created_at,
+                and_(ab_tests.created_at == created_at, ab_tests.id < test_id)
+            ))
+
+        if only_with_variants:
+            # Archived tests keep their variants in the archive
+            query = query.filter(or_(ab_tests.variants.any(), ab_tests.archived_at.isnot(None)))
+
+        if with_results:
+            query = query.options(selectinload(ab_tests.variants), selectinload(ab_tests.report))
+
+        # Fetch one extra row to know whether another page exists
+        rows = (query.add_columns(type_coerce(ab_tests.created_at, String))
+                .order_by(ab_tests.created_at.desc(), ab_tests.id.desc())
+                .limit(limit + 1)
+                .all())
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_test, last_created_at = rows[-1]
+            next_cursor = encode_cursor(last_created_at, last_test.id)
+
+        return [test for test, _ in rows], next_cursor
+
+    @routed
+    def search_tests(self, company_id, text, limit=20):
+        """
+        Full-text search over a company's tests and their reports, best matches first.
+
+        Every word of text is matched as a prefix of a word in the test's name,
+        description, metric, report summary or AI recommendation.
+
+        Returns:
+            List of dicts with the test (variants and report loaded), its bm25
+            rank and a snippet of the matching text with matches between
+            HIGHLIGHT_OPEN and HIGHLIGHT_CLOSE
+        """
+        query = build_match_query(text, company_id)
+        if query is None:
+            return []
+
+        hits = db.session.execute(db.text(SEARCH_QUERY), {
+            'query': query,
+            'limit': limit,
+            'open': HIGHLIGHT_OPEN,
+            'close': HIGHLIGHT_CLOSE
+        }).all()
+        if not hits:
+            return []
+
+        tests = {test.id: test for test in (ab_tests.query
+                                            .filter(ab_tests.id.in_([hit.test_id for hit in hits]), LIVE_TESTS)
+                                            .options(selectinload(ab_tests.variants), selectinload(ab_tests.report)))}
+        return [{'test': tests[hit.test_id], 'rank': hit.rank, 'snippet': best_snippet(hit)}
+                for hit in hits if hit.test_id in tests]
+
+    def iter_export_rows(self, company_id, start=None, end=None, significant=None, test_ids=None,
+                         batch_size=1000):
+        """
+        Stream a company's tests with their variants and report, newest first.
+
+        Rows are read through one joined query with yield_per, so only one batch
+        of rows is held in memory at a time and no ORM objects are created.
+        Variants and report of archived tests are read from the archive.
+
+        Args:
+            company_id: Company ID
+            start: Optional datetime, only tests created at or after it
+            end: Optional datetime, only tests created before it
+            significant: Optional bool to only export (non-)significant tests
+            test_ids: Optional list of test IDs to limit the export to
+            batch_size: Rows fetched from the cursor at a time
+
+        Yields:
+            Dict per test with its columns, report columns and a "variants" list
+        """
+        query = (db.select(ab_tests.id, ab_tests.name, ab_tests.description, ab_tests.metric,
+                           type_coerce(ab_tests.created_at, String).label('created_at'),
+                           ab_tests.archived_at.isnot(None).label('archived'),
+                           reports.p_value, reports.significance, reports.increase_percent,
+                           variants.id.label('variant_id'), variants.name.label('variant_name'),
+                           variants.impressions, variants.conversions, variants.conversion_rate)
+                 .outerjoin(reports, reports.test_id == ab_tests.id)
+                 .outerjoin(variants, variants.test_id == ab_tests.id)
+                 .where(ab_tests.company_id == company_id, LIVE_TESTS))
+
+        if start is not None:
+            query = query.where(ab_tests.created_at >= start)
+        if end is not None:
+            query = query.where(ab_tests.created_at < end)
+        if significant is not None:
+            # Archived tests have no report row, they are filtered once read from the archive
+            query = query.where(or_(reports.significance == significant, ab_tests.archived_at.isnot(None)))
+        if test_ids is not None:
+            query = query.where(ab_tests.id.in_(list(test_ids)))
+
+        query = query.order_by(ab_tests.created_at.desc(), ab_tests.id.desc(), variants.id)
+        # The shard is picked when the statement executes, the rows are then read from that connection
+        with shard_router.company(company_id):
+            result = db.session.execute(query.execution_options(yield_per=batch_size))
+
+        def finish(test):
+            if archived and not test['variants']:
+                self._fill_archived_export_row(test)
+            return significant is None or not archived or test['significance'] == significant
+
+        # Rows of one test are adjacent, so tests are emitted as soon as the next one starts
+        current = archived = None
+        for row in result:
+            if current is None or current['id'] != row.id:
+                if current is not None and finish(current):
+                    yield current
+                archived = row.archived
+                current = {
+                    'id': row.id,
+                    'name': row.name,
+                    'description': row.description,
+                    'metric': row.metric,
+                    'created_at': row.created_at,
+                    'p_value': row.p_value,
+                    'significance': row.significance,
+                    'increase_percent': row.increase_percent,
+                    'variants': []
+                }
+            if row.variant_id is not None:
+                current['variants'].append({
+                    'id': row.variant_id,
+                    'name': row.variant_name,
+                    'impressions': row.impressions,
+                    'conversions': row.conversions,
+                    'conversion_rate': row.conversion_rate
+                })
+
+        if current is not None and finish(current):
+            yield current
+
+    def _fill_archived_export_row(self, test):
+        """Add the report columns and variants of an archived test to an export row"""
+        document = test_archive.get(test['id']) if test_archive.enabled else None
+        if document is None:
+            return
+
+        for report in document['reports'][:1]:
+            test['p_value'] = report['p_value']
+            test['significance'] = bool(report['significance'])
+            test['increase_percent'] = report['increase_percent']
+        test['variants'] = [{
+            'id': variant['id'],
+            'name': variant['name'],
+            'impressions': variant['impressions'],
+            'conversions': variant['conversions'],
+            'conversion_rate': variant['conversion_rate']
+        } for variant in document['variants']]
 
     def get_report(self, test_id):
-        return reports.query.filter_by(test_id=test_id).first()
+        def load():
+            rows, archived = self._hot_rows(reports, test_id, reports.id)
+            if archived:
+                rows = self._archived_rows(reports, test_id) or []
+            return next(iter(rows), None)
+
+        return self._cached(('reports', int(test_id)), load)
 
     def get_users(self):
         return users.query.all()
 
     def get_user(self, user_id):
-        return users.query.filter_by(id=user_id).first()
+        return self._get_by_id(users, user_id)
 
     def get_companies(self):
         return companies.query.all()
 
     def get_company(self, company_id):
-        return companies.query.filter_by(id=company_id).first()
+        return self._get_by_id(companies, company_id)
+
+
+    # Archive features
+    @routed
+    def get_archive_candidates(self, company_id, cutoff, limit):
+        """IDs of the oldest tests with results created before cutoff that are not archived yet"""
+        rows = (db.session.query(ab_tests.id)
+                .filter(ab_tests.company_id == company_id,
+                        ab_tests.created_at < cutoff,
+                        ab_tests.archived_at.is_(None),
+                        LIVE_TESTS,
+                        ab_tests.variants.any())
+                .order_by(ab_tests.created_at)
+                .limit(limit)
+                .all())
+        return [test_id for test_id, in rows]
+
+    @routed
+    def get_test_documents(self, company_id, test_ids):
+        """
+        Collect the variants, reports and snapshots of tests for the archive.
+
+        Values are read as stored, without type conversion, so they survive the
+        JSON round trip unchanged. Recommendations are stored compressed and are
+        read decoded instead.
+
+        Returns:
+            List of dicts with test_id, company_id and a list of rows per table
+        """
+        documents = {test_id: {'test_id': test_id, 'company_id': company_id,
+                               'variants': [], 'reports': [], 'variant_snapshots': []}
+                     for test_id in test_ids}
+        for model in (variants, reports, variant_snapshots):
+            columns = [column for column in model.__table__.columns
+                       if not (model is variant_snapshots and column.primary_key)]
+            rows = db.session.execute(
+                db.select(*[column if isinstance(column.type, RecommendationType)
+                            else type_coerce(column, NullType()).label(column.key) for column in columns])
+                .select_from(model)
+                .where(model.test_id.in_(test_ids))
+                .order_by(model.test_id, model.id)
+            ).mappings()
+            for row in rows:
+                documents[row['test_id']][model.__tablename__].append(dict(row))
+        return list(documents.values())
+
+    @routed
+    def strip_archived_tests(self, company_id, test_ids):
+        """Delete the archived rows of tests and mark the tests as archive stubs"""
+        for model in (variant_snapshots, variants, reports):
+            model.query.filter(model.test_id.in_(test_ids)).delete(synchronize_session=False)
+        (ab_tests.query
+         .filter(ab_tests.id.in_(test_ids))
+         .update({ab_tests.archived_at: datetime.now()}, synchronize_session=False))
+        db.session.commit()
+        self._invalidate(*[(table, test_id) for test_id in test_ids
+                           for table in ('ab_tests', 'variants', 'reports', 'archive')])
+
+    def restore_test_document(self, document):
+        """Insert the rows of an archived test back into the hot tables"""
+        test_id = document['test_id']
+        with shard_router.company(document['company_id']):
+            for model in (variants, reports, variant_snapshots):
+                rows = document[model.__tablename__]
+                if not rows:
+                    continue
+                columns = list(rows[0])
+                typed = [db.bindparam(column.key, type_=column.type) for column in model.__table__.columns
+                         if column.key in columns and isinstance(column.type, RecommendationType)]
+                db.session.execute(db.text(
+                    f"INSERT INTO {model.__tablename__} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join(':' + column for column in columns)})"
+                ).bindparams(*typed), rows)
+            (ab_tests.query
+             .filter(ab_tests.id == test_id)
+             .update({ab_tests.archived_at: None}, synchronize_session=False))
+            db.session.commit()
+        self._invalidate(*[(table, test_id) for table in ('ab_tests', 'variants', 'reports', 'archive')])
 
 
     # Update features
     def update_ab_test(self, test_id, name, description, metric):
-        test = ab_tests.query.filter_by(id=test_id).first()
+        test = db.session.get(ab_tests, int(test_id))
         test.name = name
         test.description = description
         test.metric = metric
+        self._index_tests([test_id])
         db.session.commit()
+        self._invalidate(('ab_tests', int(test_id)))
 
     def update_variant(self, variant_id, impressions, conversions, conversion_rate):
-        variant = variants.query.filter_by(id=variant_id).first()
+        variant = db.session.get(variants, int(variant_id))
+        delta = (int(impressions) - variant.impressions, int(conversions) - variant.conversions)
         variant.impressions = impressions
         variant.conversions = conversions
         variant.conversion_rate = conversion_rate
+        test_id = variant.test_id
+        if any(delta):
+            self._record_snapshots({variant.id: delta})
         db.session.commit()
+        self._invalidate(('variants', test_id))
+
+    def increment_variant(self, variant_id, impressions, conversions):
+        self.increment_variants({variant_id: (impressions, conversions)})
 
-    def update_report(self, report_id, summary, p_value, significance, increase_percent, ai_recommendation):
-        report = reports.query.filter_by(id=report_id).first()
+    def increment_variants(self, deltas):
+        """
+        Atomically add impressions and conversions to many variants.
+
+        Each chunk of variants is updated with a single UPDATE statement that adds
+        the deltas in SQL and recalculates conversion_rate from the new totals, so
+        concurrent writers never overwrite each other's counts. All chunks are
+        committed in one transaction.
+
+        Args:
+            deltas: dict mapping variant_id to (impressions delta, conversions delta)
+        """
+        items = [(int(variant_id), int(impressions), int(conversions))
+                 for variant_id, (impressions, conversions) in deltas.items()
+                 if impressions or conversions]
+        if not items:
+            return
+
+        test_ids = set()
+        for start in range(0, len(items), INCREMENT_CHUNK_SIZE):
+            chunk = items[start:start + INCREMENT_CHUNK_SIZE]
+            variant_ids = [variant_id for variant_id, _, _ in chunk]
+
+            new_impressions = variants.impressions + case(
+                {variant_id: impressions for variant_id, impressions, _ in chunk},
+                value=variants.id, else_=0)
+            new_conversions = variants.conversions + case(
+                {variant_id: conversions for variant_id, _, conversions in chunk},
+                value=variants.id, else_=0)
+
+            # Same percentage rounding as the forms use when creating variants
+            new_conversion_rate = case(
+                (new_impressions > 0, func.round(cast(new_conversions, Float) * 100 / new_impressions, 2)),
+                else_=0.0)
+
+            test_ids.update(db.session.execute(
+                update(variants)
+                .where(variants.id.in_(variant_ids))
+                .values(impressions=new_impressions,
+                        conversions=new_conversions,
+                        conversion_rate=new_conversion_rate)
+                .returning(variants.test_id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+
+        self._record_snapshots({variant_id: (impressions, conversions) for variant_id, impressions, conversions in items})
+        db.session.commit()
+        self._invalidate(*[('variants', test_id) for test_id in test_ids])
+
+    def update_report(self, report_id, summary, p_value, significance, increase_percent, ai_recommendation,
+                      stats_fingerprint=None, ai_fingerprint=None):
+        report = db.session.get(reports, int(report_id))
         report.summary = summary
         report.p_value = p_value
         report.significance = significance
         report.increase_percent = increase_percent
         report.ai_recommendation = ai_recommendation
+        report.stats_fingerprint = stats_fingerprint
+        report.ai_fingerprint = ai_fingerprint
+        test_id = report.test_id
+        self._index_tests([test_id])
         db.session.commit()
+        self._invalidate(('reports', test_id))
 
     def update_user(self, user_id, name, email, llm_model=None):
-        user = users.query.filter_by(id=user_id).first()
+        user = db.session.get(users, int(user_id))
         user.name = name
         user.email = email
         # Update LLM model if provided
 
         db.session.commit()
+        self._invalidate(('users', int(user_id)))
 
 
     def update_model(self, user_id, llm_model):
-        user = users.query.filter_by(id=user_id).first()
+        user = db.session.get(users, int(user_id))
         if llm_model is not None:
             user.llm_model = llm_model
             db.session.commit()
+            self._invalidate(('users', int(user_id)))
 
 
     def update_company(self, company_id, name, year, audience, website):
-        company = companies.query.filter_by(id=company_id).first()
+        company = db.session.get(companies, int(company_id))
         company.name = name
         company.year = year
         company.audience = audience
         company.website = website
         db.session.commit()
+        self._invalidate(('companies', int(company_id)))
 
 
     # Delete features
     def delete_ab_test(self, test_id):
-        self.delete_all_variants(test_id)
-        self.delete_report(test_id)
-        ab_tests.query.filter(ab_tests.id == test_id).delete()
+        """Soft-delete a test, the purge removes it with its variants and report later"""
+        (ab_tests.query
+         .filter(ab_tests.id == test_id, LIVE_TESTS)
+         .update({ab_tests.deleted_at: datetime.now()}, synchronize_session=False))
+        self._index_tests([test_id])
         db.session.commit()
+        self._invalidate(('ab_tests', int(test_id)))
+
+    @routed
+    def delete_ab_tests(self, company_id, test_ids):
+        """
+        Soft-delete many tests of a company with one UPDATE.
+
+        Returns:
+            Number of tests deleted
+        """
+        test_ids = [int(test_id) for test_id in test_ids]
+        deleted = (ab_tests.query
+                   .filter(ab_tests.company_id == company_id, ab_tests.id.in_(test_ids), LIVE_TESTS)
+                   .update({ab_tests.deleted_at: datetime.now()}, synchronize_session=False))
+        self._index_tests(test_ids)
+        db.session.commit()
+        self._invalidate(*[('ab_tests', test_id) for test_id in test_ids])
+        return deleted
 
     def delete_variant(self, variant_id):
+        test_id = db.session.query(variants.test_id).filter(variants.id == variant_id).scalar()
         variants.query.filter(variants.id == variant_id).delete()
         db.session.commit()
+        if test_id is not None:
+            self._invalidate(('variants', test_id))
 
     def delete_all_variants(self, test_id):
         variants.query.filter(variants.test_id == test_id).delete()
         db.session.commit()
+        self._invalidate(('variants', int(test_id)))
 
     def delete_report(self, test_id):
         reports.query.filter(reports.test_id == test_id).delete()
+        self._index_tests([test_id])
         db.session.commit()
+        self._invalidate(('reports', int(test_id)))
 
     def delete_user(self, user_id):
         users.query(users).filter(users.id == user_id).delete()
         db.session.commit()
+        self._invalidate(('users', int(user_id)))
 
     def delete_company(self, company_id):
         companies.query.filter(companies.id == company_id).delete()
         db.session.commit()
+        self._invalidate(('companies', int(company_id)))
+
+
+# Database manager of the app, stateless apart from the caches it shares with every instance
+db_manager = DBManager()
@@ -0,0 +1,193 @@
+"""
+Streaming export of a company's tests with their variants and reports.
+
+Rows come from DBManager.iter_export_rows, which reads them from the database
+in batches, and are encoded into chunks of bytes as they arrive, so exporting
+any number of tests uses a constant amount of memory.
+
+Formats:
+- ndjson: one JSON object per test with a nested "variants" list
+- csv / parquet: one row per test in the bulk import layout (variant A and B
+  counts as columns) plus the report columns, so a dump can be imported again
+"""
+import csv
+import io
+import zlib
+
+from data.serialization import dumps
+
+EXPORT_FORMATS = ('ndjson', 'csv', 'parquet')
+
+FLAT_COLUMNS = ('test_id', 'name', 'description', 'metric', 'created_at',
+                'impressions_a', 'conversions_a', 'impressions_b', 'conversions_b',
+                'variant_count', 'p_value', 'significance', 'increase_percent')
+
+# Bytes buffered before a chunk is handed to the response
+CHUNK_BYTES = 64 * 1024
+
+# Rows per Parquet row group
+PARQUET_BATCH_ROWS = 10000
+
+
+def flatten_row(row):
+    """Turn an exported test into a row of FLAT_COLUMNS"""
+    variants = row['variants']
+    variant_a = variants[0] if len(variants) > 0 else {}
+    variant_b = variants[1] if len(variants) > 1 else {}
+    return {
+        'test_id': row['id'],
+        'name': row['name'],
+        'description': row['description'],
+        'metric': row['metric'],
+        'created_at': row['created_at'],
+        'impressions_a': variant_a.get('impressions'),
+        'conversions_a': variant_a.get('conversions'),
+        'impressions_b': variant_b.get('impressions'),
+        'conversions_b': variant_b.get('conversions'),
+        'variant_count': len(variants),
+        'p_value': row['p_value'],
+        'significance': row['significance'],
+        'increase_percent': row['increase_percent']
+    }
+
+
+def iter_ndjson(rows):
+    """Yield NDJSON bytes, one object per test"""
+    buffer = []
+    size = 0
+    for row in rows:
+        line = dumps(row, sort_keys=False) + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_csv(rows):
+    """Yield CSV bytes with a header row"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FLAT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(flatten_row(row))
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object collecting what the Parquet writer emits"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(rows):
+    """
+    Yield a Parquet file, one row group per PARQUET_BATCH_ROWS tests.
+
+    Requires pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError("Parquet export requires pyarrow. Install it with: pip install pyarrow") from e
+
+    schema = pa.schema([
+        ('test_id', pa.int64()),
+        ('name', pa.string()),
+        ('description', pa.string()),
+        ('metric', pa.string()),
+        ('created_at', pa.string()),
+        ('impressions_a', pa.int64()),
+        ('conversions_a', pa.int64()),
+        ('impressions_b', pa.int64()),
+        ('conversions_b', pa.int64()),
+        ('variant_count', pa.int64()),
+        ('p_value', pa.float64()),
+        ('significance', pa.bool_()),
+        ('increase_percent', pa.float64()),
+    ])
+
+    def generate():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        batch = []
+        for row in rows:
+            batch.append(flatten_row(row))
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                batch = []
+                yield sink.drain()
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+        writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a stream of byte chunks into a gzip stream on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(rows, export_format, compress=False):
+    """
+    Encode exported tests in the given format.
+
+    Args:
+        rows: Iterable of test dicts, e.g. from DBManager.iter_export_rows
+        export_format: One of EXPORT_FORMATS
+        compress: Gzip the output (ignored for parquet, which is compressed already)
+
+    Returns:
+        Iterator of byte chunks
+
+    Raises:
+        ValueError: If the format is unknown or its dependency is missing
+    """
+    if export_format == 'ndjson':
+        chunks = iter_ndjson(rows)
+    elif export_format == 'csv':
+        chunks = iter_csv(rows)
+    elif export_format == 'parquet':
+        return iter_parquet(rows)
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}. Use {', '.join(EXPORT_FORMATS)}")
+
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,88 @@
+"""
+Fingerprints of the inputs of a report.
+
+A report stores two fingerprints next to its results:
+
+- stats_fingerprint: the variant counts the p-value, significance and increase
+  were computed from.
+- ai_fingerprint: everything the AI recommendation and summary were generated
+  from: the statistics (through stats_fingerprint), the test and company
+  fields used in the prompt, the model and the prompt version.
+
+When a test is saved, stale_parts compares them with the fingerprints of the
+current inputs, and only the parts whose inputs changed are recomputed. Saving
+the edit form without changing anything the report depends on therefore runs
+no statistics and spends no tokens. Reports without fingerprints, e.g. those
+saved before they existed or imported ones, count as stale.
+
+The cached analysis payloads of data/analysis.py use analysis_fingerprint as
+their version and ETag, the cached report exports of data/report_export.py
+use export_fingerprint.
+"""
+import hashlib
+import json
+
+# Hex digits kept of the SHA-256 of the inputs
+FINGERPRINT_LENGTH = 32
+
+
+def _digest(values):
+    data = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def _text(value):
+    """Text as it reaches the prompt, ignoring surrounding and repeated whitespace"""
+    return ' '.join(str(value or '').split())
+
+
+def stats_fingerprint(impressions_a, conversions_a, impressions_b, conversions_b):
+    """Fingerprint of the counts two_proportion_z_test runs on"""
+    return _digest(['stats', int(impressions_a), int(conversions_a), int(impressions_b), int(conversions_b)])
+
+
+def ai_fingerprint(stats_key, test, company, model_id, prompt_version):
+    """
+    Fingerprint of the inputs of the AI recommendation and summary.
+
+    Args:
+        stats_key: stats_fingerprint of the statistics in the prompt
+        test: ab_tests row, its name, description and metric are in the prompt
+        company: companies row, its name, audience and year are in the prompt
+        model_id: MODEL_CONFIGS ID of the model generating the texts
+        prompt_version: PROMPT_VERSION of routes/ai.py
+    """
+    return _digest(['ai', stats_key,
+                    _text(test.name), _text(test.description), _text(test.metric),
+                    _text(company.name), _text(company.audience), company.year,
+                    model_id, prompt_version])
+
+
+def analysis_fingerprint(variants, payload_version):
+    """Fingerprint of the variants an analysis payload is built from, in payload format payload_version"""
+    return _digest(['analysis', payload_version,
+                    [[variant.id, variant.name, int(variant.impressions), int(variant.conversions)]
+                     for variant in variants]])
+
+
+def export_fingerprint(document, report_format, sections, render_version):
+    """Fingerprint of a report export: the exported test, variants and report, its format and layout"""
+    return _digest(['export', render_version, report_format, list(sections), document])
+
+
+def stale_parts(report, stats_key, ai_key, force=False):
+    """
+    Check which parts of a report have to be recomputed.
+
+    Args:
+        report: Current reports row of the test, or None
+        stats_key: stats_fingerprint of the current inputs
+        ai_key: ai_fingerprint of the current inputs
+        force: Recompute everything regardless of the fingerprints
+
+    Returns:
+        Tuple (stats, ai) of booleans, True if that part is out of date
+    """
+    if report is None or force:
+        return True, True
+    return report.stats_fingerprint != stats_key, report.ai_fingerprint != ai_key
@@ -0,0 +1,181 @@
+"""
+Streaming bulk import of historical A/B tests from CSV or Parquet files.
+
+Each row describes one test with two variants:
+
+    name, description, metric, created_at, impressions_a, conversions_a, impressions_b, conversions_b
+
+Only name and the four counts are required. Files are read in chunks, so memory
+use depends on the chunk size and not on the file size. Every chunk is validated,
+its significance is computed in one vectorised pass and it is written in one
+transaction.
+"""
+import csv
+import io
+from datetime import datetime
+
+from utils.utils import two_proportion_z_test_batch
+
+REQUIRED_COLUMNS = ('name', 'impressions_a', 'conversions_a', 'impressions_b', 'conversions_b')
+DEFAULT_CHUNK_SIZE = 5000
+
+# Number of invalid rows reported back with their error message
+MAX_REPORTED_ERRORS = 20
+
+
+def iter_csv_chunks(fileobj, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of row dicts from a CSV file with a header row.
+
+    Args:
+        fileobj: Binary or text file object
+        chunk_size: Rows per chunk
+    """
+    if not isinstance(fileobj, io.TextIOBase):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+    reader = csv.DictReader(fileobj)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_parquet_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of row dicts from a Parquet file, one record batch at a time.
+
+    Requires pyarrow.
+
+    Args:
+        source: Path or seekable binary file object
+        chunk_size: Rows per chunk
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError("Parquet import requires pyarrow. Install it with: pip install pyarrow") from e
+
+    parquet_file = pq.ParquetFile(source)
+    missing = [column for column in REQUIRED_COLUMNS if column not in parquet_file.schema_arrow.names]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+def iter_chunks(fileobj, filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Pick the CSV or Parquet reader from the file extension"""
+    if filename.lower().endswith('.parquet'):
+        return iter_parquet_chunks(fileobj, chunk_size)
+    if filename.lower().endswith('.csv'):
+        return iter_csv_chunks(fileobj, chunk_size)
+    raise ValueError(f"Unsupported file type: {filename}. Use .csv or .parquet")
+
+
+def validate_row(row):
+    """
+    Validate and normalise one imported row.
+
+    Returns:
+        Dict ready for DBManager.bulk_import_tests
+
+    Raises:
+        ValueError: If the row is invalid
+    """
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError("name is required")
+
+    counts = {}
+    for column in ('impressions_a', 'conversions_a', 'impressions_b', 'conversions_b'):
+        try:
+            counts[column] = int(float(row.get(column)))
+        except (TypeError, ValueError):
+            raise ValueError(f"{column} must be a number")
+
+    for variant in ('a', 'b'):
+        impressions = counts[f'impressions_{variant}']
+        conversions = counts[f'conversions_{variant}']
+        if impressions <= 0:
+            raise ValueError(f"impressions_{variant} must be positive")
+        if not 0 <= conversions <= impressions:
+            raise ValueError(f"conversions_{variant} must be between 0 and impressions_{variant}")
+
+    created_at = row.get('created_at')
+    if not created_at:
+        created_at = datetime.now()
+    elif not isinstance(created_at, datetime):
+        try:
+            created_at = datetime.fromisoformat(str(created_at).strip())
+        except ValueError:
+            raise ValueError("created_at must be an ISO date")
+
+    return {
+        'name': name[:255],
+        'description': str(row.get('description') or ''),
+        'metric': str(row.get('metric') or '')[:255],
+        'created_at': created_at,
+        **counts
+    }
+
+
+def iter_import(db_manager, company_id, chunks):
+    """
+    Validate and import chunks of rows for a company, one transaction per chunk.
+
+    Args:
+        db_manager: DBManager instance
+        company_id: Company the tests are created for
+        chunks: Iterable of lists of row dicts, e.g. from iter_chunks
+
+    Yields:
+        Running summary dict with rows, imported, rejected and errors after each chunk
+    """
+    summary = {'rows': 0, 'imported': 0, 'rejected': 0, 'errors': []}
+
+    for chunk in chunks:
+        valid_rows = []
+        for row in chunk:
+            summary['rows'] += 1
+            try:
+                valid_rows.append(validate_row(row))
+            except ValueError as e:
+                summary['rejected'] += 1
+                if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                    summary['errors'].append(f"row {summary['rows']}: {str(e)}")
+
+        if valid_rows:
+            results = two_proportion_z_test_batch(
+                [row['impressions_a'] for row in valid_rows],
+                [row['conversions_a'] for row in valid_rows],
+                [row['impressions_b'] for row in valid_rows],
+                [row['conversions_b'] for row in valid_rows]
+            )
+            db_manager.bulk_import_tests(company_id, valid_rows, results)
+            summary['imported'] += len(valid_rows)
+
+        yield summary
+
+
+def import_tests(db_manager, company_id, chunks, progress=None):
+    """
+    Import all chunks and return the final summary.
+
+    Args:
+        progress: Optional callable receiving the running summary after each chunk
+    """
+    summary = {'rows': 0, 'imported': 0, 'rejected': 0, 'errors': []}
+    for summary in iter_import(db_manager, company_id, chunks):
+        if progress is not None:
+            progress(summary)
+    return summary
@@ -0,0 +1,205 @@
+"""
+In-memory aggregation of raw impression/conversion events.
+
+Events are summed per (test_id, variant_id) and written to the variants table
+as deltas (write-behind), either when enough events are pending or when the
+flush interval has passed, so the database sees one batched transaction per
+flush instead of one write per event.
+"""
+import atexit
+import json
+import threading
+import time
+
+EVENT_TYPES = ('impression', 'conversion')
+
+# Number of parse errors reported back per batch
+MAX_REPORTED_ERRORS = 10
+
+
+def parse_events(lines, is_known=None):
+    """
+    Parse and pre-aggregate NDJSON events.
+
+    Each line is an object like
+    {"test_id": 1, "variant_id": 2, "event": "impression", "count": 1}
+    where "count" is optional and defaults to 1.
+
+    Args:
+        lines: Iterable of NDJSON lines (bytes or str)
+        is_known: Optional callable (test_id, variant_id) -> bool used to reject
+            events for unknown variants. It is called once per distinct pair.
+
+    Returns:
+        Tuple of (deltas, accepted event count, rejected event count, error messages)
+        where deltas is {(test_id, variant_id): [impressions, conversions]}
+    """
+    deltas = {}
+    accepted = 0
+    rejected = 0
+    errors = []
+    known = {}
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            event = json.loads(line)
+            key = (int(event['test_id']), int(event['variant_id']))
+            count = int(event.get('count', 1))
+            event_type = event['event']
+            if event_type not in EVENT_TYPES or count < 1:
+                raise ValueError(f"invalid event {event_type!r} with count {count}")
+            if is_known is not None:
+                if key not in known:
+                    known[key] = is_known(*key)
+                if not known[key]:
+                    raise ValueError(f"unknown variant {key[1]} for test {key[0]}")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"line {line_number}: {str(e)}")
+            continue
+
+        delta = deltas.setdefault(key, [0, 0])
+        delta[0 if event_type == 'impression' else 1] += count
+        accepted += 1
+
+    return deltas, accepted, rejected, errors
+
+
+class PartialFlushError(Exception):
+    """
+    Raised by a flush_fn that wrote only part of the deltas, e.g. one transaction per shard of which some failed.
+
+    Args:
+        written: Keys of the deltas that were committed and must not be retried
+    """
+
+    def __init__(self, message, written):
+        super().__init__(message)
+        self.written = set(written)
+
+
+class EventAggregator:
+    """
+    Thread-safe accumulator for variant count deltas.
+
+    Args:
+        flush_fn: Called with {key: [impressions, conversions]} to persist the
+            pending deltas. Keys are opaque tuples, the app uses
+            (company_id, test_id, variant_id). Must raise on failure, with
+            PartialFlushError if some of the deltas were committed.
+        max_pending: Number of pending events that triggers an immediate flush
+        flush_interval: Seconds between background flushes
+    """
+
+    def __init__(self, flush_fn, max_pending=10000, flush_interval=5.0):
+        self.flush_fn = flush_fn
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._pending_events = 0
+        self._lock = threading.Lock()
+        # Serialises flushes so deltas are never written twice
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def pending_events(self):
+        return self._pending_events
+
+    def configure(self, flush_fn, max_pending, flush_interval):
+        """Set how pending deltas are written and how often, before the first events are added"""
+        self.flush_fn = flush_fn
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+
+    def add(self, deltas, event_count):
+        """
+        Merge pre-aggregated deltas from one batch of events.
+
+        Args:
+            deltas: {key: [impressions, conversions]}
+            event_count: Number of raw events the deltas were built from
+        """
+        self._ensure_started()
+
+        if self._merge(deltas, event_count) >= self.max_pending:
+            try:
+                self.flush()
+            except Exception as e:
+                # The deltas stay pending and the background thread retries them
+                print(f"Error flushing events: {str(e)}")
+
+    def flush(self):
+        """
+        Write all pending deltas through flush_fn.
+
+        Returns:
+            Number of (test, variant) pairs written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                event_count, self._pending_events = self._pending_events, 0
+
+            if not pending:
+                return 0
+
+            try:
+                self.flush_fn(pending)
+            except PartialFlushError as e:
+                # Only the deltas that weren't committed are retried, the others would be counted twice.
+                # The event count only decides when to flush, so it is put back whole.
+                self._merge({key: delta for key, delta in pending.items() if key not in e.written}, event_count)
+                raise
+            except Exception:
+                # Put the deltas back so the next flush retries them
+                self._merge(pending, event_count)
+                raise
+
+            return len(pending)
+
+    def stop(self):
+        """Stop the background thread and flush what is left"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+            self._thread = None
+        self.flush()
+
+    def _merge(self, deltas, event_count):
+        """Add deltas to the pending totals and return the pending event count"""
+        with self._lock:
+            for key, (impressions, conversions) in deltas.items():
+                pending = self._pending.setdefault(key, [0, 0])
+                pending[0] += impressions
+                pending[1] += conversions
+            self._pending_events += event_count
+            return self._pending_events
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stop.is_set():
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing events: {str(e)}")
+                # Back off briefly before retrying the same deltas
+                time.sleep(1)
+
+
+# Event aggregator of this process, configured by the app
+event_aggregator = EventAggregator(None)
@@ -0,0 +1,204 @@
+"""
+Live dashboard updates over Server-Sent Events.
+
+DBManager publishes the companies whose data a committed write changed to the
+hub of its process. Every open dashboard subscribes to its company's channel,
+and the SSE stream (/api/live/<company_id> in app.py) wakes up, reads the
+dashboard state again and sends only the parts that differ from what the
+client already shows, as compact events:
+
+- snapshot: the whole state, sent once when the client (re)connects
+- test-created: another test became the most recent one (also sent when the
+  most recent test was deleted), with the whole state
+- test-updated: name, description or metric of the most recent test changed,
+  with the whole state
+- variants-updated: the variants of the most recent test or the totals changed
+- report-ready: the report of the most recent test was created or updated
+- ratios-changed: the winning/losing/other ratios changed
+
+Streams only read the state when the company version (see
+data/response_cache.py) moved since their last event, and otherwise just send
+a heartbeat now and then. The hub is local to the process: writes of other
+worker processes are noticed through the version, which the streams check
+every poll interval. The state of each version is read once per process and
+shared by all streams of the company.
+"""
+import threading
+
+from data.cache import MISSING, TTLCache
+from data.serialization import dumps
+
+# Seconds without events after which a comment is sent, so proxies keep the connection and dead clients are noticed
+HEARTBEAT_INTERVAL = 15
+
+# Milliseconds browsers wait before reconnecting a closed stream
+RECONNECT_DELAY = 3000
+
+
+class Subscription:
+    """Channel of one stream, set when the company's data changed since the last wait()"""
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self._changed = threading.Event()
+        self.closed = False
+
+    def notify(self):
+        self._changed.set()
+
+    def wait(self, timeout):
+        """Wait until the company's data changed or timeout seconds passed, and return whether it changed"""
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+
+class LiveHub:
+    """Publish/subscribe hub for company data changes within one process"""
+
+    def __init__(self):
+        self.max_subscribers = 0
+        self.poll_interval = 2.0
+        self.stream_timeout = 300.0
+        # Dashboard states by company and version
+        self.states = TTLCache()
+        # Locks of the companies whose state is being read, so their streams read it only once
+        self._state_locks = {}
+        self._subscriptions = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_subscribers > 0
+
+    @property
+    def active(self):
+        """Whether a stream of this process is open, publishing is pointless otherwise"""
+        return self._count > 0
+
+    @property
+    def subscribers(self):
+        """Number of open streams of this process"""
+        return self._count
+
+    def configure(self, max_subscribers, poll_interval, stream_timeout):
+        """
+        Args:
+            max_subscribers: Streams one process keeps open at once, each takes a server thread (0 disables them)
+            poll_interval: Seconds between checks for writes of other processes
+            stream_timeout: Seconds after which a stream ends and the browser reconnects
+        """
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self.stream_timeout = stream_timeout
+        self.states.configure(ttl=stream_timeout, maxsize=max_subscribers)
+
+    def state(self, company_id, version, loader):
+        """
+        Dashboard state of a company at a version, read with loader(company_id)
+        by the first stream asking for it.
+
+        The state must be treated as read-only, it is shared between streams.
+        """
+        key = (int(company_id), version)
+        with self._lock:
+            lock = self._state_locks.setdefault(key[0], threading.Lock())
+        with lock:
+            state = self.states.get(key)
+            if state is MISSING:
+                state = loader(company_id)
+                self.states.set(key, state)
+        return state
+
+    def subscribe(self, company_id):
+        """
+        Open a channel for the changes of a company, close it with unsubscribe().
+
+        Raises:
+            OverflowError: If max_subscribers streams are already open
+        """
+        subscription = Subscription(company_id)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise OverflowError("Too many live streams")
+            self._subscriptions.setdefault(company_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            channel = self._subscriptions.get(subscription.company_id)
+            if channel is None or subscription not in channel:
+                return
+            channel.discard(subscription)
+            if not channel:
+                del self._subscriptions[subscription.company_id]
+                self._state_locks.pop(subscription.company_id, None)
+            self._count -= 1
+
+    def publish(self, company_ids):
+        """Wake up the streams of companies whose data changed"""
+        if not self._count:
+            return
+        with self._lock:
+            subscriptions = [subscription for company_id in company_ids
+                             for subscription in self._subscriptions.get(int(company_id), ())]
+        for subscription in subscriptions:
+            subscription.notify()
+
+    def close(self):
+        """End all streams of this process, e.g. when the worker shuts down"""
+        with self._lock:
+            subscriptions = [subscription for channel in self._subscriptions.values() for subscription in channel]
+        for subscription in subscriptions:
+            subscription.closed = True
+            subscription.notify()
+
+
+def state_events(previous, state):
+    """
+    Events turning the dashboard of previous into state.
+
+    Args:
+        previous: State the client shows, or None if it just connected
+        state: Current state, a dict of test, variants, report, totals and ratios (see app.dashboard_state)
+
+    Returns:
+        List of (event, data) tuples
+    """
+    if previous is None:
+        return [('snapshot', state)]
+
+    test, previous_test = state['test'], previous['test']
+    if test != previous_test:
+        same_test = test is not None and previous_test is not None and test['id'] == previous_test['id']
+        return [('test-updated' if same_test else 'test-created', state)]
+
+    test_id = test['id'] if test else None
+    events = []
+    if state['variants'] != previous['variants'] or state['totals'] != previous['totals']:
+        events.append(('variants-updated', {'test_id': test_id, 'variants': state['variants'],
+                                            'totals': state['totals']}))
+    if state['report'] != previous['report']:
+        events.append(('report-ready', {'test_id': test_id, 'report': state['report']}))
+    if state['ratios'] != previous['ratios']:
+        events.append(('ratios-changed', state['ratios']))
+    return events
+
+
+def format_event(event, data):
+    """Encode an event in the text/event-stream format"""
+    return b'event: ' + event.encode('ascii') + b'\ndata: ' + dumps(data) + b'\n\n'
+
+
+def format_comment(comment):
+    return f': {comment}\n\n'.encode('utf-8')
+
+
+def format_retry(milliseconds):
+    return f'retry: {milliseconds}\n\n'.encode('ascii')
+
+
+# Live hub of this process, configured by the app
+live_hub = LiveHub()
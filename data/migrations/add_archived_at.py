@@ -0,0 +1,43 @@
+"""
+Migration script to add the archived_at column to ab_tests.
+
+Tests with archived_at set are stubs whose variants, reports and snapshots
+live in the archive database (see data/archive.py).
+"""
+import sqlite3
+import os
+
+def migrate():
+    """Add archived_at column to ab_tests table"""
+    # Get database path
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check if column already exists
+        cursor.execute("PRAGMA table_info(ab_tests)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        if 'archived_at' in columns:
+            print("Skipped: archived_at already exists")
+            return
+
+        print("Adding archived_at column to ab_tests...")
+        cursor.execute("ALTER TABLE ab_tests ADD COLUMN archived_at DATETIME")
+
+        conn.commit()
+        print("Migration successful: archived_at column added")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,50 @@
+"""
+Migration script to add the company_versions table.
+
+It holds the version of every company's data that the response cache keys
+cached pages and API responses on (see data/response_cache.py). Companies get
+their row on the first write after the migration. In sharded mode the table
+belongs to the main database, not the shards.
+"""
+import sqlite3
+import os
+
+CREATE_TABLE = """
+    CREATE TABLE company_versions (
+        company_id INTEGER NOT NULL PRIMARY KEY REFERENCES companies (id),
+        version INTEGER NOT NULL
+    )
+"""
+
+def migrate():
+    """Create the company_versions table"""
+    # Get database path
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check if the table already exists
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'company_versions'")
+        if cursor.fetchone():
+            print("Skipped: company_versions already exists")
+            return
+
+        print("Creating company_versions table...")
+        cursor.execute(CREATE_TABLE)
+
+        conn.commit()
+        print("Migration successful: company_versions table created")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,51 @@
+"""
+Migration script to add the input fingerprints to reports.
+
+Reports keep stats_fingerprint and ai_fingerprint (see data/fingerprints.py)
+so saving a test only recomputes what its changes affect. Existing reports get
+no fingerprints and are regenerated once, the next time their test is saved.
+Pass the paths of shard databases to migrate them too; without arguments the
+main database is migrated.
+"""
+import sqlite3
+import os
+import sys
+
+FINGERPRINT_COLUMNS = ('stats_fingerprint', 'ai_fingerprint')
+
+
+def migrate(db_path=None):
+    """Add stats_fingerprint and ai_fingerprint columns to reports table"""
+    # Get database path
+    db_path = db_path or os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check if columns already exist
+        cursor.execute("PRAGMA table_info(reports)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        for column in FINGERPRINT_COLUMNS:
+            if column in columns:
+                print(f"Skipped: {column} already exists")
+                continue
+            print(f"Adding {column} column to reports...")
+            cursor.execute(f"ALTER TABLE reports ADD COLUMN {column} VARCHAR(64)")
+
+        conn.commit()
+        print("Migration successful")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or [None]:
+        migrate(path)
@@ -0,0 +1,109 @@
+"""
+Migration script for soft delete and the cascading purge.
+
+- Adds the deleted_at column to ab_tests and a partial index on deleted tests.
+- Rebuilds variants, reports and variant_snapshots so their foreign keys to
+  ab_tests and variants are ON DELETE CASCADE. SQLite can't change a foreign
+  key in place, so each table is copied into a new one with the same schema
+  plus the cascade, following https://www.sqlite.org/lang_altertable.html.
+
+Pass the paths of shard databases to migrate them too; without arguments the
+main database is migrated.
+"""
+import re
+import sqlite3
+import os
+import sys
+
+CASCADE_TABLES = ('variants', 'reports', 'variant_snapshots')
+
+CREATE_INDEX = 'CREATE INDEX ix_ab_tests_deleted_at ON ab_tests (deleted_at) WHERE deleted_at IS NOT NULL'
+
+REFERENCE = re.compile(r'(REFERENCES\s+"?(?:ab_tests|variants)"?\s*\(\s*"?id"?\s*\))(?!\s+ON DELETE)', re.IGNORECASE)
+
+
+def _add_cascades(cursor, table):
+    """Copy a table into a new one whose foreign keys cascade, keeping its indexes"""
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    row = cursor.fetchone()
+    if row is None:
+        print(f"Skipped: {table} does not exist")
+        return False
+
+    create_sql = REFERENCE.sub(r'\1 ON DELETE CASCADE', row[0])
+    if create_sql == row[0]:
+        print(f"Skipped: foreign keys of {table} already cascade")
+        return False
+
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                   (table,))
+    indexes = [index_sql for index_sql, in cursor.fetchall()]
+
+    print(f"Rebuilding {table} with ON DELETE CASCADE...")
+    new_table = f'{table}_cascade'
+    create_sql = re.sub(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE {new_table}', create_sql, count=1)
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {new_table} SELECT * FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for index_sql in indexes:
+        cursor.execute(index_sql)
+    return True
+
+
+def migrate(db_path=None):
+    """Add deleted_at to ab_tests and cascading foreign keys to its children"""
+    # Get database path
+    db_path = db_path or os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    # Autocommit mode, so the table rebuilds run in the explicit transaction below
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        cursor.execute("BEGIN")
+
+        # Check if column already exists
+        cursor.execute("PRAGMA table_info(ab_tests)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        if 'deleted_at' in columns:
+            print("Skipped: deleted_at already exists")
+        else:
+            print("Adding deleted_at column to ab_tests...")
+            cursor.execute("ALTER TABLE ab_tests ADD COLUMN deleted_at DATETIME")
+
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ix_ab_tests_deleted_at'")
+        if cursor.fetchone():
+            print("Skipped: ix_ab_tests_deleted_at already exists")
+        else:
+            print("Creating index ix_ab_tests_deleted_at...")
+            cursor.execute(CREATE_INDEX)
+
+        for table in CASCADE_TABLES:
+            _add_cascades(cursor, table)
+
+        orphans = []
+        for table in CASCADE_TABLES:
+            cursor.execute(f"PRAGMA foreign_key_check({table})")
+            orphans.extend(cursor.fetchall())
+        cursor.execute("COMMIT")
+
+        if orphans:
+            print(f"Warning: {len(orphans)} rows reference missing tests or variants")
+        print("Migration successful")
+
+    except Exception as e:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or [None]:
+        migrate(path)
@@ -0,0 +1,57 @@
+"""
+Migration script to add the indexes used by the company-scoped test queries.
+
+db.create_all() does not add indexes to tables that already exist, so this
+creates them on databases created before the indexes were declared in models.py.
+
+Pass the paths of shard databases to migrate them too; without arguments the
+main database is migrated.
+"""
+import sqlite3
+import os
+import sys
+
+INDEXES = {
+    'ix_ab_tests_company_created': 'CREATE INDEX ix_ab_tests_company_created ON ab_tests (company_id, created_at, id)',
+    'ix_variants_test_id': 'CREATE INDEX ix_variants_test_id ON variants (test_id)',
+    'ix_reports_test_id': 'CREATE INDEX ix_reports_test_id ON reports (test_id)',
+}
+
+def migrate(db_path=None):
+    """Create missing indexes on ab_tests, variants and reports"""
+    # Get database path
+    db_path = db_path or os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check which indexes already exist
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        created = 0
+        for name, statement in INDEXES.items():
+            if name in existing:
+                print(f"Skipped: {name} already exists")
+                continue
+
+            print(f"Creating index {name}...")
+            cursor.execute(statement)
+            created += 1
+
+        conn.commit()
+        print(f"Migration successful: {created} index(es) created")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or [None]:
+        migrate(path)
@@ -0,0 +1,75 @@
+"""
+Migration script to add the full-text index of tests and fill it.
+
+Creates the test_search FTS5 table (data/search.py) and indexes every test
+that is not deleted with its report. Running it again rebuilds the index.
+Pass the paths of shard databases to migrate them too; without arguments the
+main database is migrated.
+"""
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from data.recommendations import decode_recommendation
+from data.search import CREATE_SEARCH_TABLE, search_row
+
+# Tests indexed per statement batch
+BATCH_SIZE = 5000
+
+SELECT_TESTS = """
+    SELECT t.id, t.company_id, t.name, t.description, t.metric, r.summary, r.ai_recommendation
+    FROM ab_tests t LEFT JOIN reports r ON r.test_id = t.id
+    WHERE t.deleted_at IS NULL
+"""
+
+INSERT_ROW = """
+    INSERT INTO test_search (rowid, company_id, name, description, metric, summary, recommendation)
+    VALUES (:test_id, :company_id, :name, :description, :metric, :summary, :recommendation)
+"""
+
+
+def migrate(db_path=None):
+    """Create test_search and index all tests"""
+    # Get database path
+    db_path = db_path or os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Creating test_search...")
+        cursor.execute("DROP TABLE IF EXISTS test_search")
+        cursor.execute(CREATE_SEARCH_TABLE)
+
+        print("Indexing tests...")
+        indexed = 0
+        cursor.execute(SELECT_TESTS)
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            conn.executemany(INSERT_ROW, [
+                search_row(test_id, company_id, name, description, metric, summary,
+                           decode_recommendation(recommendation))
+                for test_id, company_id, name, description, metric, summary, recommendation in rows
+            ])
+            indexed += len(rows)
+
+        cursor.execute("INSERT INTO test_search (test_search) VALUES ('optimize')")
+        conn.commit()
+        print(f"Migration successful: {indexed} tests indexed")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or [None]:
+        migrate(path)
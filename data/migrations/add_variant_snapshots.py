@@ -0,0 +1,72 @@
+"""
+Migration script to add the variant_snapshots table and backfill it.
+
+Every existing variant gets one snapshot dated on the day its test was created,
+holding its current totals, so trend charts of older tests start from a point.
+"""
+import sqlite3
+import os
+
+CREATE_TABLE = """
+    CREATE TABLE variant_snapshots (
+        id INTEGER NOT NULL PRIMARY KEY,
+        test_id INTEGER NOT NULL REFERENCES ab_tests (id),
+        variant_id INTEGER NOT NULL REFERENCES variants (id),
+        day DATE NOT NULL,
+        impressions INTEGER NOT NULL,
+        conversions INTEGER NOT NULL,
+        conversion_rate FLOAT NOT NULL,
+        cumulative_impressions INTEGER NOT NULL,
+        cumulative_conversions INTEGER NOT NULL,
+        CONSTRAINT uq_variant_snapshots_variant_day UNIQUE (variant_id, day)
+    )
+"""
+
+CREATE_INDEX = 'CREATE INDEX ix_variant_snapshots_test_day ON variant_snapshots (test_id, day)'
+
+BACKFILL = """
+    INSERT INTO variant_snapshots (test_id, variant_id, day, impressions, conversions, conversion_rate,
+                                   cumulative_impressions, cumulative_conversions)
+    SELECT v.test_id, v.id, date(t.created_at), v.impressions, v.conversions, v.conversion_rate,
+           v.impressions, v.conversions
+    FROM variants v JOIN ab_tests t ON t.id = v.test_id
+    WHERE date(t.created_at) IS NOT NULL
+"""
+
+def migrate():
+    """Create the variant_snapshots table and backfill it from the variants table"""
+    # Get database path
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check if the table already exists
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'variant_snapshots'")
+        if cursor.fetchone():
+            print("Skipped: variant_snapshots already exists")
+            return
+
+        print("Creating variant_snapshots table...")
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(CREATE_INDEX)
+
+        print("Backfilling snapshots from current variant totals...")
+        cursor.execute(BACKFILL)
+        backfilled = cursor.rowcount
+
+        conn.commit()
+        print(f"Migration successful: {backfilled} snapshot(s) created")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,76 @@
+"""
+Migration script to store existing AI recommendations in the compact format.
+
+Recommendations saved as JSON text or plain text are re-encoded with
+encode_recommendation (data/recommendations.py), and the ones the app wrote
+with its fast compression level are recompressed with the compact one. Rows
+are only updated when they get smaller, so running it again changes nothing.
+The database is vacuumed afterwards so the freed pages are returned to the
+file system.
+"""
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from data.recommendations import decode_recommendation, encode_recommendation
+
+# Reports converted per statement batch
+BATCH_SIZE = 1000
+
+
+def migrate():
+    """Re-encode every ai_recommendation of the reports table with the compact compression"""
+    # Get database path
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'database.db')
+
+    print(f"Running migration on database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT COALESCE(SUM(LENGTH(CAST(ai_recommendation AS BLOB))), 0) FROM reports")
+        size_before = cursor.fetchone()[0]
+
+        converted = 0
+        last_id = 0
+        while True:
+            cursor.execute("SELECT id, ai_recommendation FROM reports "
+                           "WHERE ai_recommendation IS NOT NULL AND id > ? ORDER BY id LIMIT ?",
+                           (last_id, BATCH_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            updates = []
+            for report_id, stored in rows:
+                encoded = encode_recommendation(decode_recommendation(stored), compact=True)
+                if isinstance(stored, str) or len(encoded) < len(stored):
+                    updates.append((encoded, report_id))
+            cursor.executemany("UPDATE reports SET ai_recommendation = ? WHERE id = ?", updates)
+            converted += len(updates)
+            last_id = rows[-1][0]
+
+        if not converted:
+            print("Skipped: all recommendations already use the compact format")
+            return
+
+        cursor.execute("SELECT COALESCE(SUM(LENGTH(ai_recommendation)), 0) FROM reports")
+        size_after = cursor.fetchone()[0]
+        conn.commit()
+
+        print("Vacuuming database...")
+        conn.execute("VACUUM")
+        print(f"Migration successful: {converted} recommendations converted, "
+              f"{size_before:,} bytes -> {size_after:,} bytes")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -1,6 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from data.recommendations import RecommendationType
+from data.routing import RoutingSession
+from data.search import CREATE_SEARCH_TABLE
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class ab_tests(db.Model):
@@ -12,17 +16,36 @@ class ab_tests(db.Model):
     description = db.Column(db.Text, nullable=False)
     metric = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False)
+    # Set when variants, reports and snapshots were moved to the archive (data/archive.py)
+    archived_at = db.Column(db.DateTime, nullable=True)
+    # Set when the test was deleted, the purge (data/purge.py) removes it with its children later
+    deleted_at = db.Column(db.DateTime, nullable=True)
+
+    # Children of the test, loaded eagerly by the company-scoped queries in DBManager
+    variants = db.relationship('variants', order_by='variants.id', lazy='select', viewonly=True)
+    report = db.relationship('reports', uselist=False, lazy='select', viewonly=True)
+
+    # Keyset pagination walks this index in (created_at, id) order, the purge finds deleted tests in a partial index
+    __table_args__ = (
+        db.Index('ix_ab_tests_company_created', 'company_id', 'created_at', 'id'),
+        db.Index('ix_ab_tests_deleted_at', 'deleted_at',
+                 sqlite_where=db.text('deleted_at IS NOT NULL'), postgresql_where=db.text('deleted_at IS NOT NULL')),
+    )
 
     __repr__ = lambda self: f'<Ab_Test {self.id}>'
 
     __str__ = lambda self: f'{self.id}'
 
 
+# The full-text index of tests (data/search.py) is created wherever ab_tests is, e.g. in new shards
+db.event.listen(ab_tests.__table__, 'after_create', db.DDL(CREATE_SEARCH_TABLE).execute_if(dialect='sqlite'))
+
+
 class variants(db.Model):
     __tablename__ = 'variants'
 
     id = db.Column(db.Integer, primary_key=True)
-    test_id = db.Column(db.Integer, db.ForeignKey('ab_tests.id'), nullable=False)
+    test_id = db.Column(db.Integer, db.ForeignKey('ab_tests.id', ondelete='CASCADE'), nullable=False, index=True)
     name = db.Column(db.String(255), nullable=False)
     impressions = db.Column(db.Integer, nullable=False)
     conversions = db.Column(db.Integer, nullable=False)
@@ -33,17 +56,46 @@ class variants(db.Model):
     __str__ = lambda self: f'{self.id}'
 
 
+class variant_snapshots(db.Model):
+    """Daily history of a variant: counts added that day plus the running totals at the end of it"""
+    __tablename__ = 'variant_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    test_id = db.Column(db.Integer, db.ForeignKey('ab_tests.id', ondelete='CASCADE'), nullable=False)
+    variant_id = db.Column(db.Integer, db.ForeignKey('variants.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    impressions = db.Column(db.Integer, nullable=False)
+    conversions = db.Column(db.Integer, nullable=False)
+    conversion_rate = db.Column(db.Float, nullable=False)
+    cumulative_impressions = db.Column(db.Integer, nullable=False)
+    cumulative_conversions = db.Column(db.Integer, nullable=False)
+
+    # One row per variant and day, time-series reads scan (test_id, day)
+    __table_args__ = (
+        db.UniqueConstraint('variant_id', 'day', name='uq_variant_snapshots_variant_day'),
+        db.Index('ix_variant_snapshots_test_day', 'test_id', 'day'),
+    )
+
+    __repr__ = lambda self: f'<Variant_Snapshot {self.variant_id} {self.day}>'
+
+    __str__ = lambda self: f'{self.variant_id} - {self.day}'
+
+
 class reports(db.Model):
     __tablename__ = 'reports'
 
     id = db.Column(db.Integer, primary_key=True)
-    test_id = db.Column(db.Integer, db.ForeignKey('ab_tests.id'), nullable=False)
+    test_id = db.Column(db.Integer, db.ForeignKey('ab_tests.id', ondelete='CASCADE'), nullable=False, index=True)
     p_value = db.Column(db.Float, nullable=False)
     summary = db.Column(db.Text, nullable=False)
     significance = db.Column(db.Boolean, nullable=False)
     increase_percent = db.Column(db.Float, nullable=True)
-    ai_recommendation = db.Column(db.Text, nullable=False)
+    # Structured recommendation dict or text, stored compressed (data/recommendations.py)
+    ai_recommendation = db.Column(RecommendationType, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    # Fingerprints of the inputs of the statistics and of the AI texts (data/fingerprints.py)
+    stats_fingerprint = db.Column(db.String(64), nullable=True)
+    ai_fingerprint = db.Column(db.String(64), nullable=True)
 
     __repr__ = lambda self: f'<Report {self.id}>'
 
@@ -77,3 +129,39 @@ class companies(db.Model):
     __repr__ = lambda self: f'<User {self.name}>'
 
     __str__ = lambda self: f'{self.name} - {self.email}'
+
+
+class company_shards(db.Model):
+    """Shard holding the tests of a company, only used in sharded mode"""
+    __tablename__ = 'company_shards'
+
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), primary_key=True)
+    shard = db.Column(db.String(64), nullable=False)
+
+    __repr__ = lambda self: f'<Company_Shard {self.company_id}>'
+
+    __str__ = lambda self: f'{self.company_id} - {self.shard}'
+
+
+class company_versions(db.Model):
+    """Version of a company's data, bumped after every write to it (data/response_cache.py)"""
+    __tablename__ = 'company_versions'
+
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    __repr__ = lambda self: f'<Company_Version {self.company_id}>'
+
+    __str__ = lambda self: f'{self.company_id} - {self.version}'
+
+
+class id_sequences(db.Model):
+    """Next free ID of tables whose IDs must be unique across shards"""
+    __tablename__ = 'id_sequences'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+
+    __repr__ = lambda self: f'<Id_Sequence {self.table_name}>'
+
+    __str__ = lambda self: f'{self.table_name} - {self.next_id}'
@@ -0,0 +1,135 @@
+"""
+Background purge of soft-deleted tests.
+
+Deleting a test only sets ab_tests.deleted_at, so the request returns after one
+UPDATE. The purge removes deleted tests later, a batch at a time: one DELETE on
+ab_tests per batch, and the ON DELETE CASCADE foreign keys of variants, reports
+and variant_snapshots remove their rows in the same statement.
+
+SQLite only enforces foreign keys, and with them the cascades, when the
+connection enables them, so the purge switches them on for its own connection.
+Databases created before the cascades were declared need
+data/migrations/add_soft_delete.py, until then the DELETE fails with a foreign
+key error instead of leaving orphaned rows.
+"""
+import atexit
+import threading
+
+import sqlalchemy as sa
+
+from data.archive import test_archive
+from data.models import db
+from data.sharding import shard_router
+
+# Tests removed per DELETE
+PURGE_BATCH_SIZE = 500
+
+
+class TestPurger:
+    """Removes soft-deleted tests and their children in the background"""
+
+    def __init__(self):
+        self.interval = 0
+        self.batch_size = PURGE_BATCH_SIZE
+        self.context = None
+        self.purged = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def configure(self, interval, context, batch_size=PURGE_BATCH_SIZE):
+        """
+        Purge every interval seconds once start() was called.
+
+        Args:
+            interval: Seconds between purges
+            context: Callable returning the context manager the purge runs in,
+                e.g. app.app_context
+            batch_size: Tests removed per DELETE
+        """
+        self.interval = interval
+        self.context = context
+        self.batch_size = batch_size
+
+    def start(self):
+        """Start the background thread, in every worker process after it was forked"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='test-purge', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def purge(self):
+        """
+        Remove all soft-deleted tests of the main database or of every shard.
+
+        Returns:
+            Number of tests removed
+        """
+        with self._lock:
+            engines = ([shard_router.engine(shard) for shard in shard_router.shards()]
+                       if shard_router.enabled else [db.engine])
+            purged = sum(purge_engine(engine, self.batch_size) for engine in engines)
+            self.purged += purged
+            return purged
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.context():
+                    self.purge()
+            except Exception as e:
+                print(f"Error purging deleted tests: {str(e)}")
+
+
+def purge_engine(engine, batch_size=PURGE_BATCH_SIZE):
+    """
+    Remove the soft-deleted tests stored in one database.
+
+    Each batch is its own transaction, so writers are only blocked for one
+    batch at a time.
+
+    Returns:
+        Number of tests removed
+    """
+    tests = db.metadata.tables['ab_tests']
+    purged = 0
+    with engine.connect() as conn:
+        sqlite = conn.dialect.name == 'sqlite'
+        if sqlite:
+            # Must be set outside a transaction, the pooled connection gets it reset below
+            conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+            conn.commit()
+        try:
+            while True:
+                with conn.begin():
+                    rows = conn.execute(sa.select(tests.c.id, tests.c.archived_at)
+                                        .where(tests.c.deleted_at.isnot(None))
+                                        .order_by(tests.c.id)
+                                        .limit(batch_size)).all()
+                    if not rows:
+                        break
+                    conn.execute(sa.delete(tests).where(tests.c.id.in_([test_id for test_id, _ in rows])))
+
+                archived = [test_id for test_id, archived_at in rows if archived_at is not None]
+                if archived and test_archive.enabled:
+                    test_archive.delete(*archived)
+                purged += len(rows)
+        finally:
+            if sqlite:
+                conn.rollback()
+                conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+                conn.commit()
+    return purged
+
+
+# Purger of this process, configured by the app
+test_purger = TestPurger()
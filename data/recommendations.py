@@ -0,0 +1,154 @@
+"""
+Compact storage of AI recommendations.
+
+reports.ai_recommendation holds either a structured recommendation (a dict with
+decision and topics) or plain text from older reports. It is stored as a small
+header followed by compressed JSON:
+
+    b'AR' | format version (1 byte) | codec (1 byte) | payload
+
+The codec is zstd when the zstandard package is installed and zlib otherwise,
+so reading zstd values needs zstandard as well. Rows written before this format
+hold JSON text or plain text; they are still read, and
+data/migrations/compress_ai_recommendations.py converts them once.
+
+Values are written with a fast compression level, the migration recompresses
+them with COMPACT_ZSTD_LEVEL offline.
+
+Decoded recommendations are cached in memory by their stored bytes, so a report
+that is shown again is not decompressed and parsed again. Callers get their own
+copy of a cached dict and may change it.
+"""
+import copy
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'AR'
+
+# Bump when the layout of the encoded value changes
+RECOMMENDATION_FORMAT_VERSION = 1
+
+CODEC_ZLIB = b'z'
+CODEC_ZSTD = b's'
+
+# Compression levels of the request path and of the offline migration
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+COMPACT_ZSTD_LEVEL = 19
+COMPACT_ZLIB_LEVEL = 9
+
+# Decoded recommendations kept in memory
+DECODED_CACHE_SIZE = 1024
+
+_decoded = OrderedDict()
+_lock = threading.Lock()
+
+
+def encode_recommendation(value, compact=False):
+    """
+    Encode a recommendation for storage.
+
+    Args:
+        value: Structured recommendation dict, or text. Text holding a JSON
+            object is stored as the object.
+        compact: Use the slow, smallest compression levels, for offline
+            migrations
+
+    Returns:
+        Bytes with header and compressed JSON
+    """
+    if isinstance(value, (bytes, memoryview)):
+        # Already encoded, e.g. copied from another row
+        return bytes(value)
+    if isinstance(value, str) and value.startswith('{'):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+
+    data = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if zstandard is not None:
+        level = COMPACT_ZSTD_LEVEL if compact else ZSTD_LEVEL
+        return MAGIC + bytes([RECOMMENDATION_FORMAT_VERSION]) + CODEC_ZSTD + zstandard.compress(data, level)
+    level = COMPACT_ZLIB_LEVEL if compact else ZLIB_LEVEL
+    return MAGIC + bytes([RECOMMENDATION_FORMAT_VERSION]) + CODEC_ZLIB + zlib.compress(data, level)
+
+
+def _decode(raw):
+    if isinstance(raw, str):
+        # Stored before the compact format: JSON text or plain text
+        if raw.startswith('{'):
+            try:
+                return json.loads(raw)
+            except json.JSONDecodeError:
+                pass
+        return raw
+
+    raw = bytes(raw)
+    if not raw.startswith(MAGIC):
+        return _decode(raw.decode('utf-8'))
+
+    version, codec, payload = raw[2], raw[3:4], raw[4:]
+    if version != RECOMMENDATION_FORMAT_VERSION:
+        raise ValueError(f"Unsupported recommendation format version: {version}")
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Recommendation is zstd-compressed, install zstandard to read it")
+        data = zstandard.decompress(payload)
+    elif codec == CODEC_ZLIB:
+        data = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown recommendation codec: {codec!r}")
+    return json.loads(data)
+
+
+def decode_recommendation(raw):
+    """
+    Decode a stored recommendation.
+
+    Args:
+        raw: Encoded bytes, or text stored before the compact format
+
+    Returns:
+        Structured recommendation dict, owned by the caller, or text
+    """
+    if raw is None or isinstance(raw, dict):
+        return raw
+
+    key = raw if isinstance(raw, (bytes, str)) else bytes(raw)
+    with _lock:
+        value = _decoded.get(key)
+        if value is not None:
+            _decoded.move_to_end(key)
+            return copy.deepcopy(value) if isinstance(value, dict) else value
+
+    value = _decode(key)
+    with _lock:
+        _decoded[key] = value
+        while len(_decoded) > DECODED_CACHE_SIZE:
+            _decoded.popitem(last=False)
+    return copy.deepcopy(value) if isinstance(value, dict) else value
+
+
+class RecommendationType(TypeDecorator):
+    """Column type storing recommendations with encode_recommendation"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_recommendation(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_recommendation(value)
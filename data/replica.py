@@ -0,0 +1,162 @@
+"""
+Optional read replica for read-only requests.
+
+Two kinds of replica are supported:
+- An external database given by its URI, e.g. a Postgres read replica. Its lag
+  is measured with a dialect specific query where one is known, otherwise it is
+  assumed to be max_lag.
+- A copy of the SQLite database refreshed every refresh_interval seconds with
+  the SQLite backup API. The copy is written next to the replica file and
+  swapped in, so readers are never blocked.
+
+A GET request reads from the replica unless the user wrote something more
+recently than the replica is up to date (read-your-writes) or the replica lags
+by more than max_lag seconds. Writes always go to the primary.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+import sqlalchemy as sa
+
+# Seconds of replication lag, per dialect
+LAG_QUERIES = {
+    'postgresql': "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)",
+}
+
+# Seconds a measured lag is reused before it is queried again
+LAG_CHECK_INTERVAL = 1.0
+
+
+class ReplicaRouter:
+    """Decides whether reads may use the replica and keeps a SQLite copy fresh"""
+
+    def __init__(self):
+        self.engine = None
+        self.max_lag = 0
+        self.refresh_interval = 0
+        self.source_path = None
+        self.copy_path = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self._synced_at = None
+        self._lag = None
+        self._lag_checked_at = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.engine is not None
+
+    def configure_uri(self, uri, max_lag):
+        """Use an external replica database"""
+        self.engine = sa.create_engine(uri)
+        self.max_lag = max_lag
+
+    def configure_copy(self, source_path, copy_path, refresh_interval, max_lag):
+        """Use a SQLite copy of source_path, refreshed in the background once start() was called"""
+        self.source_path = source_path
+        self.copy_path = copy_path
+        self.refresh_interval = refresh_interval
+        self.max_lag = max_lag
+        self.refresh()
+        self.engine = sa.create_engine(f'sqlite:///{copy_path}')
+
+    def start(self):
+        """Start refreshing the SQLite copy, in every worker process after it was forked"""
+        if self.copy_path is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='replica-refresh', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def refresh(self):
+        """Copy the primary SQLite database into the replica file"""
+        started_at = time.time()
+        tmp_path = f'{self.copy_path}.{os.getpid()}.tmp'
+        source = sqlite3.connect(self.source_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, self.copy_path)
+
+        # Pooled connections still point at the old file
+        if self.engine is not None:
+            self.engine.dispose(close=False)
+        with self._lock:
+            self._synced_at = started_at
+
+    def synced_at(self):
+        """Time up to which all commits of the primary are visible on the replica"""
+        if self.copy_path is not None:
+            return self._synced_at
+        return time.time() - self.lag()
+
+    def lag(self):
+        """Replication lag in seconds"""
+        if self.copy_path is not None:
+            return time.time() - self._synced_at
+
+        now = time.time()
+        if self._lag is None or now - self._lag_checked_at > LAG_CHECK_INTERVAL:
+            query = LAG_QUERIES.get(self.engine.dialect.name)
+            lag = self.max_lag
+            if query is not None:
+                try:
+                    with self.engine.connect() as conn:
+                        lag = float(conn.execute(sa.text(query)).scalar())
+                except sa.exc.SQLAlchemyError as e:
+                    print(f"Error measuring replica lag: {str(e)}")
+                    lag = float('inf')
+            self._lag, self._lag_checked_at = lag, now
+        return self._lag
+
+    def should_read(self, last_write_at=None):
+        """
+        Decide whether a read-only request may use the replica.
+
+        Args:
+            last_write_at: Time of the user's last write, if any
+        """
+        if not self.enabled:
+            return False
+
+        lag = self.lag()
+        use_replica = lag <= self.max_lag and (last_write_at is None or last_write_at < self.synced_at())
+        with self._lock:
+            if use_replica:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+        return use_replica
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "lag_seconds": round(self.lag(), 3) if self.enabled else None,
+            "max_lag_seconds": self.max_lag,
+            "replica_requests": self.replica_reads,
+            "primary_requests": self.primary_reads
+        }
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing replica: {str(e)}")
+
+
+# Replica of this process, configured by the app
+replica_router = ReplicaRouter()
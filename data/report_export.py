@@ -0,0 +1,581 @@
+"""
+Server-side PDF and PowerPoint exports of test reports.
+
+The exports follow the layouts the reports page used to build in the browser
+with jsPDF and PptxGenJS: the sections of a template (REPORT_TEMPLATES), in
+the order and visibility of the layout saved in the report builder. Sections
+without a printable form (conversionFunnel and charts) are skipped, as before.
+
+Rendering runs in a process pool, so exports don't hold up the request
+threads or the GIL and a batch export renders several reports in parallel.
+Workers receive a plain document (the test, its variants and report as
+returned by GET /api/tests/<company_id>/<test_id>) and return the file bytes.
+
+Rendered files are cached by their export_fingerprint: the document, i.e. the
+current version of the test and its report, the format, the sections and
+RENDER_VERSION. Exporting an unchanged report again is a cache hit, and
+the fingerprint is also the ETag of the download.
+
+PDFs need the optional reportlab package, PowerPoint files python-pptx.
+"""
+import atexit
+import io
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from data.cache import MISSING, TTLCache
+from data.fingerprints import export_fingerprint
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+try:
+    from pptx import Presentation
+    from pptx.dml.color import RGBColor
+    from pptx.enum.shapes import MSO_SHAPE
+    from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+    from pptx.util import Inches, Pt
+except ImportError:
+    Presentation = None
+
+# Format of the rendered files, part of their fingerprint. Bump it when the layouts change.
+RENDER_VERSION = 1
+
+REPORT_MIMETYPES = {
+    'pdf': 'application/pdf',
+    'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+}
+REPORT_FORMATS = tuple(REPORT_MIMETYPES)
+
+# Section order of the report builder's default layout
+DEFAULT_SECTIONS = ('header', 'keyResults', 'executiveSummary', 'variantPerformance',
+                    'conversionFunnel', 'aiRecommendations', 'statisticalDetails', 'charts')
+
+REPORT_TEMPLATES = {
+    'executive': {
+        'name': 'Executive Summary',
+        'sections': ('header', 'keyResults', 'executiveSummary', 'aiRecommendations')
+    },
+    'technical': {
+        'name': 'Technical Analysis',
+        'sections': ('header', 'keyResults', 'executiveSummary', 'variantPerformance',
+                     'statisticalDetails', 'charts')
+    },
+    'full': {
+        'name': 'Full Report',
+        'sections': DEFAULT_SECTIONS
+    }
+}
+
+# Seconds a single render may take before the export fails
+RENDER_TIMEOUT = 60
+
+# Colors of the PDF (RGB) and PowerPoint (hex) exports
+PRIMARY = (46, 62, 74)
+MUTED = (100, 100, 100)
+FOOTER = (150, 150, 150)
+SUCCESS = (16, 185, 129)
+DANGER = (239, 68, 68)
+
+SLIDE_COLORS = {
+    'primary': '2E3E4A',
+    'accent': '317AAE',
+    'success': '10B981',
+    'danger': 'EF4444',
+    'light': 'F7F7F7'
+}
+
+
+class ExportError(Exception):
+    """A report can't be exported, e.g. its renderer isn't installed"""
+
+    # HTTP status of the error response
+    status = 501
+
+
+class RenderTimeoutError(ExportError):
+    """A render took longer than RENDER_TIMEOUT"""
+
+    status = 504
+
+
+class RenderPoolError(ExportError):
+    """A worker process of the render pool died, the next export starts a new pool"""
+
+    status = 503
+
+
+def report_sections(template, layout=None):
+    """
+    Sections a template renders, in the order of a saved layout.
+
+    Args:
+        template: REPORT_TEMPLATES key
+        layout: Optional list of the visible sections of the report builder in
+            their order. Template sections missing from it are hidden.
+
+    Returns:
+        Tuple of section names
+    """
+    sections = REPORT_TEMPLATES[template]['sections']
+    if layout is None:
+        return tuple(sections)
+    return tuple(section for section in dict.fromkeys(layout) if section in sections)
+
+
+def report_filename(document, template, report_format):
+    """Download name of an export, as the browser export named it"""
+    name = re.sub(r'[^a-z0-9]', '_', document['test']['name'], flags=re.I)
+    return f"{REPORT_TEMPLATES[template]['name']}_{name}.{report_format}"
+
+
+def _number(value):
+    """A number the way the browser printed it, without a trailing .0"""
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def _signed_percent(value):
+    value = _number(value or 0)
+    return f"{'+' if value > 0 else ''}{value}%"
+
+
+def _recommendation(report):
+    """Structured recommendation dict, plain text or None"""
+    recommendation = report.get('ai_recommendation') if report else None
+    if isinstance(recommendation, dict) and recommendation.get('decision'):
+        return recommendation
+    return str(recommendation) if recommendation else None
+
+
+class _PdfPages:
+    """reportlab canvas in the browser export's coordinates: millimetres from the top left"""
+
+    PAGE_WIDTH = 210
+    PAGE_HEIGHT = 297
+    MARGIN = 20
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.canvas = canvas.Canvas(self.buffer, pagesize=A4, pageCompression=1)
+        self.pages = []
+        self.y = 20
+        self.size = 12
+        self.bold = False
+        self.color = PRIMARY
+
+    @property
+    def font(self):
+        return 'Helvetica-Bold' if self.bold else 'Helvetica'
+
+    def style(self, size=None, color=None, bold=None):
+        if size is not None:
+            self.size = size
+        if bold is not None:
+            self.bold = bold
+        if color is not None:
+            self.color = color
+        self.canvas.setFillColorRGB(*(channel / 255 for channel in self.color))
+        self.canvas.setFont(self.font, self.size)
+
+    def text(self, text, x=MARGIN, align='left'):
+        y = (self.PAGE_HEIGHT - self.y) * mm
+        if align == 'center':
+            self.canvas.drawCentredString(x * mm, y, text)
+        elif align == 'right':
+            self.canvas.drawRightString(x * mm, y, text)
+        else:
+            self.canvas.drawString(x * mm, y, text)
+
+    def lines(self, text, width):
+        return simpleSplit(text, self.font, self.size, width * mm) or ['']
+
+    def page_break(self, needed):
+        """Start a new page if the next needed millimetres don't fit"""
+        if self.y + needed > self.PAGE_HEIGHT - self.MARGIN:
+            self.new_page()
+            self.y = self.MARGIN
+
+    def new_page(self):
+        # Pages are kept until the end so the footer can show the page count
+        self.pages.append(dict(self.canvas.__dict__))
+        self.canvas._startPage()
+        self.style()
+
+    def save(self):
+        self.pages.append(dict(self.canvas.__dict__))
+        for number, page in enumerate(self.pages, 1):
+            self.canvas.__dict__.update(page)
+            self.y = self.PAGE_HEIGHT - 10
+            self.style(size=8, color=FOOTER, bold=False)
+            self.text(f"Page {number} of {len(self.pages)}", self.PAGE_WIDTH / 2, align='center')
+            self.text('Generated with AB Lizer', self.PAGE_WIDTH - self.MARGIN, align='right')
+            canvas.Canvas.showPage(self.canvas)
+        self.canvas.save()
+        return self.buffer.getvalue()
+
+
+def _render_pdf(document, sections):
+    test, variants, report = document['test'], document['variants'], document['report']
+    pdf = _PdfPages()
+    content_width = pdf.PAGE_WIDTH - 2 * pdf.MARGIN
+    pdf.style(color=PRIMARY)
+
+    def heading(title, needed):
+        pdf.page_break(needed)
+        pdf.style(size=16, color=PRIMARY)
+        pdf.text(title)
+        pdf.y += 10
+
+    def paragraph(text, line_height, x=pdf.MARGIN, width=content_width):
+        for line in pdf.lines(text, width):
+            pdf.page_break(line_height)
+            pdf.text(line, x)
+            pdf.y += line_height
+
+    for section in sections:
+        if section == 'header':
+            pdf.style(size=24, color=PRIMARY)
+            pdf.text(test['name'])
+            pdf.y += 10
+            pdf.style(size=10, color=MUTED)
+            pdf.text(f"Created: {test['created_at']}")
+            pdf.y += 5
+            pdf.text(f"Main Metric: {test['metric']}")
+            pdf.y += 15
+
+        elif section == 'keyResults' and report:
+            heading('Key Results', 40)
+            increase = report['increase_percent'] or 0
+            pdf.style(size=12, color=SUCCESS if report['significance'] else DANGER)
+            pdf.text(f"Statistical Significance: {'Significant' if report['significance'] else 'Not Significant'}")
+            pdf.y += 8
+            pdf.style(color=SUCCESS if increase > 0 else DANGER if increase < 0 else MUTED)
+            pdf.text(f"Performance Change: {_signed_percent(increase)}")
+            pdf.y += 8
+            pdf.style(color=PRIMARY)
+            pdf.text(f"p-value: {_number(report['p_value'])}")
+            pdf.y += 15
+
+        elif section == 'executiveSummary' and report:
+            heading('Executive Summary', 30)
+            pdf.style(size=11)
+            paragraph(report['summary'] or 'No summary available.', 7)
+            pdf.y += 10
+
+        elif section == 'variantPerformance' and variants:
+            heading('Variant Performance', 40)
+            for variant in variants:
+                pdf.page_break(25)
+                pdf.style(size=12, bold=True)
+                pdf.text(variant['name'])
+                pdf.y += 7
+                pdf.style(size=10, bold=False)
+                pdf.text(f"Sessions: {variant['impressions']:,}", pdf.MARGIN + 5)
+                pdf.y += 5
+                pdf.text(f"Conversions: {variant['conversions']:,}", pdf.MARGIN + 5)
+                pdf.y += 5
+                pdf.text(f"Conversion Rate: {_number(variant['conversion_rate'])}%", pdf.MARGIN + 5)
+                pdf.y += 10
+
+        elif section == 'aiRecommendations' and _recommendation(report):
+            recommendation = _recommendation(report)
+            heading('Strategic Recommendations', 30)
+            pdf.style(size=10)
+            if isinstance(recommendation, dict):
+                pdf.style(bold=True)
+                paragraph(recommendation['decision'], 6)
+                pdf.y += 5
+                pdf.style(bold=False)
+                for topic in recommendation.get('topics') or []:
+                    pdf.page_break(15)
+                    pdf.style(bold=True)
+                    pdf.text(f"• {topic['title']}")
+                    pdf.y += 6
+                    pdf.style(bold=False)
+                    paragraph(topic['content'], 5, pdf.MARGIN + 5, content_width - 5)
+                    pdf.y += 3
+            else:
+                paragraph(recommendation, 6)
+            pdf.y += 10
+
+        elif section == 'statisticalDetails' and variants:
+            heading('Statistical Details', 30)
+            total_sessions = sum(variant['impressions'] for variant in variants)
+            total_conversions = sum(variant['conversions'] for variant in variants)
+            overall_rate = total_conversions / total_sessions * 100 if total_sessions else 0
+            significant = report and report['significance']
+            pdf.style(size=10)
+            for line in (f"Total Sessions: {total_sessions:,}",
+                         f"Total Conversions: {total_conversions:,}",
+                         f"Overall Conversion Rate: {overall_rate:.2f}%",
+                         f"Statistical Significance: {'Yes (p < 0.05)' if significant else 'No (p >= 0.05)'}"):
+                pdf.text(line)
+                pdf.y += 6
+
+    return pdf.save()
+
+
+def _add_text(slide, text, x, y, w, h, size, color='333333', bold=False, align=None, valign=None):
+    """Text box like PptxGenJS addText, positions in inches"""
+    frame = slide.shapes.add_textbox(Inches(x), Inches(y), Inches(w), Inches(h)).text_frame
+    frame.word_wrap = True
+    if valign == 'top':
+        frame.vertical_anchor = MSO_ANCHOR.TOP
+    paragraph = frame.paragraphs[0]
+    if align == 'center':
+        paragraph.alignment = PP_ALIGN.CENTER
+    run = paragraph.add_run()
+    run.text = text
+    run.font.size = Pt(size)
+    run.font.bold = bold
+    run.font.color.rgb = RGBColor.from_string(color)
+
+
+def _add_box(slide, x, y, w, h, color):
+    shape = slide.shapes.add_shape(MSO_SHAPE.RECTANGLE, Inches(x), Inches(y), Inches(w), Inches(h))
+    shape.fill.solid()
+    shape.fill.fore_color.rgb = RGBColor.from_string(color)
+    shape.line.fill.background()
+
+
+def _render_pptx(document, sections):
+    test, variants, report = document['test'], document['variants'], document['report']
+    colors = SLIDE_COLORS
+
+    presentation = Presentation()
+    # 16:9 like PptxGenJS
+    presentation.slide_width = Inches(10)
+    presentation.slide_height = Inches(5.625)
+    presentation.core_properties.author = 'AB Lizer'
+    presentation.core_properties.title = f"{test['name']} - Report"
+    blank = presentation.slide_layouts[6]
+
+    def new_slide(title=None):
+        slide = presentation.slides.add_slide(blank)
+        if title:
+            _add_text(slide, title, 0.5, 0.5, 9, 0.6, 32, colors['primary'], bold=True)
+        return slide
+
+    slide = new_slide()
+    slide.background.fill.solid()
+    slide.background.fill.fore_color.rgb = RGBColor.from_string(colors['primary'])
+    _add_text(slide, test['name'], 0.5, 2, 9, 1.5, 44, 'FFFFFF', bold=True, align='center')
+    _add_text(slide, 'A/B Test Results Report', 0.5, 3.5, 9, 0.5, 24, 'CCCCCC', align='center')
+    _add_text(slide, f"Created: {test['created_at']}", 0.5, 5, 9, 0.3, 14, 'AAAAAA', align='center')
+
+    for section in sections:
+        if section == 'keyResults' and report:
+            slide = new_slide('Key Results')
+            increase = report['increase_percent'] or 0
+            results = [
+                ('Statistical Significance', 'Significant' if report['significance'] else 'Not Significant',
+                 colors['success'] if report['significance'] else colors['danger']),
+                ('Performance Change', _signed_percent(increase),
+                 colors['success'] if increase > 0 else colors['danger']),
+                ('Confidence Level', f"p-value: {_number(report['p_value'])}", colors['primary'])
+            ]
+            for index, (title, value, color) in enumerate(results):
+                x = 0.5 + index * 3.2
+                _add_box(slide, x, 2, 3, 2, colors['light'])
+                _add_text(slide, title, x, 2.2, 3, 0.4, 14, '666666', align='center')
+                _add_text(slide, value, x, 2.8, 3, 0.8, 24, color, bold=True, align='center')
+
+        elif section == 'executiveSummary' and report:
+            slide = new_slide('Executive Summary')
+            _add_text(slide, report['summary'] or 'No summary available.', 0.5, 1.5, 9, 3.5, 16, valign='top')
+
+        elif section == 'variantPerformance' and variants:
+            slide = new_slide('Variant Performance')
+            for index, variant in enumerate(variants):
+                x = 0.5 + index * 4.7
+                _add_box(slide, x, 1.5, 4.3, 3, colors['light'])
+                _add_text(slide, variant['name'], x + 0.2, 1.7, 4, 0.5, 20, colors['primary'], bold=True)
+                _add_text(slide, f"Sessions: {variant['impressions']:,}", x + 0.2, 2.4, 4, 0.3, 14, '666666')
+                _add_text(slide, f"Conversions: {variant['conversions']:,}", x + 0.2, 2.8, 4, 0.3, 14, '666666')
+                _add_text(slide, f"Conversion Rate: {_number(variant['conversion_rate'])}%",
+                          x + 0.2, 3.6, 4, 0.5, 18, colors['accent'], bold=True)
+
+        elif section == 'aiRecommendations' and _recommendation(report):
+            recommendation = _recommendation(report)
+            slide = new_slide('Strategic Recommendations')
+            y = 1.5
+            if isinstance(recommendation, dict):
+                _add_text(slide, recommendation['decision'], 0.5, y, 9, 0.8, 16, colors['accent'], bold=True)
+                y += 1
+                for topic in (recommendation.get('topics') or [])[:3]:
+                    _add_text(slide, f"• {topic['title']}", 0.5, y, 9, 0.4, 14, colors['primary'], bold=True)
+                    y += 0.4
+                    _add_text(slide, topic['content'], 0.8, y, 8.7, 0.6, 12, '666666')
+                    y += 0.8
+            else:
+                _add_text(slide, recommendation, 0.5, y, 9, 3.5, 14, valign='top')
+
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def render_report(report_format, document, sections):
+    """
+    Render a report, in a worker process of the pool.
+
+    Args:
+        report_format: "pdf" or "pptx"
+        document: Dict with test, variants and report as returned by the test API
+        sections: Sections to render, from report_sections
+
+    Returns:
+        File content as bytes
+    """
+    if report_format == 'pdf':
+        return _render_pdf(document, sections)
+    return _render_pptx(document, sections)
+
+
+def check_renderer(report_format):
+    """Raise ExportError if the package rendering a format isn't installed"""
+    if report_format == 'pdf' and canvas is None:
+        raise ExportError("PDF export needs the reportlab package")
+    if report_format == 'pptx' and Presentation is None:
+        raise ExportError("PowerPoint export needs the python-pptx package")
+
+
+class ReportRenderer:
+    """Process pool rendering report exports, with a cache of the rendered files"""
+
+    def __init__(self):
+        self.workers = 0
+        self.cache = TTLCache()
+        # Jobs submitted to the pool and not rendered yet
+        self.pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, workers, ttl, maxsize):
+        """
+        Set the pool size and the cache.
+
+        Args:
+            workers: Worker processes (0 renders in the calling thread)
+            ttl: Seconds a rendered file stays cached (0 disables the cache)
+            maxsize: Number of rendered files kept
+        """
+        self.shutdown()
+        self.workers = workers
+        self.cache.configure(ttl=ttl, maxsize=maxsize)
+
+    def executor(self):
+        """The process pool, started on first use so forked app workers each get their own"""
+        with self._lock:
+            if self._executor is None:
+                # Not forked from the app process: its request and background threads may hold locks
+                # (logging, connection pools, sqlite) that would stay locked in the children
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    # The fork server imports the renderers once, so new pool workers start with them loaded
+                    context.set_forkserver_preload([__name__])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def reset(self):
+        """Forget a pool inherited from the parent process, it belongs to the parent"""
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def _discard(self, executor):
+        """Drop a broken pool, unless another thread replaced it already"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, report_format, document, sections):
+        """
+        Render one report, or get it from the cache.
+
+        Returns:
+            Tuple (fingerprint, content)
+        """
+        return self.render_many([(report_format, document, sections)])[0]
+
+    def render_many(self, jobs):
+        """
+        Render several reports in parallel, taking rendered ones from the cache.
+
+        Args:
+            jobs: List of (report_format, document, sections) tuples
+
+        Returns:
+            List of (fingerprint, content) tuples in the order of jobs
+
+        Raises:
+            RenderTimeoutError: A render took longer than RENDER_TIMEOUT
+            RenderPoolError: A worker process died, e.g. killed for its memory
+        """
+        for report_format in {job[0] for job in jobs}:
+            check_renderer(report_format)
+
+        fingerprints = []
+        rendered = {}
+        pending = {}
+        executor = None
+        try:
+            for report_format, document, sections in jobs:
+                fingerprint = export_fingerprint(document, report_format, sections, RENDER_VERSION)
+                fingerprints.append(fingerprint)
+                if fingerprint in rendered or fingerprint in pending:
+                    continue
+
+                content = self.cache.get(fingerprint)
+                if content is not MISSING:
+                    rendered[fingerprint] = content
+                elif self.workers > 0:
+                    executor = executor or self.executor()
+                    pending[fingerprint] = executor.submit(render_report, report_format, document, sections)
+                    self._count_pending(1)
+                else:
+                    rendered[fingerprint] = render_report(report_format, document, sections)
+                    self.cache.set(fingerprint, rendered[fingerprint])
+
+            for fingerprint, future in pending.items():
+                rendered[fingerprint] = future.result(timeout=RENDER_TIMEOUT)
+                self.cache.set(fingerprint, rendered[fingerprint])
+        except FuturesTimeoutError:
+            raise RenderTimeoutError(f"Rendering a report took longer than {RENDER_TIMEOUT} seconds") from None
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise RenderPoolError("The report renderer stopped, try again") from None
+        finally:
+            # Renders of a failed export that haven't started are dropped
+            for future in pending.values():
+                future.cancel()
+            self._count_pending(-len(pending))
+
+        return [(fingerprint, rendered[fingerprint]) for fingerprint in fingerprints]
+
+    def _count_pending(self, count):
+        if count:
+            with self._lock:
+                self.pending += count
+
+
+# Renderer of this process, configured by the app
+report_renderer = ReportRenderer()
@@ -0,0 +1,90 @@
+"""
+Versioned cache of rendered responses.
+
+Every company has a version number in the company_versions table. DBManager
+bumps it after every write that changes what the company's pages show: its
+tests, variants, reports, users or settings (and the analytics snapshots after
+patching, since some responses are computed from them). Cached responses are
+keyed by route, path, user, company and version, so a write makes all cached
+responses of its company unreachable at once; they drop out of the LRU or
+expire after the TTL.
+
+Versions are read from the database and kept for version_ttl seconds per
+process. A write in this process updates the kept version right away, writes in
+other worker processes become visible within version_ttl seconds.
+
+The cached body also determines the strong ETag of the response, so repeat
+requests with If-None-Match get 304 Not Modified without rendering anything.
+"""
+import hashlib
+
+from data.cache import MISSING, TTLCache
+
+
+class ResponseCache:
+    """Rendered responses and company versions of this process"""
+
+    def __init__(self):
+        self.responses = TTLCache()
+        self.versions = TTLCache()
+        self.loader = None
+
+    @property
+    def enabled(self):
+        return self.loader is not None and self.responses.enabled
+
+    def configure(self, ttl, maxsize, version_ttl, loader):
+        """
+        Enable the cache.
+
+        Args:
+            ttl: Seconds a response stays cached (0 disables the cache)
+            maxsize: Number of responses kept
+            version_ttl: Seconds a company version read from the database is reused
+            loader: Callable returning the current version of a company,
+                e.g. DBManager.get_company_version
+        """
+        self.responses.configure(ttl=ttl, maxsize=maxsize)
+        self.versions.configure(ttl=version_ttl, maxsize=maxsize)
+        self.loader = loader
+
+    def version(self, company_id):
+        """Current version of a company's data"""
+        version = self.versions.get(int(company_id))
+        if version is MISSING:
+            version = self.loader(company_id)
+            self.versions.set(int(company_id), version)
+        return version
+
+    def set_version(self, company_id, version):
+        """Remember a version this process just wrote"""
+        self.versions.set(int(company_id), version)
+
+    def get(self, key):
+        """
+        Get a cached response.
+
+        Returns:
+            Tuple (etag, body, mimetype), or MISSING
+        """
+        return self.responses.get(key)
+
+    def set(self, key, body, mimetype):
+        """
+        Cache a response body.
+
+        Returns:
+            Tuple (etag, body, mimetype) as returned by get()
+        """
+        entry = (response_etag(body), body, mimetype)
+        self.responses.set(key, entry)
+        return entry
+
+
+def response_etag(body):
+    """Strong ETag of a response body"""
+    return hashlib.sha1(body).hexdigest()
+
+
+# Response cache of this process, configured by the app
+response_cache = ResponseCache()
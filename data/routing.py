@@ -0,0 +1,79 @@
+"""
+Session that picks the database of every statement.
+
+- Statements on sharded tables go to the shard of the current company
+  (data/sharding.py).
+- SELECTs of read-only requests go to the read replica (data/replica.py) until
+  the session writes something, so a request always reads its own writes.
+- Everything else uses the primary database.
+"""
+import sqlalchemy as sa
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+from data.replica import replica_router
+from data.sharding import SHARDED_TABLES, GLOBAL_ID_TABLES, shard_router
+
+
+def _statement_tables(mapper, clause):
+    """Names of the tables a statement touches, as far as they can be found"""
+    if mapper is not None:
+        return {sa.inspect(mapper).local_table.name}
+    if isinstance(clause, sa.Table):
+        return {clause.name}
+    if isinstance(clause, sa.UpdateBase) and isinstance(clause.table, sa.Table):
+        return {clause.table.name}
+    if isinstance(clause, sa.Select):
+        return {table.name for table in clause.get_final_froms() if isinstance(table, sa.Table)}
+    return set()
+
+
+class RoutingSession(Session):
+    """Session that routes statements to shards, the read replica or the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+
+        if isinstance(clause, sa.UpdateBase):
+            self.info['wrote'] = True
+
+        if shard_router.enabled:
+            tables = _statement_tables(mapper, clause)
+            # Raw SQL without tables (text()) follows the current shard when one is selected
+            shard = shard_router.current_shard() if tables & set(SHARDED_TABLES) or not tables else None
+            if tables & set(SHARDED_TABLES) or shard is not None:
+                if shard is None:
+                    raise RuntimeError(f"No company selected for a query on {', '.join(sorted(tables)) or 'a shard'}")
+                return shard_router.engine(shard)
+
+        if self._reads_replica(clause):
+            return replica_router.engine
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_replica(self, clause):
+        return (replica_router.enabled
+                and isinstance(clause, sa.Select)
+                and not self._flushing
+                and not self.info.get('wrote')
+                and has_app_context()
+                and g.get('read_replica', False))
+
+
+@sa.event.listens_for(RoutingSession, 'before_flush')
+def _assign_global_ids(session, flush_context, instances):
+    """Give new tests, variants and reports an ID from the catalog before they are inserted"""
+    if not shard_router.enabled:
+        return
+
+    for obj in session.new:
+        table_name = getattr(obj, '__tablename__', None)
+        if table_name in GLOBAL_ID_TABLES and obj.id is None:
+            obj.id = shard_router.next_id(table_name)
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    """Remember that the session wrote, so its later reads use the primary"""
+    session.info['wrote'] = True
@@ -0,0 +1,110 @@
+"""
+Full-text search over tests and their reports.
+
+test_search is an SQLite FTS5 table with one row per test (rowid = test ID)
+holding the test's name, description and metric and its report's summary and
+AI recommendation. It lives next to ab_tests, in the main database or in the
+test's shard, and is created together with ab_tests (see models.py).
+
+DBManager keeps it in sync: every method that writes tests or reports reindexes
+the affected tests in the same transaction. Triggers can't be used because the
+recommendation is stored compressed (data/recommendations.py). Soft-deleted
+tests are removed from the index right away.
+
+Every query word is a prefix term and results are ranked with bm25, the test
+name weighing most. The company ID is an indexed column and part of every
+query, so FTS5 only visits the company's tests and a search costs as much as
+the company has tests, not the whole table. Its bm25 weight is 0: every test
+of a company has the same single company term, so it would not change the
+order anyway.
+"""
+import re
+
+CREATE_SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS test_search USING fts5(
+        name, description, metric, summary, recommendation, company_id,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+# Columns of test_search in order, their bm25 weights, and the columns query words are looked up in
+SEARCH_COLUMNS = ('name', 'description', 'metric', 'summary', 'recommendation', 'company_id')
+RANK_WEIGHTS = (10.0, 3.0, 5.0, 2.0, 1.0, 0.0)
+TEXT_COLUMNS = SEARCH_COLUMNS[:-1]
+
+# Markers around matches in snippets, control characters that don't occur in test text
+HIGHLIGHT_OPEN = '\x02'
+HIGHLIGHT_CLOSE = '\x03'
+
+# Columns a snippet is taken from, the first one with a match wins
+SNIPPET_COLUMNS = ('summary', 'recommendation', 'description', 'metric', 'name')
+
+SEARCH_QUERY = f"""
+    SELECT rowid AS test_id,
+           rank,
+           {', '.join(f"snippet(test_search, {SEARCH_COLUMNS.index(column)}, :open, :close, '…', 12) AS {column}"
+                      for column in SNIPPET_COLUMNS)}
+    FROM test_search
+    WHERE test_search MATCH :query
+      AND rank MATCH 'bm25({', '.join(str(weight) for weight in RANK_WEIGHTS)})'
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+# Words of a query, FTS5 operators and quotes in user input are ignored
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+# Shorter words only match whole words, as a prefix they would match most tests
+MIN_PREFIX_LENGTH = 2
+
+
+def build_match_query(text, company_id):
+    """
+    Turn user input into an FTS5 query over a company's tests.
+
+    Every word must match, as a prefix, in one of the text columns.
+
+    Returns:
+        FTS5 query string, or None if the input has no words
+    """
+    terms = _TERM.findall(text or '')
+    if not terms:
+        return None
+    words = ' AND '.join(f'"{term}"*' if len(term) >= MIN_PREFIX_LENGTH else f'"{term}"' for term in terms)
+    return f'company_id : "{int(company_id)}" AND {{{" ".join(TEXT_COLUMNS)}}} : ({words})'
+
+
+def recommendation_text(recommendation):
+    """Plain text of a structured or text recommendation"""
+    if not recommendation:
+        return ''
+    if isinstance(recommendation, dict):
+        parts = [recommendation.get('decision') or '']
+        for topic in recommendation.get('topics') or []:
+            parts.append(topic.get('title') or '')
+            parts.append(topic.get('content') or '')
+        return '\n'.join(part for part in parts if part)
+    return str(recommendation)
+
+
+def search_row(test_id, company_id, name, description, metric, summary=None, recommendation=None):
+    """Values of the test_search row of a test"""
+    return {
+        'test_id': test_id,
+        'company_id': company_id,
+        'name': name or '',
+        'description': description or '',
+        'metric': metric or '',
+        'summary': summary or '',
+        'recommendation': recommendation_text(recommendation)
+    }
+
+
+def best_snippet(hit):
+    """Snippet of the first column of SNIPPET_COLUMNS with a match in a SEARCH_QUERY row"""
+    for column in SNIPPET_COLUMNS:
+        snippet = getattr(hit, column)
+        if snippet and HIGHLIGHT_OPEN in snippet:
+            return snippet
+    return hit.name
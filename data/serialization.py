@@ -0,0 +1,90 @@
+"""
+Fast JSON encoding for API responses and data embedded in pages.
+
+dumps() encodes with orjson when it is installed, which writes UTF-8 bytes
+directly from C, and falls back to the json module otherwise. Both encode the
+types JSON has no notation for the way Flask's default provider does: dates
+and datetimes as HTTP dates, Decimal and UUID as strings, dataclasses and
+objects with __html__ as their content. In addition, numpy values, sets and
+any mapping are encoded, so SQLAlchemy RowMapping rows (query(...).mappings())
+can be passed as they are instead of being copied into dicts first.
+
+FastJSONProvider makes Flask use it for jsonify and the tojson template filter.
+Keys stay sorted like in Flask's default provider, so responses are byte-stable
+for ETags. Unlike the default provider, non-ASCII text is written as UTF-8
+rather than \\u escapes.
+"""
+import dataclasses
+import json
+from collections.abc import Mapping
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def default(value):
+    """Encode values the encoders don't support natively, raise TypeError for unknown types"""
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    if hasattr(value, 'tolist'):
+        # numpy arrays and scalars without orjson
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value, sort_keys=True):
+    """
+    Encode a value as compact JSON.
+
+    Returns:
+        UTF-8 bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=default,
+                            option=ORJSON_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else ORJSON_OPTIONS)
+    return json.dumps(value, default=default, sort_keys=sort_keys, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding with dumps(), pretty-printed output still uses the json module"""
+
+    default = staticmethod(default)
+
+    def dumps(self, obj, **kwargs):
+        if set(kwargs) <= {'sort_keys'}:
+            return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, sort_keys=self.sort_keys) + b"\n", mimetype=self.mimetype)
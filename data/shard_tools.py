@@ -0,0 +1,216 @@
+"""
+Tools to split the main database into shards and to move companies between them.
+
+Run them with the app stopped (see the "flask shards" commands): every process
+caches the company -> shard map and would keep routing a moved company to its
+old shard until restarted.
+"""
+import sqlalchemy as sa
+
+from data.models import db
+from data.sharding import SHARDED_TABLES, GLOBAL_ID_TABLES, shard_router
+
+# Rows copied per INSERT batch
+COPY_BATCH_ROWS = 5000
+
+
+def _tables():
+    return [db.metadata.tables[name] for name in SHARDED_TABLES]
+
+
+def _company_rows(table, company_id):
+    """Select the rows of a sharded table that belong to a company"""
+    tests = db.metadata.tables['ab_tests']
+    if table is tests:
+        return sa.select(table).where(table.c.company_id == company_id)
+    return sa.select(table).where(
+        table.c.test_id.in_(sa.select(tests.c.id).where(tests.c.company_id == company_id)))
+
+
+def _delete_company(conn, company_id):
+    tests = db.metadata.tables['ab_tests']
+    company_tests = sa.select(tests.c.id).where(tests.c.company_id == company_id)
+    conn.execute(sa.text("DELETE FROM test_search WHERE company_id = :company_id"), {'company_id': company_id})
+    # Children first, the tests last
+    for table in reversed(_tables()):
+        if table is tests:
+            conn.execute(sa.delete(table).where(table.c.company_id == company_id))
+        else:
+            conn.execute(sa.delete(table).where(table.c.test_id.in_(company_tests)))
+
+
+def _copy_company(source, target, company_id):
+    """
+    Copy a company's rows from one engine to another in one target transaction.
+
+    Rows left in the target by an interrupted earlier copy are removed first.
+    Snapshot IDs are only used inside a shard, so they are assigned again.
+    The company's rows of the full-text index are copied along.
+    Values are copied as stored, without type conversion, so timestamps keep
+    their exact text.
+    """
+    with source.connect() as source_conn, target.begin() as target_conn:
+        _delete_company(target_conn, company_id)
+        for table in _tables():
+            columns = [column.name for column in table.columns
+                       if not (table.name not in GLOBAL_ID_TABLES and column.primary_key)]
+            result = source_conn.execute(_company_rows(table, company_id).with_only_columns(
+                *[sa.type_coerce(table.c[name], sa.types.NullType()).label(name) for name in columns]
+            )).mappings()
+            statement = sa.text(f"INSERT INTO {table.name} ({', '.join(columns)}) "
+                                f"VALUES ({', '.join(':' + name for name in columns)})")
+            while True:
+                rows = result.fetchmany(COPY_BATCH_ROWS)
+                if not rows:
+                    break
+                target_conn.execute(statement, [dict(row) for row in rows])
+
+        # The full-text index rows of the company's tests (data/search.py)
+        result = source_conn.execute(sa.text(
+            "SELECT rowid AS test_id, company_id, name, description, metric, summary, recommendation "
+            "FROM test_search WHERE company_id = :company_id"), {'company_id': company_id}).mappings()
+        statement = sa.text("INSERT INTO test_search (rowid, company_id, name, description, metric, summary, "
+                            "recommendation) VALUES (:test_id, :company_id, :name, :description, :metric, "
+                            ":summary, :recommendation)")
+        while True:
+            rows = result.fetchmany(COPY_BATCH_ROWS)
+            if not rows:
+                break
+            target_conn.execute(statement, [dict(row) for row in rows])
+
+
+def _create_shard(shard):
+    engine = shard_router.engine(shard)
+    db.metadata.create_all(engine, tables=_tables())
+    return engine
+
+
+def _company_loads(engine):
+    """Number of tests per company stored in an engine"""
+    tests = db.metadata.tables['ab_tests']
+    with engine.connect() as conn:
+        rows = conn.execute(sa.select(tests.c.company_id, sa.func.count())
+                            .group_by(tests.c.company_id)).all()
+    return {company_id: count for company_id, count in rows}
+
+
+def split_database(shard_count, drop_source=False):
+    """
+    Split the tests of all companies in the main database into shards.
+
+    Companies are spread by number of tests, largest first onto the emptiest
+    shard. The ID sequences start after the highest existing IDs.
+
+    Args:
+        shard_count: Number of shards to create
+        drop_source: Delete the copied rows from the main database afterwards
+
+    Returns:
+        Dict mapping company_id to shard name
+    """
+    catalog = db.engine
+    db.metadata.create_all(catalog, tables=[db.metadata.tables['company_shards'],
+                                            db.metadata.tables['id_sequences']])
+
+    with catalog.connect() as conn:
+        if conn.execute(sa.text("SELECT COUNT(*) FROM company_shards")).scalar():
+            raise ValueError("The database is already split. Use rebalance to change the shards")
+        company_ids = conn.execute(sa.text("SELECT id FROM companies")).scalars().all()
+
+    loads = _company_loads(catalog)
+    shards = {f'shard_{index}': 0 for index in range(shard_count)}
+    assignment = {}
+    for company_id in sorted(company_ids, key=lambda company_id: -loads.get(company_id, 0)):
+        shard = min(shards, key=lambda name: (shards[name], name))
+        assignment[company_id] = shard
+        shards[shard] += loads.get(company_id, 0)
+
+    for shard in shards:
+        _create_shard(shard)
+
+    for company_id, shard in assignment.items():
+        print(f"Copying company {company_id} ({loads.get(company_id, 0)} tests) to {shard}...")
+        _copy_company(catalog, shard_router.engine(shard), company_id)
+
+    with catalog.begin() as conn:
+        for table_name in GLOBAL_ID_TABLES:
+            next_id = conn.execute(sa.text(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table_name}")).scalar()
+            conn.execute(sa.text("INSERT OR REPLACE INTO id_sequences (table_name, next_id) VALUES (:table_name, :next_id)"),
+                         {'table_name': table_name, 'next_id': next_id})
+        conn.execute(sa.text("INSERT INTO company_shards (company_id, shard) VALUES (:company_id, :shard)"),
+                     [{'company_id': company_id, 'shard': shard} for company_id, shard in assignment.items()])
+        if drop_source:
+            conn.execute(sa.text("DELETE FROM test_search"))
+            for table in reversed(_tables()):
+                conn.execute(sa.delete(table))
+
+    shard_router.reload()
+    return assignment
+
+
+def move_company(company_id, target):
+    """
+    Move the tests of a company to another shard.
+
+    The rows are copied first, then the company is switched to the target in
+    the catalog and only then removed from the old shard.
+
+    Returns:
+        True if the company was moved, False if it already is on the target
+    """
+    source = shard_router.shard_for(company_id)
+    if source == target:
+        return False
+
+    target_engine = _create_shard(target)
+    _copy_company(shard_router.engine(source), target_engine, company_id)
+
+    with shard_router.catalog.begin() as conn:
+        conn.execute(sa.text("UPDATE company_shards SET shard = :shard WHERE company_id = :company_id"),
+                     {'shard': target, 'company_id': company_id})
+    shard_router.reload()
+
+    with shard_router.engine(source).begin() as conn:
+        _delete_company(conn, company_id)
+    return True
+
+
+def rebalance(shard_count=None):
+    """
+    Even out the number of tests per shard, optionally adding shards first.
+
+    Repeatedly moves the largest company from the fullest shard to the emptiest
+    one whose move narrows the gap between them.
+
+    Args:
+        shard_count: Total number of shards wanted, more than today adds empty shards
+
+    Returns:
+        List of (company_id, from shard, to shard) moves made
+    """
+    shards = shard_router.shards()
+    for index in range(len(shards), shard_count or 0):
+        name = f'shard_{index}'
+        while name in shards:
+            index += 1
+            name = f'shard_{index}'
+        _create_shard(name)
+        shards.append(name)
+
+    company_loads = {shard: _company_loads(shard_router.engine(shard)) for shard in shards}
+    moves = []
+    while True:
+        totals = {shard: sum(loads.values()) for shard, loads in company_loads.items()}
+        fullest = max(totals, key=totals.get)
+        emptiest = min(totals, key=totals.get)
+        gap = totals[fullest] - totals[emptiest]
+
+        movable = [(load, company_id) for company_id, load in company_loads[fullest].items() if 0 < load < gap]
+        if not movable:
+            return moves
+
+        load, company_id = max(movable)
+        print(f"Moving company {company_id} ({load} tests) from {fullest} to {emptiest}...")
+        move_company(company_id, emptiest)
+        company_loads[emptiest][company_id] = company_loads[fullest].pop(company_id)
+        moves.append((company_id, fullest, emptiest))
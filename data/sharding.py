@@ -0,0 +1,179 @@
+"""
+Optional per-company sharding of the test tables.
+
+In sharded mode the main database only holds the catalog (users, companies and
+the company -> shard map). Tests, variants, reports and variant snapshots of a
+company live in the SQLite file of its shard, so companies on different shards
+no longer wait on each other's write lock.
+
+Routing happens in RoutingSession.get_bind (data/routing.py): statements on
+sharded tables go to the shard of the current company. The company is set either for a block of code
+with shard_router.company(company_id), which DBManager does for every method
+taking a company_id, or for a whole request with shard_router.use_company(),
+which the app does for the logged-in user.
+
+IDs of tests, variants and reports stay unique across all shards: they are
+handed out in blocks from the id_sequences table of the catalog, so companies
+can be moved between shards without renumbering. The tools to split the main
+database into shards and to rebalance them are in data/shard_tools.py.
+"""
+import contextlib
+import contextvars
+import os
+import threading
+
+import sqlalchemy as sa
+from flask import g, has_app_context
+
+SHARDED_TABLES = ('ab_tests', 'variants', 'reports', 'variant_snapshots')
+
+# Tables whose IDs are referenced by other tables and URLs, so they must be unique across shards
+GLOBAL_ID_TABLES = ('ab_tests', 'variants', 'reports')
+
+# IDs reserved from the catalog at a time
+ID_BLOCK_SIZE = 100
+
+# Shard explicitly selected for the current block of code
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+class ShardRouter:
+    """Maps companies to shards and hands out engines and IDs"""
+
+    def __init__(self):
+        self.directory = None
+        self.catalog = None
+        self._engines = {}
+        self._shard_map = None
+        self._id_blocks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def configure(self, directory, catalog):
+        """
+        Enable sharded mode.
+
+        Args:
+            directory: Directory of the shard files (<shard>.db)
+            catalog: Engine of the main database holding the catalog tables
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.catalog = catalog
+        self.reload()
+
+    def engines(self):
+        """Engines of the shards opened so far"""
+        with self._lock:
+            return list(self._engines.values())
+
+    def reload(self):
+        """Forget the cached company -> shard map, e.g. after companies were moved"""
+        with self._lock:
+            self._shard_map = None
+
+    def shard_map(self):
+        with self._lock:
+            if self._shard_map is None:
+                with self.catalog.connect() as conn:
+                    rows = conn.execute(sa.text("SELECT company_id, shard FROM company_shards")).all()
+                self._shard_map = {company_id: shard for company_id, shard in rows}
+            return self._shard_map
+
+    def shards(self):
+        """Names of all shards, from the shard files and the shard map"""
+        names = {name[:-3] for name in os.listdir(self.directory) if name.endswith('.db')}
+        return sorted(names | set(self.shard_map().values()))
+
+    def shard_for(self, company_id):
+        """Get the shard of a company, assigning new companies to the shard with the fewest companies"""
+        company_id = int(company_id)
+        shard = self.shard_map().get(company_id)
+        if shard is not None:
+            return shard
+
+        counts = {name: 0 for name in self.shards()}
+        if not counts:
+            raise RuntimeError("No shards configured. Run: flask shards split")
+        for assigned in self.shard_map().values():
+            counts[assigned] = counts.get(assigned, 0) + 1
+        shard = min(counts, key=lambda name: (counts[name], name))
+
+        with self.catalog.begin() as conn:
+            conn.execute(sa.text("INSERT OR IGNORE INTO company_shards (company_id, shard) VALUES (:company_id, :shard)"),
+                         {'company_id': company_id, 'shard': shard})
+            shard = conn.execute(sa.text("SELECT shard FROM company_shards WHERE company_id = :company_id"),
+                                 {'company_id': company_id}).scalar()
+        self.reload()
+        return shard
+
+    def engine(self, shard):
+        with self._lock:
+            engine = self._engines.get(shard)
+            if engine is None:
+                path = os.path.join(self.directory, f'{shard}.db')
+                engine = sa.create_engine(f'sqlite:///{path}')
+                self._engines[shard] = engine
+            return engine
+
+    @contextlib.contextmanager
+    def company(self, company_id):
+        """Route sharded statements in the block to the shard of a company"""
+        if not self.enabled or company_id is None:
+            yield
+            return
+
+        with self.shard(self.shard_for(company_id)):
+            yield
+
+    @contextlib.contextmanager
+    def shard(self, shard):
+        """Route sharded statements in the block to a shard"""
+        token = _current_shard.set(shard)
+        try:
+            yield
+        finally:
+            _current_shard.reset(token)
+
+    def use_company(self, company_id):
+        """Route sharded statements of the current app context to the shard of a company"""
+        g.shard_company_id = int(company_id)
+
+    def current_shard(self):
+        shard = _current_shard.get()
+        if shard is None and has_app_context() and g.get('shard_company_id') is not None:
+            shard = self.shard_for(g.shard_company_id)
+        return shard
+
+    def next_id(self, table_name):
+        """Get a new ID for a row of a table in GLOBAL_ID_TABLES"""
+        return self.allocate_ids(table_name, 1)[0]
+
+    def allocate_ids(self, table_name, count):
+        """Get count new IDs for rows of a table in GLOBAL_ID_TABLES"""
+        ids = []
+        with self._lock:
+            block = self._id_blocks.get(table_name)
+            while len(ids) < count:
+                if block is None or block[0] >= block[1]:
+                    size = max(ID_BLOCK_SIZE, count - len(ids))
+                    with self.catalog.begin() as conn:
+                        end = conn.execute(sa.text(
+                            "UPDATE id_sequences SET next_id = next_id + :size "
+                            "WHERE table_name = :table_name RETURNING next_id"),
+                            {'size': size, 'table_name': table_name}).scalar()
+                    if end is None:
+                        raise RuntimeError(f"No ID sequence for {table_name}. Run: flask shards split")
+                    block = [end - size, end]
+                take = min(count - len(ids), block[1] - block[0])
+                ids.extend(range(block[0], block[0] + take))
+                block[0] += take
+            self._id_blocks[table_name] = block
+        return ids
+
+
+# Router of this process, configured by the app
+shard_router = ShardRouter()
@@ -0,0 +1,65 @@
+"""
+gunicorn settings, start the app with
+
+    APP_ENV=production gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is preloaded in the master process, so workers are forked with the
+code and templates already imported. Every worker then drops the database
+connections, LLM clients and render pool it inherited (init_worker in app.py)
+and starts its own background threads. Send HUP to replace the workers
+gracefully with the same code, or USR2 followed by QUIT to the old master to
+load new code without dropping requests.
+
+The workers write their Prometheus metrics to PROMETHEUS_MULTIPROC_DIR, which
+is emptied when the server starts, so /metrics returns the totals of all
+workers (see utils/metrics.py).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Set before the app imports prometheus_client, which decides on import where its values live
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'ab-lizer-metrics'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads per worker, requests mostly wait on SQLite and the LLM APIs, and every open
+# live dashboard holds one (at most LIVE_MAX_STREAMS, so keep it below this)
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+preload_app = True
+# Seconds a request may take (AI generation is the slowest) and workers get to finish theirs on reload
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Replace workers after this many requests, the jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+
+def on_starting(server):
+    # Metrics files of a previous run would be added to this one's, this runs after the app was preloaded
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    from wsgi import app
+    init_worker(app)
+
+
+def worker_exit(server, worker):
+    from app import shutdown_worker
+    shutdown_worker()
+
+
+def child_exit(server, worker):
+    from utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
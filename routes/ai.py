@@ -5,13 +5,19 @@ from pydantic import BaseModel, Field
 
 # Import LLM configuration
 from routes.llm_config import get_llm_instance, get_default_model
-from data.db_manager import DBManager
+from data.db_manager import db_manager
+from utils.instrumentation import timed_llm
 
 # Load .env file
 load_dotenv()
 
-# Initialize DB manager for user lookups
-db_manager = DBManager()
+# Version of the recommendation and summary prompts, part of the report fingerprint
+# (data/fingerprints.py). Bump it when a prompt changes so existing reports get regenerated.
+PROMPT_VERSION = 1
+
+# Decision and summary returned when generation fails, such reports are regenerated on the next edit
+RECOMMENDATION_ERROR = "Error generating recommendation"
+SUMMARY_ERROR = "Error generating summary. Please try again."
 
 
 # ================================================================
@@ -42,6 +48,25 @@ class AIRecommendation(BaseModel):
 # HELPER FUNCTION TO GET USER'S LLM
 # ================================================================
 
+def get_user_model_id(user_id: int):
+    """
+    Get the model ID selected by a user.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        model_id of the user's settings, or the default model
+
+    Raises:
+        ValueError: If user not found
+    """
+    user = db_manager.get_user(user_id)
+    if not user:
+        raise ValueError(f"User not found: {user_id}")
+    return user.llm_model or get_default_model()
+
+
 def _get_user_llm(user_id: int):
     """
     Get the LLM instance for a specific user based on their settings.
@@ -50,25 +75,21 @@ def _get_user_llm(user_id: int):
         user_id: User ID
 
     Returns:
-        Initialized LangChain chat model instance
+        Tuple (model_id, initialized LangChain chat model instance)
 
     Raises:
         ValueError: If user not found or LLM initialization fails
     """
     try:
-        user = db_manager.get_user(user_id)
-        if not user:
-            raise ValueError(f"User not found: {user_id}")
-
-        model_id = user.llm_model or get_default_model()
-        return get_llm_instance(model_id)
+        model_id = get_user_model_id(user_id)
+        return model_id, get_llm_instance(model_id)
 
     except Exception as e:
         print(f"Error getting user LLM: {str(e)}")
         # Fallback to default model
         print("Falling back to default model")
         default_model = get_default_model()
-        return get_llm_instance(default_model)
+        return default_model, get_llm_instance(default_model)
 
 
 # ================================================================
@@ -91,7 +112,7 @@ def generate_ai_recommendation(test_data, report_data, company_data, user_id):
     print(f"Generating AI recommendation for user {user_id}...")
 
     # Get user's selected LLM
-    llm = _get_user_llm(user_id)
+    model_id, llm = _get_user_llm(user_id)
 
     # Format statistical data
     method_name = report_data.get('method', 'statistical test')
@@ -159,10 +180,11 @@ Provide your structured recommendation with exactly 5 topics."""
         llm_with_structure = llm.with_structured_output(AIRecommendation)
 
         # Generate recommendation
-        response = llm_with_structure.invoke([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ])
+        with timed_llm(model_id):
+            response = llm_with_structure.invoke([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ])
 
         # Convert Pydantic model to dict
         recommendation_dict = {
@@ -193,7 +215,7 @@ Provide your structured recommendation with exactly 5 topics."""
         significance = 'Yes' if report_data.get('significant') else 'No'
 
         return {
-            "decision": "Error generating recommendation",
+            "decision": RECOMMENDATION_ERROR,
             "topics": [
                 {
                     "title": "Error",
@@ -262,7 +284,7 @@ def generate_ai_summary(recommendation, user_id):
 
     try:
         # Get user's selected LLM
-        llm = _get_user_llm(user_id)
+        model_id, llm = _get_user_llm(user_id)
 
         # Format recommendation for summary generation
         if isinstance(recommendation, dict):
@@ -301,17 +323,18 @@ EXAMPLES:
 Summary:"""
 
         # Use unified LangChain interface
-        response = llm.invoke([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ])
+        with timed_llm(model_id):
+            response = llm.invoke([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ])
 
         print("AI summary generated!")
         return response.content
 
     except Exception as e:
         print(f"Error generating summary: {str(e)}")
-        return "Error generating summary. Please try again."
+        return SUMMARY_ERROR
 
 
 def generate_test_description(test_name, user_id):
@@ -329,7 +352,7 @@ def generate_test_description(test_name, user_id):
 
     try:
         # Get user's selected LLM
-        llm = _get_user_llm(user_id)
+        model_id, llm = _get_user_llm(user_id)
 
         system_prompt = """You are an AB Testing assistant that helps create clear and concise test descriptions.
 
@@ -348,10 +371,11 @@ def generate_test_description(test_name, user_id):
         user_prompt = f"""Generate a clear description for an AB test with this name: {test_name}"""
 
         # Use unified LangChain interface
-        response = llm.invoke([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ])
+        with timed_llm(model_id):
+            response = llm.invoke([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ])
 
         print("Test description generated!")
         return response.content
@@ -2,7 +2,12 @@
 LLM Configuration Module
 
 Provides unified interface for managing multiple LLM providers (OpenAI, Anthropic, Google).
+
+LLM clients hold HTTP connection pools, so they are created once per process
+and reused. reset_llm_clients() drops the clients a worker process inherited
+from its parent when it was forked, their connections belong to the parent.
 """
+import threading
 from typing import Dict, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
@@ -82,10 +87,14 @@ PROVIDER_API_KEYS = {
     'google': 'GOOGLE_API_KEY',
 }
 
+# LLM clients of this process by model_id
+_clients = {}
+_clients_lock = threading.Lock()
+
 
 def get_llm_instance(model_id: str):
     """
-    Get initialized LLM instance for the specified model.
+    Get initialized LLM instance for the specified model, shared by the threads of this process.
 
     Args:
         model_id: Model identifier (e.g., 'openai-gpt-4o-mini')
@@ -114,8 +123,18 @@ def get_llm_instance(model_id: str):
             f"Please add it to your .env file to use {display_name}."
         )
 
-    # Initialize and return the LLM instance
-    return provider_class(**config)
+    # Initialize the LLM instance on first use
+    with _clients_lock:
+        if model_id not in _clients:
+            _clients[model_id] = provider_class(**config)
+        return _clients[model_id]
+
+
+def reset_llm_clients():
+    """Forget the LLM clients of this process, e.g. those inherited from the parent after a fork"""
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
 
 
 def get_available_models() -> Dict[str, Tuple[str, str]]:
@@ -1,7 +1,9 @@
 /**
  * Analysis Charts
  *
- * Creates interactive Chart.js visualizations for AB test analysis
+ * Creates interactive Chart.js visualizations for AB test analysis.
+ * The points of the distribution and Q-Q charts are precomputed by the server
+ * (data/analysis.py) and fetched once from the analysis endpoint.
  */
 
 document.addEventListener('DOMContentLoaded', function() {
@@ -27,6 +29,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Sample Size Distribution Chart
     createSampleSizeChart();
 
+    // Daily Trend Chart
+    createTrendChart();
+
     // Normal Distribution Chart
     if (analysisData && analysisData.distribution_data) {
         createNormalDistributionChart();
@@ -34,6 +39,19 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Analysis payloads by URL, so the charts sharing one are fetched once
+const analysisPayloads = {};
+
+function loadAnalysisPayload(url) {
+    if (!analysisPayloads[url]) {
+        analysisPayloads[url] = fetch(url).then(response => {
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            return response.json();
+        });
+    }
+    return analysisPayloads[url];
+}
+
 function createConversionRateChart() {
     const ctx = document.getElementById('conversionRateChart');
     if (!ctx) return;
@@ -211,57 +229,25 @@ function createSampleSizeChart() {
     });
 }
 
-function createNormalDistributionChart() {
+async function createNormalDistributionChart() {
     const ctx = document.getElementById('normalDistributionChart');
     if (!ctx) return;
 
-    const distData = analysisData.distribution_data;
-    const variantA = distData.variant_a;
-    const variantB = distData.variant_b;
-
-    // Calculate normal distribution for both variants
-    function normalDistribution(x, mean, stdError) {
-        const variance = stdError * stdError;
-        return (1 / Math.sqrt(2 * Math.PI * variance)) *
-               Math.exp(-Math.pow(x - mean, 2) / (2 * variance));
-    }
-
-    // Generate x values (conversion rates from 0 to max + buffer)
-    const maxRate = Math.max(variantA.ci_upper, variantB.ci_upper);
-    const minRate = Math.min(variantA.ci_lower, variantB.ci_lower);
-    const buffer = (maxRate - minRate) * 0.3;
-    const xMin = Math.max(0, minRate - buffer);
-    const xMax = Math.min(1, maxRate + buffer);
-    const numPoints = 200;
-    const step = (xMax - xMin) / numPoints;
-
-    // Generate data points for Variant A
-    const dataA = [];
-    const ciDataA = [];
-    for (let i = 0; i <= numPoints; i++) {
-        const x = xMin + i * step;
-        const y = normalDistribution(x, variantA.mean, variantA.std_error);
-        dataA.push({ x: x * 100, y: y }); // Convert to percentage
-
-        // Add to confidence interval data if within CI
-        if (x >= variantA.ci_lower && x <= variantA.ci_upper) {
-            ciDataA.push({ x: x * 100, y: y });
-        }
+    let payload;
+    try {
+        payload = await loadAnalysisPayload(ctx.dataset.url);
+    } catch (error) {
+        console.error('Error loading analysis:', error);
+        return;
     }
 
-    // Generate data points for Variant B
-    const dataB = [];
-    const ciDataB = [];
-    for (let i = 0; i <= numPoints; i++) {
-        const x = xMin + i * step;
-        const y = normalDistribution(x, variantB.mean, variantB.std_error);
-        dataB.push({ x: x * 100, y: y }); // Convert to percentage
-
-        // Add to confidence interval data if within CI
-        if (x >= variantB.ci_lower && x <= variantB.ci_upper) {
-            ciDataB.push({ x: x * 100, y: y });
-        }
-    }
+    // Curve points of both variants, the confidence intervals are index ranges of them
+    const curve = payload.curve;
+    const [dataA, dataB] = curve.density.map(density => density.map((y, i) => ({ x: curve.x[i], y: y })));
+    const [ciDataA, ciDataB] = curve.ci.map((range, index) => {
+        const data = index === 0 ? dataA : dataB;
+        return range ? data.slice(range[0], range[1] + 1) : [];
+    });
 
     new Chart(ctx, {
         type: 'line',
@@ -404,93 +390,144 @@ function createNormalDistributionChart() {
     });
 }
 
-function createQQPlot() {
-    const ctx = document.getElementById('qqPlotChart');
+async function createTrendChart() {
+    const ctx = document.getElementById('trendChart');
     if (!ctx) return;
 
-    const distData = analysisData.distribution_data;
-    const variantA = distData.variant_a;
-    const variantB = distData.variant_b;
-
-    // Helper function to calculate inverse normal CDF (approximation)
-    function inverseNormalCDF(p) {
-        // Approximation of inverse normal CDF for p between 0 and 1
-        if (p <= 0 || p >= 1) return 0;
-
-        const a1 = -3.969683028665376e+01;
-        const a2 = 2.209460984245205e+02;
-        const a3 = -2.759285104469687e+02;
-        const a4 = 1.383577518672690e+02;
-        const a5 = -3.066479806614716e+01;
-        const a6 = 2.506628277459239e+00;
-
-        const b1 = -5.447609879822406e+01;
-        const b2 = 1.615858368580409e+02;
-        const b3 = -1.556989798598866e+02;
-        const b4 = 6.680131188771972e+01;
-        const b5 = -1.328068155288572e+01;
-
-        const c1 = -7.784894002430293e-03;
-        const c2 = -3.223964580411365e-01;
-        const c3 = -2.400758277161838e+00;
-        const c4 = -2.549732539343734e+00;
-        const c5 = 4.374664141464968e+00;
-        const c6 = 2.938163982698783e+00;
-
-        const d1 = 7.784695709041462e-03;
-        const d2 = 3.224671290700398e-01;
-        const d3 = 2.445134137142996e+00;
-        const d4 = 3.754408661907416e+00;
+    let series;
+    try {
+        const response = await fetch(ctx.dataset.url);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        series = await response.json();
+    } catch (error) {
+        console.error('Error loading time series:', error);
+        return;
+    }
 
-        const pLow = 0.02425;
-        const pHigh = 1 - pLow;
+    if (!series.days.length) {
+        ctx.parentElement.innerHTML = '<p style="opacity: 0.8;">No daily history recorded for this test yet.</p>';
+        return;
+    }
 
-        let q, r, x;
+    const lineColors = ['rgba(46, 62, 74, 1)', 'rgba(16, 185, 129, 1)', 'rgba(49, 122, 174, 1)', 'rgba(239, 68, 68, 1)'];
 
-        if (p < pLow) {
-            q = Math.sqrt(-2 * Math.log(p));
-            x = (((((c1 * q + c2) * q + c3) * q + c4) * q + c5) * q + c6) /
-                ((((d1 * q + d2) * q + d3) * q + d4) * q + 1);
-        } else if (p <= pHigh) {
-            q = p - 0.5;
-            r = q * q;
-            x = (((((a1 * r + a2) * r + a3) * r + a4) * r + a5) * r + a6) * q /
-                (((((b1 * r + b2) * r + b3) * r + b4) * r + b5) * r + 1);
-        } else {
-            q = Math.sqrt(-2 * Math.log(1 - p));
-            x = -(((((c1 * q + c2) * q + c3) * q + c4) * q + c5) * q + c6) /
-                ((((d1 * q + d2) * q + d3) * q + d4) * q + 1);
+    new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: series.days,
+            datasets: series.variants.map((variant, index) => ({
+                label: variant.name,
+                data: variant.cumulative_conversion_rate,
+                dailyRates: variant.conversion_rate,
+                borderColor: lineColors[index % lineColors.length],
+                backgroundColor: lineColors[index % lineColors.length].replace(', 1)', ', 0.2)'),
+                borderWidth: 3,
+                tension: 0.2,
+                spanGaps: true,
+                pointRadius: series.days.length > 30 ? 0 : 3,
+                pointHoverRadius: 6
+            }))
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            interaction: {
+                mode: 'index',
+                intersect: false
+            },
+            plugins: {
+                legend: {
+                    display: true,
+                    position: 'top',
+                    labels: {
+                        font: {
+                            size: 12
+                        },
+                        padding: 15,
+                        usePointStyle: true
+                    }
+                },
+                tooltip: {
+                    backgroundColor: 'rgba(0, 0, 0, 0.8)',
+                    padding: 12,
+                    titleFont: {
+                        size: 14,
+                        weight: 'bold'
+                    },
+                    bodyFont: {
+                        size: 13
+                    },
+                    callbacks: {
+                        label: function(context) {
+                            const daily = context.dataset.dailyRates[context.dataIndex];
+                            const dailyText = daily === null ? 'no new data' : `${daily.toFixed(2)}% that day`;
+                            return `${context.dataset.label}: ${context.parsed.y.toFixed(2)}% (${dailyText})`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    title: {
+                        display: true,
+                        text: 'Day',
+                        font: {
+                            size: 13,
+                            weight: 'bold'
+                        }
+                    },
+                    ticks: {
+                        maxTicksLimit: 12,
+                        font: {
+                            size: 11
+                        }
+                    },
+                    grid: {
+                        color: 'rgba(0, 0, 0, 0.05)'
+                    }
+                },
+                y: {
+                    title: {
+                        display: true,
+                        text: 'Cumulative Conversion Rate (%)',
+                        font: {
+                            size: 13,
+                            weight: 'bold'
+                        }
+                    },
+                    ticks: {
+                        callback: function(value) {
+                            return value.toFixed(2) + '%';
+                        },
+                        font: {
+                            size: 11
+                        }
+                    },
+                    grid: {
+                        color: 'rgba(0, 0, 0, 0.05)'
+                    }
+                }
+            }
         }
+    });
+}
 
-        return x;
-    }
+async function createQQPlot() {
+    const ctx = document.getElementById('qqPlotChart');
+    if (!ctx) return;
 
-    // Generate sample quantiles from the normal distribution
-    function generateQuantiles(mean, stdError, numPoints) {
-        const quantiles = [];
-        for (let i = 1; i < numPoints; i++) {
-            const p = i / numPoints;
-            const theoreticalQuantile = inverseNormalCDF(p);
-            const sampleQuantile = (inverseNormalCDF(p) * stdError + mean) * 100; // Convert to percentage
-            quantiles.push({
-                x: theoreticalQuantile,
-                y: sampleQuantile
-            });
-        }
-        return quantiles;
+    let payload;
+    try {
+        payload = await loadAnalysisPayload(ctx.dataset.url);
+    } catch (error) {
+        console.error('Error loading analysis:', error);
+        return;
     }
 
-    const numPoints = 50;
-    const quantilesA = generateQuantiles(variantA.mean, variantA.std_error, numPoints);
-    const quantilesB = generateQuantiles(variantB.mean, variantB.std_error, numPoints);
-
-    // Generate reference line (y = x transformed to match scale)
-    const minTheoreticalQ = -3;
-    const maxTheoreticalQ = 3;
-    const referenceLine = [
-        { x: minTheoreticalQ, y: (minTheoreticalQ * Math.max(variantA.std_error, variantB.std_error) + Math.min(variantA.mean, variantB.mean)) * 100 },
-        { x: maxTheoreticalQ, y: (maxTheoreticalQ * Math.max(variantA.std_error, variantB.std_error) + Math.max(variantA.mean, variantB.mean)) * 100 }
-    ];
+    // Theoretical standard normal quantiles against the sample quantiles of each variant
+    const qq = payload.qq;
+    const [quantilesA, quantilesB] = qq.quantiles.map(quantiles => quantiles.map((y, i) => ({ x: qq.theoretical[i], y: y })));
+    const referenceLine = qq.reference.map(([x, y]) => ({ x: x, y: y }));
 
     new Chart(ctx, {
         type: 'scatter',
@@ -1,12 +1,17 @@
 /**
  * Chart Updater
  *
- * Fetches test ratio data from the API and updates the pie chart
- * and legend on the dashboard.
+ * Updates the pie chart and legend on the dashboard. With live updates the
+ * ratios arrive over the event stream (live_dashboard.js), otherwise they
+ * are fetched from the API once.
  */
 
 document.addEventListener('DOMContentLoaded', function() {
-    updatePieChart();
+    const chartContainer = document.querySelector('.chart-container');
+
+    if (chartContainer && !chartContainer.dataset.liveUrl) {
+        updatePieChart();
+    }
 });
 
 async function updatePieChart() {
@@ -0,0 +1,219 @@
+/**
+ * Live Dashboard
+ *
+ * Keeps the dashboard up to date over the Server-Sent Events stream of the
+ * company (data/live.py) instead of reloading the page. The events patch the
+ * totals, the most recent test with its variants and report, and the test
+ * ratio chart in place. While the stream is connected, the test and variant
+ * forms are submitted in the background and their results arrive as events.
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    const chartContainer = document.querySelector('.chart-container');
+
+    if (!chartContainer || !chartContainer.dataset.liveUrl || !window.EventSource) {
+        return;
+    }
+
+    const userId = chartContainer.dataset.userId;
+    const source = new EventSource(chartContainer.dataset.liveUrl);
+    // Dashboard state as last received, the partial events are merged into it
+    let state = null;
+
+    function render(newState) {
+        state = newState;
+        renderDashboard(state, userId);
+    }
+
+    source.addEventListener('snapshot', event => render(JSON.parse(event.data)));
+    source.addEventListener('test-created', event => render(JSON.parse(event.data)));
+    source.addEventListener('test-updated', event => render(JSON.parse(event.data)));
+
+    source.addEventListener('variants-updated', event => {
+        const data = JSON.parse(event.data);
+        render({...state, variants: data.variants, totals: data.totals});
+    });
+
+    source.addEventListener('report-ready', event => {
+        render({...state, report: JSON.parse(event.data).report});
+    });
+
+    source.addEventListener('ratios-changed', event => {
+        const ratios = JSON.parse(event.data);
+        state.ratios = ratios;
+        updatePieChartStyles(ratios.winning_percent, ratios.losing_percent, ratios.other_percent);
+        updateLegend(ratios.winning_percent, ratios.losing_percent, ratios.other_percent);
+    });
+
+    source.addEventListener('error', () => {
+        // The browser reconnects by itself unless the server refused the stream
+        if (source.readyState === EventSource.CLOSED && state === null) {
+            updatePieChart();
+        }
+    });
+
+    bindVariantModal();
+
+    // Submit the dashboard forms in the background while the stream shows their results
+    document.addEventListener('submit', async event => {
+        const form = event.target;
+
+        if (source.readyState !== EventSource.OPEN || !['abTestForm', 'variantForm'].includes(form.id)) {
+            return;
+        }
+
+        event.preventDefault();
+
+        const modal = form.closest('.modal');
+        if (modal) {
+            modal.style.display = 'none';
+        }
+
+        const loadingOverlay = document.getElementById('loadingOverlay');
+
+        try {
+            const response = await fetch(form.action, {
+                method: 'POST',
+                headers: {'Accept': 'application/json'},
+                body: new FormData(form)
+            });
+
+            if (response.status !== 204) {
+                // E.g. the session expired and the form was answered with the login page
+                window.location.reload();
+                return;
+            }
+
+            form.reset();
+        } catch (error) {
+            console.error('Error submitting form:', error);
+            alert('Saving failed. Please try again.');
+        } finally {
+            if (loadingOverlay) {
+                loadingOverlay.classList.remove('active');
+            }
+        }
+    });
+});
+
+function renderDashboard(state, userId) {
+    document.getElementById('totalTests').textContent = state.totals.tests;
+    document.getElementById('totalImpressions').textContent = state.totals.impressions;
+    document.getElementById('totalConversions').textContent = state.totals.conversions;
+
+    document.getElementById('recentTest').innerHTML = recentTestHtml(state);
+
+    const recommendation = document.getElementById('aiRecommendation');
+    recommendation.hidden = !(state.test && state.report);
+    if (state.test) {
+        recommendation.querySelector('p').textContent = state.report ? state.report.summary : '';
+        recommendation.querySelector('a').href = `/analysis/${userId}/${state.test.id}`;
+        document.getElementById('variantForm').action = `/home/variants/${userId}/${state.test.id}`;
+    }
+
+    const ratios = state.ratios;
+    updatePieChartStyles(ratios.winning_percent, ratios.losing_percent, ratios.other_percent);
+    updateLegend(ratios.winning_percent, ratios.losing_percent, ratios.other_percent);
+
+    // The button is new after every render
+    const addVariantBtn = document.getElementById('addVariantBtn');
+    if (addVariantBtn) {
+        addVariantBtn.addEventListener('click', () => {
+            document.getElementById('variantModal').style.display = 'block';
+        });
+    }
+}
+
+function recentTestHtml(state) {
+    const test = state.test;
+
+    if (!test) {
+        return `
+            <div>
+                <h2>Recent Test Results</h2>
+                <p>Create your first AB test to see the results.</p>
+            </div>`;
+    }
+
+    const header = `
+        <div>
+            <h2>Recent Test Results</h2>
+            <h3>${escapeHtml(test.name)}</h3>
+            <p>${escapeHtml(test.description)}</p>
+            <p><strong>Main Metric:</strong> ${escapeHtml(test.metric)}</p>
+        </div>`;
+
+    if (state.variants.length === 0) {
+        return header + `
+            <div class="button-container">
+                <button class="btn" id="addVariantBtn">Add Variants</button>
+            </div>`;
+    }
+
+    const variants = state.variants.map(variant => `
+        <div class="metrics-card">
+            <h4>${escapeHtml(variant.name)}</h4>
+            <div class="metric-row">
+                <span class="metric-label">Total Sessions:</span>
+                <span class="metric-value">${variant.impressions}</span>
+            </div>
+            <div class="metric-row">
+                <span class="metric-label">Total Conversions:</span>
+                <span class="metric-value">${variant.conversions}</span>
+            </div>
+            <div class="metric-row">
+                <span class="metric-label">Conversion Rate:</span>
+                <span class="metric-value highlight">${formatFloat(variant.conversion_rate)}%</span>
+            </div>
+        </div>`).join('');
+
+    const report = state.report;
+    const reportStats = report ? `
+        <div class="card secondary">
+            <p><strong>Increase:</strong> ${formatFloat(report.increase_percent)} %</p>
+        </div>
+        <div class="card secondary">
+            <p><strong>p-Value:</strong> ${formatFloat(report.p_value)}</p>
+        </div>
+        <div class="card ${report.significance ? 'gradient' : 'secondary'}">
+            <p><strong>${report.significance ? 'Significant' : 'Not Significant'}</strong></p>
+        </div>` : '';
+
+    return header + `
+        <div class="column-grid-2">${variants}</div>
+        <div class="column-grid-3" id="reportStats">${reportStats}</div>`;
+}
+
+function bindVariantModal() {
+    // modal_variant.js only binds the modal if the page was rendered with the Add Variants button
+    const modal = document.getElementById('variantModal');
+
+    if (!modal) {
+        return;
+    }
+
+    const close = () => {
+        modal.style.display = 'none';
+    };
+    document.getElementById('closeVariantBtn').addEventListener('click', close);
+    document.getElementById('cancelVariantBtn').addEventListener('click', close);
+    window.addEventListener('click', event => {
+        if (event.target === modal) {
+            close();
+        }
+    });
+}
+
+function formatFloat(value) {
+    // Like the page rendered by the server, whole numbers keep their ".0"
+    if (value === null || value === undefined) {
+        return '';
+    }
+    return Number.isInteger(value) ? value.toFixed(1) : String(value);
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text ?? '';
+    return div.innerHTML;
+}
@@ -14,6 +14,11 @@ document.addEventListener('DOMContentLoaded', function() {
     // Make current test data globally accessible for export
     window.currentTestData = null;
 
+    // Tests are loaded page by page from the API instead of being embedded in the page
+    const companyId = testSelector ? testSelector.dataset.companyId : null;
+    const loadMoreValue = 'load-more';
+    let nextCursor = null;
+
     let currentCharts = {
         conversion: null,
         sample: null
@@ -36,7 +41,15 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Test selection handler
     if (testSelector) {
+        loadTestOptions();
+
         testSelector.addEventListener('change', function() {
+            if (this.value === loadMoreValue) {
+                this.value = '';
+                loadTestOptions(nextCursor);
+                return;
+            }
+
             const testId = parseInt(this.value);
             if (testId) {
                 generateReport(testId);
@@ -49,6 +62,42 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Append the next page of tests (only those with variants) to the selector
+    async function loadTestOptions(cursor = null) {
+        const params = new URLSearchParams({ with_variants: '1' });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+
+        try {
+            const response = await fetch(`/api/tests/${companyId}?${params}`);
+            if (!response.ok) {
+                throw new Error('Failed to fetch tests');
+            }
+
+            const data = await response.json();
+
+            testSelector.querySelector(`option[value="${loadMoreValue}"]`)?.remove();
+
+            data.tests.forEach(test => {
+                const option = document.createElement('option');
+                option.value = test.id;
+                option.textContent = `${test.name} - ${test.created_at}`;
+                testSelector.appendChild(option);
+            });
+
+            nextCursor = data.next_cursor;
+            if (nextCursor) {
+                const option = document.createElement('option');
+                option.value = loadMoreValue;
+                option.textContent = '-- Load more tests --';
+                testSelector.appendChild(option);
+            }
+        } catch (error) {
+            console.error('Error loading tests:', error);
+        }
+    }
+
     // Toggle builder panel
     if (toggleBuilderBtn) {
         toggleBuilderBtn.addEventListener('click', function() {
@@ -232,24 +281,32 @@ document.addEventListener('DOMContentLoaded', function() {
         alert('Layout loaded successfully!');
     });
 
-    function generateReport(testId) {
-        // Find test data
-        const test = testsData.find(t => t.id === testId);
-        if (!test) {
-            console.error('Test not found');
+    async function generateReport(testId) {
+        // Fetch the selected test with its variants and report
+        let data;
+        try {
+            const response = await fetch(`/api/tests/${companyId}/${testId}`);
+            if (!response.ok) {
+                throw new Error('Failed to fetch test');
+            }
+            data = await response.json();
+        } catch (error) {
+            console.error('Test not found:', error);
             return;
         }
 
-        // Find variants for this test
-        const testVariants = variantsData.filter(v => v.test_id === testId);
+        const test = data.test;
+
+        // Variants of this test
+        const testVariants = data.variants;
         if (testVariants.length < 2) {
             alert('This test does not have enough variants for a report. Please select a test with at least 2 variants.');
             testSelector.value = '';
             return;
         }
 
-        // Find report for this test
-        const report = reportsData.find(r => r.test_id === testId);
+        // Report for this test
+        const report = data.report || undefined;
 
         // Populate report
         populateHeader(test);
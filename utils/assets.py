@@ -0,0 +1,316 @@
+"""
+Static asset bundles with content-hashed, precompressed builds.
+
+The scripts and the stylesheet of the pages are grouped into the bundles of
+BUNDLES. "flask build-assets" concatenates and minifies every bundle, writes it
+to the build directory under a name containing a hash of its content
+(dashboard.3fa9c1d20b.js) together with gzip and, if the brotli package is
+installed, brotli compressed copies, and records the hashed names in
+manifest.json. Files of the previous build are kept, so pages rendered before
+a deploy still load their assets.
+
+Templates link assets with asset_url('dashboard.js'). With a manifest it
+returns the hashed URL, which never changes content and is served with
+immutable caching and the precompressed copy the browser accepts. Without a
+manifest (during development) the bundles are concatenated from the sources
+on every request and revalidated with ETags, so edits show up right away.
+
+Minification uses rjsmin and rcssmin when they are installed and otherwise a
+conservative built-in minifier that only drops comments and whitespace.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from itertools import groupby
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+# Bundles by name, with their source files in static/ in load order
+BUNDLES = {
+    'style.css': ['style.css'],
+    'logo.png': ['logo_ab-lizer.png'],
+    'dashboard.js': ['modal_test.js', 'modal_variant.js', 'chart_updater.js', 'live_dashboard.js',
+                     'description_generator.js'],
+    'tests.js': ['modal_test.js', 'modal_variant.js', 'description_generator.js'],
+    'analysis.js': ['analysis_charts.js'],
+    'edit.js': ['edit_form.js'],
+    'reports.js': ['report_generator.js', 'report_exporter.js'],
+}
+
+# Extensions of bundles that are text, minified and precompressed (images are copied as they are)
+TEXT_TYPES = ('.js', '.css')
+
+# Hex digits of the content hash in built file names
+HASH_LENGTH = 10
+
+# Built files smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 256
+
+MANIFEST_NAME = 'manifest.json'
+
+# Characters after which a slash starts a regular expression literal rather than a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'throw', 'delete', 'yield', 'await')
+
+
+def _skip_string(source, i):
+    """Index after the string literal starting at i"""
+    quote = source[i]
+    i += 1
+    while i < len(source) and source[i] != quote:
+        if source[i] == '\\':
+            i += 1
+        elif source[i] == '\n':
+            break
+        i += 1
+    return i + 1
+
+
+def _skip_template(source, i):
+    """Index after the template literal starting at i, including nested ${...} expressions"""
+    i += 1
+    while i < len(source) and source[i] != '`':
+        if source[i] == '\\':
+            i += 2
+        elif source.startswith('${', i):
+            depth = 1
+            i += 2
+            while i < len(source) and depth:
+                char = source[i]
+                if char in '"\'':
+                    i = _skip_string(source, i)
+                    continue
+                if char == '`':
+                    i = _skip_template(source, i)
+                    continue
+                depth += {'{': 1, '}': -1}.get(char, 0)
+                i += 1
+        else:
+            i += 1
+    return i + 1
+
+
+# Whitespace ending a line of code together with the blank lines and indentation that follow it
+_LINE_BREAK = re.compile(r'[ \t\r]*\n\s*')
+
+
+def _skip_regex(source, i):
+    """Index after the regular expression literal starting at i, including its flags"""
+    i += 1
+    in_class = False
+    while i < len(source) and (source[i] != '/' or in_class):
+        if source[i] == '\\':
+            i += 1
+        elif source[i] == '[':
+            in_class = True
+        elif source[i] == ']':
+            in_class = False
+        i += 1
+    i += 1
+    while i < len(source) and (source[i].isalnum() or source[i] == '_'):
+        i += 1
+    return i
+
+
+def _starts_regex(output):
+    """Whether a slash following the minified output so far starts a regular expression"""
+    code = ''.join(output).rstrip()
+    if not code or code[-1] in _REGEX_PRECEDERS:
+        return True
+    return re.search(r'(?<![\w$.])(?:%s)$' % '|'.join(_REGEX_KEYWORDS), code) is not None
+
+
+def minify_js(source):
+    """
+    Remove comments, indentation and blank lines from a script.
+
+    Line breaks are kept so automatic semicolon insertion works as in the
+    source, strings, template literals and regular expressions stay as they are.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+
+    output = []
+    # Indices in output of the strings, template literals and regular expressions
+    literals = set()
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char in '"\'':
+            end = _skip_string(source, i)
+            literals.add(len(output))
+        elif char == '`':
+            end = _skip_template(source, i)
+            literals.add(len(output))
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = len(source) if end == -1 else end
+            continue
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = len(source) if end == -1 else end + 2
+            output.append(' ')
+            continue
+        elif char == '/' and _starts_regex(output):
+            end = _skip_regex(source, i)
+            literals.add(len(output))
+        else:
+            end = i + 1
+        output.append(source[i:end])
+        i = end
+
+    # Whitespace is only dropped between the literals, multi-line template literals keep their lines
+    parts = []
+    for literal, indices in groupby(range(len(output)), key=literals.__contains__):
+        text = ''.join(output[index] for index in indices)
+        parts.append(text if literal else _LINE_BREAK.sub('\n', text))
+    return ''.join(parts).strip() + '\n'
+
+
+def minify_css(source):
+    """Remove comments and whitespace from a stylesheet"""
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+
+    # Comments and strings are matched together so comment markers inside strings are left alone
+    source = re.sub(r'/\*.*?\*/|("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')',
+                    lambda match: match.group(1) or '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def hashed_name(name, content):
+    """File name of a built bundle: its name with a hash of its content before the extension"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def bundle_source(static_dir, name):
+    """Content of a bundle concatenated from its unminified sources"""
+    sources = []
+    for filename in BUNDLES[name]:
+        with open(os.path.join(static_dir, filename), 'rb') as f:
+            sources.append(f.read())
+
+    if name.endswith('.js'):
+        # A semicolon between the scripts so one without a trailing semicolon can't run into the next
+        return b'\n;\n'.join(sources)
+    return b'\n'.join(sources)
+
+
+def _compress(path, content):
+    """Write the gzip and brotli compressed copies of a built file next to it"""
+    if len(content) < MIN_COMPRESS_SIZE:
+        return
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0 so rebuilding the same content gives the same bytes
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=11))
+
+
+def build_assets(static_dir, build_dir):
+    """
+    Build all bundles into build_dir and write its manifest.
+
+    Files of the previous build stay, older ones are deleted.
+
+    Returns:
+        Dict of bundle names to their built file names
+    """
+    os.makedirs(build_dir, exist_ok=True)
+    manifest_path = os.path.join(build_dir, MANIFEST_NAME)
+    previous = read_manifest(manifest_path) or {}
+
+    manifest = {}
+    for name in BUNDLES:
+        content = bundle_source(static_dir, name)
+        if name.endswith('.js'):
+            content = minify_js(content.decode('utf-8')).encode('utf-8')
+        elif name.endswith('.css'):
+            content = minify_css(content.decode('utf-8')).encode('utf-8')
+
+        filename = hashed_name(name, content)
+        path = os.path.join(build_dir, filename)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if name.endswith(TEXT_TYPES):
+            _compress(path, content)
+        manifest[name] = filename
+
+    keep = {MANIFEST_NAME} | set(manifest.values()) | set(previous.values())
+    for filename in os.listdir(build_dir):
+        base = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if base not in keep:
+            os.remove(os.path.join(build_dir, filename))
+
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def read_manifest(path):
+    """Bundle names to built file names from a manifest, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+class Assets:
+    """Resolves bundle names to URLs and files, from the build manifest if there is one"""
+
+    def __init__(self):
+        self.static_dir = None
+        self.build_dir = None
+        self.manifest = None
+        self.max_age = 0
+
+    @property
+    def built(self):
+        return self.manifest is not None
+
+    def configure(self, static_dir, build_dir, max_age):
+        """
+        Set the directories and load the manifest of the build directory.
+
+        Args:
+            static_dir: Directory of the sources
+            build_dir: Directory written by build_assets (empty serves the sources)
+            max_age: Seconds browsers may cache built files
+        """
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.manifest = read_manifest(os.path.join(build_dir, MANIFEST_NAME)) if build_dir else None
+        self.max_age = max_age
+
+    def filename(self, name):
+        """File name the URL of a bundle points to"""
+        if self.manifest is not None:
+            return self.manifest[name]
+        if name not in BUNDLES:
+            raise KeyError(name)
+        return name
+
+
+# Assets of the app, configured by the app
+assets = Assets()
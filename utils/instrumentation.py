@@ -0,0 +1,245 @@
+"""
+Per-request timing of SQL, template rendering and LLM calls.
+
+A sampled share of requests is profiled: SQLAlchemy cursor events count every
+statement and its time on any engine (main database, shards, replica,
+archive), Flask's template signals time the rendering and timed_llm() blocks
+time the LLM calls of routes/ai.py. Statements are grouped by their shape, the
+SQL with literals and the lengths of IN lists taken out, so a query run once
+per row of a loop (N+1) shows up as one shape executed many times.
+
+At the end of a profiled request the totals are added to the response as a
+Server-Timing header, which the browser's developer tools show in the network
+panel, and written as one JSON log line to the "ab_lizer.requests" logger.
+Requests with a repeated shape above the threshold or slower than the slow
+threshold are logged as warnings, with the repeated shapes.
+
+With metrics enabled (utils/metrics.py), every request, statement and LLM call
+is also timed for the Prometheus histograms, and the statements of a request
+are counted; the shapes, template times and the report stay with the sampled
+requests. Otherwise requests that aren't sampled only cost a context variable
+lookup per statement.
+"""
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+import sqlalchemy as sa
+from flask import before_render_template, template_rendered
+
+from data.serialization import dumps
+from utils.metrics import metrics
+
+logger = logging.getLogger('ab_lizer.requests')
+
+# Characters of a statement shape kept in the log
+MAX_SHAPE_LENGTH = 300
+
+# Repeated shapes listed per request in the log
+MAX_REPORTED_SHAPES = 5
+
+# Profile of the request running in this context, None if it isn't sampled nor measured
+_current = ContextVar('request_profile', default=None)
+
+_IN_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))+\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+_COLUMNS = re.compile(r'^SELECT (?!\* )(.+?) FROM ')
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement):
+    """Statement with literals replaced by ? and IN lists collapsed, equal for every run of the same query"""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def short_shape(shape):
+    """Shape for the log, with the column list of a SELECT left out so the tables and conditions fit"""
+    return _COLUMNS.sub('SELECT ... FROM ', shape, count=1)[:MAX_SHAPE_LENGTH]
+
+
+class RequestProfile:
+    """
+    Counters of one request.
+
+    Args:
+        sampled: Whether the request is reported, otherwise only its time and statements are counted for the metrics
+    """
+
+    def __init__(self, sampled=True):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.llm_time = 0.0
+        self.shapes = Counter()
+        self._template_starts = []
+
+    def repeated(self, threshold):
+        """Shapes executed at least threshold times, most frequent first"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class RequestProfiler:
+    """Samples requests, collects their profile and reports it"""
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.repeat_threshold = 10
+        self.slow_ms = 1000
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate, repeat_threshold, slow_ms):
+        """
+        Args:
+            sample_rate: Share of requests profiled, from 0 (none) to 1 (all)
+            repeat_threshold: Executions of one statement shape in a request that are reported as N+1
+            slow_ms: Milliseconds after which a request is logged as a warning
+        """
+        self.sample_rate = sample_rate
+        self.repeat_threshold = repeat_threshold
+        self.slow_ms = slow_ms
+        if not logger.handlers:
+            # One JSON object per line, independent of how the app's logger is configured
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    def start(self):
+        """Profile the current request if it is sampled or metrics are collected"""
+        sampled = self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+        if sampled or metrics.enabled:
+            _current.set(RequestProfile(sampled))
+
+    def finish(self, request, response):
+        """Stop profiling the current request, record its metrics and, if sampled, add its Server-Timing header and log it"""
+        profile = _current.get()
+        if profile is None:
+            return
+        _current.set(None)
+
+        total = time.perf_counter() - profile.started
+        if metrics.enabled:
+            metrics.observe_request(request.method, request.endpoint, response.status_code, total, profile.sql_count)
+        if not profile.sampled:
+            return
+
+        total_ms = total * 1000
+        sql_ms = profile.sql_time * 1000
+        template_ms = profile.template_time * 1000
+        llm_ms = profile.llm_time * 1000
+        response.headers.add('Server-Timing', f'db;dur={sql_ms:.1f};desc="{profile.sql_count} queries"')
+        response.headers.add('Server-Timing', f'tpl;dur={template_ms:.1f}')
+        if profile.llm_time:
+            response.headers.add('Server-Timing', f'llm;dur={llm_ms:.1f}')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.1f}')
+
+        repeated = profile.repeated(self.repeat_threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 1),
+            'sql_count': profile.sql_count,
+            'sql_ms': round(sql_ms, 1),
+            'template_ms': round(template_ms, 1),
+            'llm_ms': round(llm_ms, 1),
+        }
+        if repeated:
+            record['repeated_queries'] = [{'count': count, 'statement': short_shape(shape)}
+                                          for shape, count in repeated[:MAX_REPORTED_SHAPES]]
+        level = logging.WARNING if repeated or total_ms >= self.slow_ms else logging.INFO
+        logger.log(level, dumps(record, sort_keys=False).decode('utf-8'))
+
+    def discard(self):
+        """Stop profiling without reporting, e.g. after the request failed"""
+        _current.set(None)
+
+
+@contextmanager
+def timed_llm(model_id):
+    """
+    Add the time of the with block, an LLM call, to the current request's profile and the model's metrics.
+
+    Args:
+        model_id: Id of the model in MODEL_CONFIGS, an exception leaving the block counts as its error
+    """
+    profile = _current.get()
+    if profile is None and not metrics.enabled:
+        yield
+        return
+
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        if profile is not None:
+            profile.llm_time += seconds
+        if metrics.enabled:
+            metrics.observe_llm(model_id, seconds, failed)
+
+
+@sa.event.listens_for(sa.engine.Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and (metrics.enabled or _current.get() is not None):
+        context.profile_started = time.perf_counter()
+
+
+@sa.event.listens_for(sa.engine.Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'profile_started', None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    if metrics.enabled:
+        metrics.observe_query(statement, seconds)
+
+    profile = _current.get()
+    if profile is None:
+        return
+    profile.sql_time += seconds
+    profile.sql_count += 1
+    if profile.sampled:
+        profile.shapes[statement_shape(statement)] += 1
+
+
+@before_render_template.connect
+def _before_render_template(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None and profile.sampled:
+        profile._template_starts.append(time.perf_counter())
+
+
+@template_rendered.connect
+def _template_rendered(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None and profile._template_starts:
+        started = profile._template_starts.pop()
+        # Templates rendered while rendering another are part of its time
+        if not profile._template_starts:
+            profile.template_time += time.perf_counter() - started
+
+
+# Request profiler of this process, configured by the app
+request_profiler = RequestProfiler()
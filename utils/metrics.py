@@ -0,0 +1,158 @@
+"""
+Prometheus metrics of the app, served in the text format by /metrics.
+
+- ab_lizer_request_duration_seconds: request latency histogram per route
+  (method, endpoint), ab_lizer_requests_total counts them per status and
+  ab_lizer_request_db_queries is a histogram of SQL statements per request
+- ab_lizer_db_query_duration_seconds: SQL statement latency per operation
+  (select, insert, update, delete, other), on every engine and in background
+  threads too
+- ab_lizer_llm_request_duration_seconds and ab_lizer_llm_errors_total: LLM
+  call latency and failed calls per model (the ids of MODEL_CONFIGS)
+- ab_lizer_queue_depth: pending background work per queue
+- ab_lizer_cache_requests_total: cache lookups per cache and result (hit or
+  miss), the hit ratio is hits / (hits + misses)
+
+Request, SQL and LLM timings come from the hooks of utils/instrumentation.py.
+Queue depths and cache counts are read from the objects configure() was given,
+at most once a second and on every scrape.
+
+Each worker process of a pre-forking server only sees its own requests. With
+the PROMETHEUS_MULTIPROC_DIR environment variable set to an empty directory
+before the processes start (gunicorn.conf.py does it), the workers write their
+metrics to files there and /metrics merges the files of all workers, so a
+scrape served by any worker returns the totals of the whole server.
+
+Requires the optional prometheus_client package, without it no metrics are
+collected and /metrics answers 501.
+"""
+import os
+import threading
+import time
+from functools import lru_cache
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Histogram buckets in seconds: requests and queries take milliseconds, LLM calls seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+LLM_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+# Buckets of the number of SQL statements per request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Seconds between two reads of the queue depths and cache counts outside of scrapes
+SYNC_INTERVAL = 1.0
+
+SQL_OPERATIONS = ('select', 'insert', 'update', 'delete')
+
+if prometheus_client is not None:
+    REQUEST_DURATION = prometheus_client.Histogram(
+        'ab_lizer_request_duration_seconds', 'Request latency per route',
+        ['method', 'endpoint'], buckets=REQUEST_BUCKETS)
+    REQUESTS = prometheus_client.Counter(
+        'ab_lizer_requests', 'Requests per route and status', ['method', 'endpoint', 'status'])
+    REQUEST_QUERIES = prometheus_client.Histogram(
+        'ab_lizer_request_db_queries', 'SQL statements per request', ['endpoint'], buckets=QUERY_COUNT_BUCKETS)
+    QUERY_DURATION = prometheus_client.Histogram(
+        'ab_lizer_db_query_duration_seconds', 'SQL statement latency', ['operation'], buckets=QUERY_BUCKETS)
+    LLM_DURATION = prometheus_client.Histogram(
+        'ab_lizer_llm_request_duration_seconds', 'LLM call latency per model', ['model'], buckets=LLM_BUCKETS)
+    LLM_ERRORS = prometheus_client.Counter(
+        'ab_lizer_llm_errors', 'Failed LLM calls per model', ['model'])
+    QUEUE_DEPTH = prometheus_client.Gauge(
+        'ab_lizer_queue_depth', 'Pending background work per queue', ['queue'], multiprocess_mode='livesum')
+    CACHE_REQUESTS = prometheus_client.Counter(
+        'ab_lizer_cache_requests', 'Cache lookups per cache and result', ['cache', 'result'])
+
+
+@lru_cache(maxsize=1024)
+def statement_operation(statement):
+    """Operation label of a SQL statement"""
+    operation = statement.lstrip()[:6].lower()
+    return operation if operation in SQL_OPERATIONS else 'other'
+
+
+class Metrics:
+    """Records the app's metrics and renders them for Prometheus"""
+
+    def __init__(self):
+        self.enabled = False
+        self.caches = {}
+        self.queues = {}
+        self._counted = {}
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return prometheus_client is not None
+
+    def configure(self, enabled, caches, queues):
+        """
+        Args:
+            enabled: Whether to collect metrics, has no effect without prometheus_client
+            caches: Dict of cache names to TTLCache instances whose hits and misses are counted
+            queues: Dict of queue names to callables returning the number of pending items
+        """
+        self.enabled = enabled and self.available
+        self.caches = caches
+        self.queues = queues
+        self._counted = {}
+
+    def observe_request(self, method, endpoint, status, seconds, query_count):
+        endpoint = endpoint or 'none'
+        REQUEST_DURATION.labels(method, endpoint).observe(seconds)
+        REQUESTS.labels(method, endpoint, str(status)).inc()
+        REQUEST_QUERIES.labels(endpoint).observe(query_count)
+        if time.monotonic() - self._synced_at >= SYNC_INTERVAL:
+            self.sync()
+
+    def observe_query(self, statement, seconds):
+        QUERY_DURATION.labels(statement_operation(statement)).observe(seconds)
+
+    def observe_llm(self, model_id, seconds, failed):
+        LLM_DURATION.labels(model_id).observe(seconds)
+        if failed:
+            LLM_ERRORS.labels(model_id).inc()
+
+    def sync(self):
+        """Copy the queue depths and the cache counts of this process into the metrics"""
+        with self._lock:
+            self._synced_at = time.monotonic()
+            for name, depth in self.queues.items():
+                QUEUE_DEPTH.labels(name).set(depth())
+            for name, cache in self.caches.items():
+                for result, count in (('hit', cache.hits), ('miss', cache.misses)):
+                    counted = self._counted.get((name, result), 0)
+                    if count > counted:
+                        CACHE_REQUESTS.labels(name, result).inc(count - counted)
+                    self._counted[(name, result)] = count
+
+    def exposition(self):
+        """
+        Metrics of all processes in the Prometheus text format.
+
+        Returns:
+            Tuple (body, content type)
+        """
+        self.sync()
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop the gauges of a worker process that exited, its counters and histograms still count"""
+    if prometheus_client is not None and 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+# Metrics of this process, configured by the app
+metrics = Metrics()
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from scipy.stats import norm, fisher_exact, chi2_contingency
 
 def two_proportion_z_test(imp_a, conv_a, imp_b, conv_b, alpha=0.05):
@@ -54,6 +55,103 @@ def two_proportion_z_test(imp_a, conv_a, imp_b, conv_b, alpha=0.05):
     }
 
 
+def two_proportion_z_test_batch(imp_a, conv_a, imp_b, conv_b, alpha=0.05):
+    """
+    Vectorised version of two_proportion_z_test for many tests at once.
+
+    Args:
+        imp_a, conv_a, imp_b, conv_b: Sequences of impressions and conversions,
+            one element per test. Impressions must be positive.
+        alpha: Significance level
+
+    Returns:
+        Dict of numpy arrays with conv_rate_a, conv_rate_b, p_value, significant
+        and increase_percent, one element per test. Like the scalar version, tests
+        with small counts use Fisher's exact test.
+    """
+    imp_a = np.asarray(imp_a, dtype=float)
+    conv_a = np.asarray(conv_a, dtype=float)
+    imp_b = np.asarray(imp_b, dtype=float)
+    conv_b = np.asarray(conv_b, dtype=float)
+
+    conv_rate_a = conv_a / imp_a
+    conv_rate_b = conv_b / imp_b
+
+    # pooled z-test for all tests, small-count tests are replaced below
+    p_pool = (conv_a + conv_b) / (imp_a + imp_b)
+    variability = np.sqrt(p_pool * (1 - p_pool) * (1 / imp_a + 1 / imp_b))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        standard_deviation = (conv_rate_b - conv_rate_a) / variability
+    p_value = 2 * (1 - norm.cdf(np.abs(standard_deviation)))
+
+    small = np.minimum.reduce([conv_a, conv_b, imp_a - conv_a, imp_b - conv_b]) < 5
+    for i in np.flatnonzero(small):
+        table = [[conv_a[i], imp_a[i] - conv_a[i]],
+                 [conv_b[i], imp_b[i] - conv_b[i]]]
+        p_value[i] = fisher_exact(table, alternative='two-sided')[1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        increase_percent = np.where(conv_rate_a == 0, 0.0,
+                                    np.round((conv_rate_b - conv_rate_a) / conv_rate_a * 100, 2))
+
+    return {
+        "conv_rate_a": conv_rate_a,
+        "conv_rate_b": conv_rate_b,
+        "p_value": p_value,
+        "significant": p_value < alpha,
+        "increase_percent": increase_percent
+    }
+
+
+def normal_approximation(impressions, conversions, curve_points=200, qq_points=50, z_score=1.96):
+    """
+    Normal approximation of the conversion rate of variants, with the curves of
+    the analysis charts, computed for all variants in one vectorised pass.
+
+    Args:
+        impressions, conversions: Sequences with one element per variant
+        curve_points: Intervals of the density curves, they get curve_points + 1 points
+        qq_points: Quantiles of the Q-Q plot are taken at i / qq_points for i in 1..qq_points - 1
+        z_score: z-score of the confidence intervals
+
+    Returns:
+        Dict of numpy arrays: conversion_rate, std_error, ci_lower and ci_upper
+        (one element per variant), x (conversion rates the curves are evaluated
+        at, shared by all variants), density (variants x points), theoretical
+        (standard normal quantiles) and quantiles (variants x quantiles, as
+        conversion rates). Variants without impressions have rate and error 0
+        and a flat density.
+    """
+    impressions = np.asarray(impressions, dtype=float)
+    conversions = np.asarray(conversions, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conversion_rate = np.where(impressions > 0, conversions / impressions, 0.0)
+        std_error = np.where(impressions > 0, np.sqrt(conversion_rate * (1 - conversion_rate) / impressions), 0.0)
+    ci_lower = np.maximum(0, conversion_rate - z_score * std_error)
+    ci_upper = np.minimum(1, conversion_rate + z_score * std_error)
+
+    # x range around all confidence intervals plus 30% on each side, within [0, 1]
+    buffer = (ci_upper.max() - ci_lower.min()) * 0.3
+    x = np.linspace(max(0, ci_lower.min() - buffer), min(1, ci_upper.max() + buffer), curve_points + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        density = np.nan_to_num(norm.pdf(x, conversion_rate[:, None], std_error[:, None]), posinf=0.0)
+
+    theoretical = norm.ppf(np.arange(1, qq_points) / qq_points)
+    quantiles = theoretical * std_error[:, None] + conversion_rate[:, None]
+
+    return {
+        "conversion_rate": conversion_rate,
+        "std_error": std_error,
+        "ci_lower": ci_lower,
+        "ci_upper": ci_upper,
+        "x": x,
+        "density": density,
+        "theoretical": theoretical,
+        "quantiles": quantiles
+    }
+
+
 def calculate_increase_percent(conv_rate_a, conv_rate_b):
     """
     Calculate the percentage increase from variant A to variant B.
@@ -114,3 +212,71 @@ STATISTICAL REPORT:
 """
 
     return string
+
+
+def build_time_series(variants, snapshots, points=60):
+    """
+    Build per-variant daily series from variant snapshots for the trend chart.
+
+    Days without a snapshot of a variant carry its cumulative totals forward.
+    With more days than points, consecutive days are merged into buckets: the
+    cumulative values are taken from the last day of a bucket and the daily
+    conversion rate is computed from the counts summed over the bucket.
+
+    Args:
+        variants: Variant objects of the test, in display order
+        snapshots: variant_snapshots rows of the test ordered by day
+        points: Maximum number of points per series
+
+    Returns:
+        Dict with "days" (ISO date of the last day of each bucket) and "variants",
+        a list of dicts with the variant name and its series
+    """
+    days = sorted({snapshot.day for snapshot in snapshots})
+    by_variant_day = {(snapshot.variant_id, snapshot.day): snapshot for snapshot in snapshots}
+
+    count = min(max(1, int(points)), len(days))
+    buckets = [days[i * len(days) // count:(i + 1) * len(days) // count] for i in range(count)]
+
+    series = []
+    for variant in variants:
+        cumulative_impressions = 0
+        cumulative_conversions = 0
+        result = {
+            "id": variant.id,
+            "name": variant.name,
+            "impressions": [],
+            "conversions": [],
+            "cumulative_impressions": [],
+            "cumulative_conversions": [],
+            "conversion_rate": [],
+            "cumulative_conversion_rate": []
+        }
+
+        for bucket in buckets:
+            impressions = 0
+            conversions = 0
+            for day in bucket:
+                snapshot = by_variant_day.get((variant.id, day))
+                if snapshot is None:
+                    continue
+                impressions += snapshot.impressions
+                conversions += snapshot.conversions
+                cumulative_impressions = snapshot.cumulative_impressions
+                cumulative_conversions = snapshot.cumulative_conversions
+
+            result["impressions"].append(impressions)
+            result["conversions"].append(conversions)
+            result["cumulative_impressions"].append(cumulative_impressions)
+            result["cumulative_conversions"].append(cumulative_conversions)
+            result["conversion_rate"].append(
+                round(conversions * 100 / impressions, 2) if impressions > 0 else None)
+            result["cumulative_conversion_rate"].append(
+                round(cumulative_conversions * 100 / cumulative_impressions, 2) if cumulative_impressions > 0 else None)
+
+        series.append(result)
+
+    return {
+        "days": [bucket[-1].isoformat() for bucket in buckets],
+        "variants": series
+    }
@@ -0,0 +1,10 @@
+"""
+WSGI entry point for production servers.
+
+The app is created without starting its background threads, so it can be
+loaded once in gunicorn's master process (preload_app) and the workers start
+their own after the fork, see gunicorn.conf.py.
+"""
+from app import create_app
+
+app = create_app(start_workers=False)